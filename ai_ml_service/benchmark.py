@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+AI/ML Service Micro-benchmarks
+
+Times the service's hot paths by importing them from main.py (not copies of
+the logic) across history sizes, and writes the results as JSON so two
+revisions can be compared:
+
+    python benchmark.py --output before.json
+    git checkout my-branch
+    python benchmark.py --output after.json --compare before.json
+
+Each case runs until it has `--repeat` samples or has used its time budget
+(always at least once); min/median/mean/stdev are reported in seconds.
+Models (and their writer locks) are saved to a temporary directory, never
+to ./models, by a private writer and executor pool.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import main
+from model_executor import ModelExecutor
+from model_store import ModelStore
+from model_writer import ModelWriter
+from shared_state import SharedModelState
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+FORECAST_PERIODS = 24
+WARM_BATCH = 100  # values scored per warm AnomalyDetector.predict call
+SCHEDULE_FLEET = 100  # devices per plan_schedules call
+SCHEDULE_MAX_HISTORY = 24 * 28  # a profile never needs more than a few weeks
+
+
+def series(size: int, seed: int = 0) -> np.ndarray:
+    """Daily-seasonal usage series with noise (hourly samples)"""
+    rng = np.random.RandomState(seed)
+    hours = np.arange(size)
+    return 50 + 20 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 3, size)
+
+
+class Case:
+    """One benchmark: `setup(size)` builds state, `run(state)` is what gets timed"""
+
+    def __init__(self, name: str, run: Callable, setup: Optional[Callable] = None,
+                 min_size: int = 0, skip: Optional[str] = None):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda size: size)
+        self.min_size = min_size
+        self.skip = skip
+
+
+def _forecast_request(size: int) -> "main.ForecastRequest":
+    return main.ForecastRequest(
+        device_id=f"bench_forecast_{size}",
+        history=series(size).tolist(),
+        periods=FORECAST_PERIODS
+    )
+
+def _forecast_cold(request):
+    # Drop the cached fit (and forecast) everywhere it lives, including a save
+    # still queued in the writer, so every run pays for a Prophet fit
+    main.model_writer.cancel(lambda key: key[0] == request.device_id)
+    main.model_store.delete(request.device_id, main.DEVICE_MODEL_TYPES)
+    main.forecast_cache.invalidate(request.device_id)
+    main.forecast_results.invalidate(request.device_id)
+    return asyncio.run(main.forecast_usage(request))
+
+def _forecast_warm_setup(size: int):
+    request = _forecast_request(size)
+    asyncio.run(main.forecast_usage(request))
+    return request
+
+def _detector_cold_setup(size: int):
+    return f"bench_anomaly_{size}", series(size)
+
+def _detector_cold(state):
+    device_id, values = state
+    return main.AnomalyDetector(device_id).predict(values)
+
+def _detector_warm_setup(size: int):
+    detector = main.AnomalyDetector(f"bench_anomaly_{size}")
+    detector.predict(series(size))
+    return detector, series(WARM_BATCH, seed=1)
+
+def _detector_warm(state):
+    detector, batch = state
+    return detector.predict(batch)
+
+def _trained_detector(size: int):
+    detector = main.AnomalyDetector(f"bench_store_{size}")
+    detector.predict(series(size))
+    return detector
+
+def _load_setup(size: int):
+    detector = _trained_detector(size)
+    main.model_writer.write((detector.device_id, "anomaly"), detector)
+    return detector.device_id
+
+def _energy_setup(size: int):
+    history = series(size).tolist()
+    request = main.ScheduleRequest(device_id="bench", historical_usage=history)
+    return main.plan_schedules([request])[0].schedule, history
+
+def _fleet_schedule_setup(size: int):
+    return [
+        main.ScheduleRequest(
+            device_id=f"bench_schedule_{i}",
+            constraints={"class_schedule": {"weekends": False}, "energy_budget": 60},
+            historical_usage=series(min(size, SCHEDULE_MAX_HISTORY), seed=i).tolist()
+        )
+        for i in range(SCHEDULE_FLEET)
+    ]
+
+
+def build_cases() -> List[Case]:
+    if not main.PROPHET_AVAILABLE:
+        no_prophet = "prophet not installed"
+    elif not main.model_backends.wait("prophet", timeout=300):
+        no_prophet = "prophet failed to load"
+    else:
+        no_prophet = None
+    return [
+        Case("moving_average_forecast",
+             lambda history: main.simple_moving_average_forecast(history, FORECAST_PERIODS),
+             setup=lambda size: series(size).tolist(), min_size=3),
+        Case("seasonal_forecast",
+             lambda history: main.seasonal_forecast([history], [FORECAST_PERIODS]),
+             setup=lambda size: series(size).tolist(), min_size=3),
+        Case("forecast_prophet_cold", _forecast_cold,
+             setup=_forecast_request, min_size=7, skip=no_prophet),
+        Case("forecast_prophet_warm", lambda request: asyncio.run(main.forecast_usage(request)),
+             setup=_forecast_warm_setup, min_size=7, skip=no_prophet),
+        Case("anomaly_predict_cold", _detector_cold, setup=_detector_cold_setup, min_size=10),
+        Case("anomaly_predict_warm", _detector_warm, setup=_detector_warm_setup, min_size=10),
+        Case("save_model",
+             # The synchronous write the background writer does per model
+             lambda detector: main.model_writer.write((detector.device_id, "anomaly"), detector),
+             setup=_trained_detector, min_size=10),
+        Case("load_model", lambda device_id: main.load_model(device_id, "anomaly"),
+             setup=_load_setup, min_size=10),
+        Case("calculate_energy_savings",
+             lambda state: main.calculate_energy_savings("bench", *state),
+             setup=_energy_setup),
+        Case("optimize_schedules", main.plan_schedules, setup=_fleet_schedule_setup),
+    ]
+
+
+def time_case(case: Case, size: int, repeat: int, budget: float) -> Dict:
+    state = case.setup(size)
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < repeat and (not samples or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        case.run(state)
+        samples.append(time.perf_counter() - start)
+    return {
+        "name": case.name,
+        "size": size,
+        "runs": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+@contextmanager
+def private_service(models_dir: str):
+    """Point main's model store, writer locks, writer and executor at private
+    instances for the run, so nothing reaches ./models or the service's pool"""
+    store = ModelStore(models_dir, compress=main.model_store.compress, mmap=main.model_store.mmap)
+    state = SharedModelState(models_dir, stamp=main.shared_state.stamp, name=main.shared_state.name,
+                             check_interval=main.shared_state.check_interval,
+                             enabled=main.shared_state.enabled)
+    writer = ModelWriter(main.write_model, sync=store.sync_dir, delay=main.model_writer.delay)
+    executor = ModelExecutor(max_workers=main.model_executor.max_workers,
+                             max_queue=main.model_executor.max_queue,
+                             task_timeout=main.model_executor.task_timeout,
+                             kind=main.model_executor.kind,
+                             initializer=main.model_executor.initializer)
+    swaps = [(main, "model_store", store), (main, "shared_state", state),
+             (main, "model_writer", writer), (main, "model_executor", executor),
+             (main.retrain_scheduler, "executor", executor),
+             (main.fleet_retrainer, "executor", executor)]
+    originals = [(target, name, getattr(target, name)) for target, name, _ in swaps]
+    for target, name, value in swaps:
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        # Retrains still running queue their saves; write those before the
+        # real store is back
+        executor.shutdown()
+        writer.close()
+        state.release_all()
+        for target, name, value in originals:
+            setattr(target, name, value)
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 20, budget: float = 5.0,
+                   only: Optional[List[str]] = None) -> Dict:
+    """Run every case at every size; returns the JSON-ready report"""
+    results, skipped = [], []
+    with tempfile.TemporaryDirectory() as models_dir, private_service(models_dir):
+        for case in build_cases():
+            if only and case.name not in only:
+                continue
+            if case.skip:
+                skipped.append({"name": case.name, "reason": case.skip})
+                continue
+            for size in sizes:
+                if size < case.min_size:
+                    continue
+                result = time_case(case, size, repeat, budget)
+                results.append(result)
+                print(f"{case.name:28s} {size:>7d}  median {result['median'] * 1e3:10.3f} ms"
+                      f"  ({result['runs']} runs)", file=sys.stderr)
+
+    return {"meta": environment(), "results": results, "skipped": skipped}
+
+
+def environment() -> Dict:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "revision": revision,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "prophet_available": main.PROPHET_AVAILABLE,
+        "executor": main.model_executor.kind,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.10) -> List[Dict]:
+    """Median-time ratios current/baseline per (name, size); flags regressions"""
+    before = {(r["name"], r["size"]): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        previous = before.get((result["name"], result["size"]))
+        if previous is None:
+            continue
+        ratio = result["median"] / previous["median"] if previous["median"] else float("inf")
+        rows.append({
+            "name": result["name"],
+            "size": result["size"],
+            "baseline": previous["median"],
+            "current": result["median"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark AI/ML service hot paths")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated history sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="samples per case and size")
+    parser.add_argument("--budget", type=float, default=5.0,
+                        help="seconds per case and size before sampling stops early")
+    parser.add_argument("--only", help="comma-separated case names to run")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="median slowdown counted as a regression (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        sizes=[int(size) for size in args.sizes.split(",")],
+        repeat=args.repeat,
+        budget=args.budget,
+        only=args.only.split(",") if args.only else None
+    )
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(report, json.load(f), args.threshold)
+        report["comparison"] = {"baseline": args.compare, "threshold": args.threshold, "rows": rows}
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:28s} {row['size']:>7d}  x{row['ratio']:.2f}{flag}", file=sys.stderr)
+        if any(row["regression"] for row in rows):
+            exit_code = 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,220 @@
+"""
+Bounded in-memory registry for per-device anomaly detectors.
+
+Every device id ever seen used to keep its 100-tree IsolationForest and
+baseline in a plain module-level dict, so the service's RSS only ever grew.
+``DetectorCache`` keeps at most ``max_entries`` detectors and ``max_bytes`` of
+estimated model memory, evicting the least recently used (and anything idle
+for longer than ``ttl`` seconds). Evicted detectors are written back through
+``saver`` and transparently reloaded through ``loader`` on the next access.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DetectorCache:
+    """LRU/TTL cache of detectors with a byte budget and hit/miss counters.
+
+    Entries are keyed by any hashable key (main uses ``(device_id, engine)``
+    tuples). ``loader(key)`` returns a persisted detector or None,
+    ``factory(key)`` builds a fresh one, ``saver(key, detector)`` persists
+    one, and ``sizeof(detector)`` estimates its memory footprint in bytes.
+    Loading and eviction may touch disk, so ``load``, ``refresh`` and
+    ``sweep`` belong off the event loop; ``get`` is a pure memory lookup.
+    The cache lock is never held during disk I/O: detectors are loaded before
+    it is taken and evicted ones are written back after it is released.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Hashable], object],
+        factory: Callable[[Hashable], object],
+        saver: Callable[[Hashable, object], None],
+        sizeof: Callable[[object], int],
+        max_entries: int = 1000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 0,
+    ):
+        self.loader = loader
+        self.factory = factory
+        self.saver = saver
+        self.sizeof = sizeof
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> [detector, size_bytes, last_access]
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        # Evicted detectors still being written back; a load takes them back
+        # instead of reading an older file
+        self._evicting: Dict[Hashable, object] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.warmed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable):
+        """Memory lookup only; counts a hit or a miss"""
+        with self._lock:
+            slot = self._entries.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            slot[2] = time.monotonic()
+            self._entries.move_to_end(key)
+            return slot[0]
+
+    def load(self, key: Hashable):
+        """Return the cached detector, loading or creating it on a miss.
+
+        Blocking (disk reads and eviction write-backs); does not count towards
+        hits/misses again, as callers use it right after a missed ``get``.
+        """
+        with self._lock:
+            slot = self._entries.get(key)
+            if slot is not None:
+                return slot[0]
+            detector = self._evicting.get(key)
+        loaded = detector is None
+        if loaded:
+            detector = self.loader(key)
+        if detector is None:
+            loaded = False
+            detector = self.factory(key)
+        size = self.sizeof(detector)
+        with self._lock:
+            slot = self._entries.get(key)
+            if slot is not None:
+                return slot[0]  # another thread loaded it meanwhile
+            if loaded:
+                self.loads += 1
+            self._entries[key] = [detector, size, time.monotonic()]
+            self._bytes += size
+            victims = self._evict(keep=key)
+        self._write_back(victims)
+        return detector
+
+    def warm(self, key: Hashable) -> int:
+        """Load a persisted detector ahead of its first request (startup warm-up).
+
+        Reads from disk outside the cache lock, so several can load in
+        parallel; never evicts anything to make room. The detector goes in
+        as least recently used. Returns its size, or 0 if it was not added
+        (nothing stored, already cached, or no room).
+        """
+        if key in self._entries:
+            return 0
+        detector = self.loader(key)
+        if detector is None:
+            return 0
+        size = self.sizeof(detector)
+        with self._lock:
+            if key in self._entries:
+                return 0  # a request loaded it meanwhile
+            if len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes:
+                return 0
+            self._entries[key] = [detector, size, time.monotonic()]
+            self._entries.move_to_end(key, last=False)
+            self._bytes += size
+            self.loads += 1
+            self.warmed += 1
+        return size
+
+    def refresh(self, key: Hashable):
+        """Re-measure a detector after it changed (e.g. was retrained)"""
+        with self._lock:
+            slot = self._entries.get(key)
+            if slot is None:
+                return
+            size = self.sizeof(slot[0])
+            self._bytes += size - slot[1]
+            slot[1] = size
+            victims = self._evict(keep=key)
+        self._write_back(victims)
+
+    def discard(self, key: Hashable):
+        """Drop a detector without writing it back (its files are being deleted)"""
+        with self._lock:
+            slot = self._entries.pop(key, None)
+            if slot is not None:
+                self._bytes -= slot[1]
+
+    def sweep(self) -> int:
+        """Evict idle and over-budget entries; returns how many were evicted"""
+        with self._lock:
+            victims = self._evict()
+        self._write_back(victims)
+        return len(victims)
+
+    def _evict(self, keep: Optional[Hashable] = None) -> List[Tuple[Hashable, object]]:
+        """Take idle and over-budget entries out (under the lock); the caller
+        writes them back with ``_write_back`` once the lock is released"""
+        victims = []
+        if self.ttl > 0:
+            deadline = time.monotonic() - self.ttl
+            idle = [k for k, slot in self._entries.items() if slot[2] < deadline and k != keep]
+            for key in idle:
+                victims.append(self._evict_one(key))
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                if len(self._entries) == 1:
+                    break  # A single detector larger than the budget stays usable
+                self._entries.move_to_end(keep)
+                continue
+            victims.append(self._evict_one(oldest))
+        return victims
+
+    def _evict_one(self, key: Hashable) -> Tuple[Hashable, object]:
+        detector, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        self.evictions += 1
+        self._evicting[key] = detector
+        return key, detector
+
+    def _write_back(self, victims: List[Tuple[Hashable, object]]):
+        for key, detector in victims:
+            try:
+                self.saver(key, detector)
+            except Exception as e:
+                logger.error(f"Error writing back evicted detector {key}: {e}")
+            finally:
+                with self._lock:
+                    if self._evicting.get(key) is detector:
+                        del self._evicting[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "warmed": self.warmed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
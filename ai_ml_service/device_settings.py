@@ -0,0 +1,76 @@
+"""
+Per-device settings shared by every worker.
+
+``PUT /models/{device_id}/engine`` chooses a device's default anomaly engine
+and its fleet device class. Those choices used to live in dicts of the worker
+that served the PUT, so a restart forgot them and the other workers never
+saw them. ``DeviceSettings`` keeps them in the model store instead, next to
+the device's models (and deleted with them), and caches them per worker:
+a cached entry is trusted for ``check_interval`` seconds, then the file's
+stamp is checked again, so a change made through another worker shows up
+within that interval.
+
+``cached`` never touches the disk; ``load`` and ``update`` may, and the
+service runs them off the event loop.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class DeviceSettings:
+    """Cached ``{name: value}`` settings per device.
+
+    ``load(device_id)`` reads the stored settings (None if there are none),
+    ``save(device_id, settings)`` writes them and ``stamp(device_id)``
+    fingerprints the stored file (None if absent), as ModelStore does.
+    """
+
+    def __init__(self, load: Callable[[str], Optional[dict]], save: Callable[[str, dict], None],
+                 stamp: Callable[[str], Optional[tuple]], check_interval: float = 5.0):
+        self.loader = load
+        self.saver = save
+        self.stamp = stamp
+        self.check_interval = check_interval
+        self._cache: Dict[str, Tuple[dict, Optional[tuple], float]] = {}  # settings, stamp, checked
+        self._lock = threading.RLock()
+        self.reloads = 0
+
+    def cached(self, device_id: str) -> Optional[dict]:
+        """The device's settings if checked recently, else None (call ``load``)"""
+        entry = self._cache.get(device_id)
+        if entry is None or time.monotonic() - entry[2] >= self.check_interval:
+            return None
+        return entry[0]
+
+    def load(self, device_id: str) -> dict:
+        """The device's settings, re-read if the stored file changed (blocking)"""
+        stamp = self.stamp(device_id)
+        entry = self._cache.get(device_id)
+        if entry is not None and entry[1] == stamp:
+            settings = entry[0]
+        else:
+            settings = (self.loader(device_id) or {}) if stamp is not None else {}
+            if entry is not None:
+                self.reloads += 1
+        with self._lock:
+            self._cache[device_id] = (settings, stamp, time.monotonic())
+        return settings
+
+    def update(self, device_id: str, **changes) -> dict:
+        """Store new values (None leaves a setting unchanged); returns all settings (blocking)"""
+        with self._lock:
+            settings = {**self.load(device_id),
+                        **{name: value for name, value in changes.items() if value is not None}}
+            self.saver(device_id, settings)
+            self._cache[device_id] = (settings, self.stamp(device_id), time.monotonic())
+        return settings
+
+    def forget(self, device_id: str):
+        """Drop the cached settings (the stored ones were deleted)"""
+        with self._lock:
+            self._cache.pop(device_id, None)
+
+    def stats(self) -> dict:
+        return {"devices": len(self._cache), "reloads": self.reloads}
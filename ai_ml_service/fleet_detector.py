@@ -0,0 +1,236 @@
+"""
+Fleet-level anomaly models.
+
+The ``isolation_forest`` engine fits a 100-tree forest per device, often on
+as few as 10 points, so thousands of switches mean thousands of forests in
+memory and on disk. The ``fleet`` engine shares one forest per device class
+instead:
+
+- ``FleetDetector`` is the per-device part: a short window of the device's
+  recent normal readings, whose median and MAD scale its values to robust
+  z-scores. It costs a few kilobytes.
+- ``FleetModel`` is the shared part: an IsolationForest trained on the
+  pooled z-scores of every device in the class. New normal points from all
+  devices accumulate in its pool, and it is refitted in the background by a
+  ``RetrainScheduler`` like a per-device detector.
+
+Scoring a device is one normalization plus one call into the shared forest.
+"""
+
+import copy
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from forest_model import MAD_TO_STD, RetrainableForest, fit_isolation_forest, forest_nbytes
+from ring_buffer import RingBuffer
+
+FLEET_PREFIX = "fleet."  # store id of a class's model: fleet.<class>
+MIN_POINTS = 10
+
+
+class FleetModel(RetrainableForest):
+    """Shared forest of a device class, trained on pooled normalized readings.
+
+    Exposes the attributes ``RetrainScheduler`` uses (``device_id``,
+    ``training_data``, ``swap_model``, ``drift`` ...), so the class refits in
+    the background like any detector.
+    """
+
+    engine = "fleet_model"
+
+    def __init__(self, name: str, pool_size: int = 10000):
+        self.name = name
+        self.device_id = FLEET_PREFIX + name
+        self.model = None
+        self.trained = False
+        self.pool = RingBuffer(pool_size, np.float32)
+        self._lock = threading.Lock()
+        self._reset_training_stats([])
+
+    def _points(self) -> RingBuffer:
+        return self.pool
+
+    def contribute(self, z: np.ndarray):
+        """Add normalized normal readings of one device to the pool"""
+        self._learn(z)
+
+    def install(self, model, data: np.ndarray):
+        with self._lock:
+            self.model = model
+            self.trained = True
+            self._reset_training_stats(data)
+
+    def update_from(self, other: "FleetModel"):
+        """Take over a newer copy (loaded from disk) in place, so attached
+        device detectors see it"""
+        with self._lock:
+            self.model = other.model
+            self.trained = other.trained
+            self.pool = other.pool
+            self.trained_at = other.trained_at
+            self.train_mean, self.train_std = other.train_mean, other.train_std
+            self.points_since_train = other.points_since_train
+            self.new_points_sum = other.new_points_sum
+
+    def score(self, z: np.ndarray):
+        """(decision_function scores, predictions) of normalized values"""
+        model = self.model  # may be swapped by a background retrain meanwhile
+        X = z.reshape(-1, 1)
+        return model.decision_function(X), model.predict(X)
+
+    def nbytes(self) -> int:
+        return self.pool.nbytes + (forest_nbytes(self.model) if self.trained else 0)
+
+
+class FleetDetector:
+    """Per-device scaling in front of a shared FleetModel (same interface as AnomalyDetector).
+
+    Only the scaling window is pickled; ``attach`` reconnects a loaded
+    detector to its class's model.
+    """
+
+    engine = "fleet"
+    points_since_save = 0  # normal points learned since the last snapshot
+    saved_at = 0.0
+
+    def __init__(self, device_id: str, fleet: Optional[FleetModel] = None, window: int = 256):
+        self.device_id = device_id
+        self.fleet = fleet
+        self.window = RingBuffer(window, np.float64)
+        self.trained = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["fleet"] = None
+        return state
+
+    def attach(self, fleet: FleetModel):
+        self.fleet = fleet
+
+    def snapshot(self) -> "FleetDetector":
+        """A detached copy to persist, unaffected by later predictions;
+        restarts the count of unsaved points"""
+        snapshot = copy.copy(self)
+        snapshot.window = copy.copy(self.window)
+        self.points_since_save = 0
+        self.saved_at = time.time()
+        return snapshot
+
+    def normalize(self, values: np.ndarray) -> np.ndarray:
+        """Robust z-scores against the device's recent normal readings"""
+        history = self.window.view()
+        median = float(np.median(history))
+        mad = float(np.median(np.abs(history - median))) * MAD_TO_STD
+        scale = max(mad, 1e-6 * max(abs(median), 1.0))
+        return (values - median) / scale
+
+    def _start(self, values: np.ndarray) -> np.ndarray:
+        self.window.extend(values)
+        self.trained = True
+        z = self.normalize(values)
+        self.fleet.contribute(z)
+        return z
+
+    def _fleet_data(self) -> np.ndarray:
+        if len(self.fleet.pool) < MIN_POINTS:
+            # A class model that was lost (e.g. its file deleted, or the
+            # device moved to a new class): reseed it from this device
+            self.fleet.contribute(self.normalize(self.window.view()))
+        return self.fleet.training_data()
+
+    def _score(self, values: np.ndarray):
+        z = self.normalize(values)
+        scores, predictions = self.fleet.score(z)
+        normal = predictions == 1
+        self.window.extend(values[normal])
+        self.points_since_save += int(normal.sum())
+        self.fleet.contribute(z[normal])
+        return np.flatnonzero(~normal).tolist(), scores.tolist()
+
+    def predict(self, new_data: np.ndarray):
+        """Detect anomalies; returns (anomaly indices, scores).
+
+        The first call with enough values only sets the device's scaling
+        (no anomalies reported); if the class has no model yet it is fitted
+        on the spot. The service calls predict_async instead while either is
+        untrained, so that fit never runs on the event loop.
+        """
+        values = np.asarray(new_data, dtype=np.float64).ravel()
+        if not self.trained and len(values) < MIN_POINTS:
+            return [], [0.0] * len(values)
+        z = None if self.trained else self._start(values)
+        if not self.fleet.trained:
+            data = self._fleet_data()
+            self.fleet.install(fit_isolation_forest(data), data)
+        if z is not None:
+            scores, _ = self.fleet.score(z)
+            return [], scores.tolist()
+        return self._score(values)
+
+    async def predict_async(self, new_data: np.ndarray, executor):
+        """Same as predict, fitting the class's model on the executor"""
+        values = np.asarray(new_data, dtype=np.float64).ravel()
+        if not self.trained and len(values) < MIN_POINTS:
+            return [], [0.0] * len(values)
+        z = None if self.trained else self._start(values)
+        if not self.fleet.trained:
+            data = self._fleet_data()
+            model = await executor.run(fit_isolation_forest, data)
+            if not self.fleet.trained:  # another device may have fitted it meanwhile
+                self.fleet.install(model, data)
+        if z is not None:
+            scores, _ = self.fleet.score(z)
+            return [], scores.tolist()
+        return self._score(values)
+
+    def nbytes(self) -> int:
+        return self.window.nbytes + 200  # the forest is shared; see FleetRegistry
+
+
+class FleetRegistry:
+    """The FleetModel of each device class, loaded or created on first use.
+
+    ``stale(name)`` (optional) says whether another worker saved a newer copy,
+    which is then loaded into the existing object.
+    """
+
+    def __init__(self, loader: Callable[[str], Optional[FleetModel]],
+                 factory: Callable[[str], FleetModel],
+                 stale: Optional[Callable[[str], bool]] = None):
+        self.loader = loader
+        self.factory = factory
+        self.stale = stale
+        self._fleets: Dict[str, FleetModel] = {}
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def get(self, name: str) -> FleetModel:
+        """Blocking on first use (disk read); cheap afterwards"""
+        with self._lock:
+            fleet = self._fleets.get(name)
+            if fleet is None:
+                fleet = self._fleets[name] = self.loader(name) or self.factory(name)
+                return fleet
+        if self.stale is not None and self.stale(name):
+            newer = self.loader(name)
+            if newer is not None:
+                fleet.update_from(newer)
+                self.reloads += 1
+        return fleet
+
+    def __len__(self):
+        return len(self._fleets)
+
+    def stats(self) -> dict:
+        with self._lock:
+            fleets = list(self._fleets.values())
+        return {
+            "classes": len(fleets),
+            "trained": sum(fleet.trained for fleet in fleets),
+            "pool_points": sum(len(fleet.pool) for fleet in fleets),
+            "bytes": sum(fleet.nbytes() for fleet in fleets),
+            "reloads": self.reloads,
+        }
@@ -0,0 +1,136 @@
+"""
+Reuse of fitted Prophet forecasts.
+
+A Prophet fit costs a full Stan optimization, yet consecutive dashboard
+refreshes send the same history, or the same history plus a handful of new
+hourly points. When a model is fitted we forecast a slightly longer horizon
+than requested (``periods + refit_threshold``) and keep that forecast in a
+``ForecastEntry`` together with a fingerprint of the history and a short
+"anchor" of its last values. Later requests whose history is unchanged, or
+only extended by fewer than ``refit_threshold`` points, are answered by
+slicing the cached forecast instead of refitting.
+
+An entry holds plain arrays only; the fitted Prophet model is stored apart
+from it (as "forecast_model"), so reloading an entry never imports Prophet.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+ANCHOR_POINTS = 8
+
+
+def history_fingerprint(history: np.ndarray) -> str:
+    """Stable hash of a history (rounded so float noise does not force refits)"""
+    data = np.round(np.asarray(history, dtype=np.float64), 6)
+    return hashlib.sha1(data.tobytes()).hexdigest()
+
+
+class ForecastEntry:
+    """Forecast produced by one fitted model, plus what is needed to reuse it"""
+
+    def __init__(self, history, yhat, yhat_lower, yhat_upper):
+        history = np.asarray(history, dtype=np.float64)
+        self.fingerprint = history_fingerprint(history)
+        self.anchor = history[-ANCHOR_POINTS:].copy()
+        self.n_points = len(history)
+        self.yhat = np.asarray(yhat, dtype=np.float64)
+        self.yhat_lower = np.asarray(yhat_lower, dtype=np.float64)
+        self.yhat_upper = np.asarray(yhat_upper, dtype=np.float64)
+        self.fitted_at = datetime.now().isoformat()
+
+    @property
+    def horizon(self) -> int:
+        return len(self.yhat)
+
+    def new_points(self, history, max_new: int) -> Optional[int]:
+        """How many points were appended since the fit, or None if it doesn't match.
+
+        Works for both growing histories and sliding windows: the anchor (last
+        values seen at fit time) must appear at the end of ``history``, shifted
+        by fewer than ``max_new`` positions.
+        """
+        history = np.asarray(history, dtype=np.float64)
+        if len(history) == self.n_points and history_fingerprint(history) == self.fingerprint:
+            return 0
+
+        m = len(self.anchor)
+        tail = history[-(m + max_new - 1):]
+        if len(tail) < m or max_new < 2:
+            return None
+        windows = sliding_window_view(tail, m)
+        # Window i ends (len(windows) - 1 - i) points before the end of history
+        matches = np.flatnonzero(np.all(np.isclose(windows, self.anchor), axis=1))
+        if len(matches) == 0:
+            return None
+        offset = len(windows) - 1 - int(matches[-1])
+        return offset if offset > 0 else None
+
+    def slice(self, offset: int, periods: int) -> Optional[tuple]:
+        """Forecast for the `periods` steps after `offset` new points, if cached"""
+        if offset + periods > self.horizon:
+            return None
+        window = slice(offset, offset + periods)
+        return (
+            self.yhat[window].tolist(),
+            self.yhat_lower[window].tolist(),
+            self.yhat_upper[window].tolist(),
+        )
+
+
+class ForecastModelCache:
+    """LRU of ForecastEntry objects per device, backed by MODELS_DIR.
+
+    ``loader(device_id)`` returns the persisted object for a device (normally
+    ``load_model(device_id, "forecast")``) or None.
+    """
+
+    def __init__(self, loader: Callable[[str], object], max_entries: int = 256):
+        self.loader = loader
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ForecastEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, device_id: str) -> Optional[ForecastEntry]:
+        """Memory lookup only"""
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is not None:
+                self._entries.move_to_end(device_id)
+            return entry
+
+    def load(self, device_id: str) -> Optional[ForecastEntry]:
+        """Memory first, then MODELS_DIR (blocking; run it off the event loop)"""
+        entry = self.get(device_id)
+        if entry is not None:
+            return entry
+        stored = self.loader(device_id)
+        if not isinstance(stored, ForecastEntry):
+            # Nothing persisted, or a pre-cache pickle of a bare Prophet model
+            return None
+        # Entries are never modified, so one still queued for writing can be shared
+        self.put(device_id, stored)
+        return stored
+
+    def put(self, device_id: str, entry: ForecastEntry):
+        with self._lock:
+            self._entries[device_id] = entry
+            self._entries.move_to_end(device_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, device_id: str):
+        with self._lock:
+            self._entries.pop(device_id, None)
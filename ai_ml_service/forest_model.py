@@ -0,0 +1,116 @@
+"""
+IsolationForest pieces shared by the anomaly engines.
+
+The per-device ``AnomalyDetector`` (main) and a device class's shared
+``FleetModel`` (fleet_detector) fit the same forest and are refitted in the
+background by a ``RetrainScheduler`` the same way; the fit function, the
+memory estimate and the retrain bookkeeping live here once, next to the
+MAD scaling constant the robust-z engines use.
+"""
+
+import copy
+import threading
+import time
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from ring_buffer import RingBuffer
+
+MAD_TO_STD = 1.4826  # MAD of a normal distribution -> its standard deviation
+TREE_NODE_BYTES = 64  # sklearn stores each tree node as a 64-byte struct
+
+
+def fit_isolation_forest(data: np.ndarray) -> IsolationForest:
+    """Fit a fresh IsolationForest (module-level so it can run in the process pool)"""
+    model = IsolationForest(contamination=0.1, random_state=42, n_estimators=100)
+    model.fit(data.reshape(-1, 1))
+    return model
+
+
+def forest_nbytes(model: IsolationForest) -> int:
+    """Rough memory footprint of a fitted forest's node arrays"""
+    size = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        size += tree.node_count * TREE_NODE_BYTES + tree.value.nbytes
+    size += sum(features.nbytes for features in model.estimators_features_)
+    return size
+
+
+class RetrainableForest:
+    """Retrain bookkeeping of a forest refitted in the background.
+
+    Subclasses set ``model``, ``trained`` and ``_lock`` and return the
+    points the forest learns from (a RingBuffer, oldest first) from
+    ``_points()``. ``swap_model`` runs on the RetrainScheduler's thread while
+    requests keep scoring, so the points and the counters only change under
+    ``_lock``.
+    """
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _points(self):
+        raise NotImplementedError
+
+    def snapshot(self):
+        """A copy to persist: the live object keeps learning and being swapped
+        while a queued save waits to be pickled"""
+        with self._lock:
+            state = {name: copy.copy(value) if isinstance(value, RingBuffer) else value
+                     for name, value in self.__getstate__().items()}
+        snapshot = self.__class__.__new__(self.__class__)
+        snapshot.__setstate__(state)
+        return snapshot
+
+    def _reset_training_stats(self, data):
+        self.trained_at = time.time()
+        self.train_mean = float(np.mean(data)) if len(data) else 0.0
+        self.train_std = float(np.std(data)) if len(data) else 0.0
+        self.points_since_train = 0
+        self.new_points_sum = 0.0
+
+    def _learn(self, points: np.ndarray):
+        """Add new normal points, counting them towards the next retrain"""
+        if len(points) == 0:
+            return
+        with self._lock:
+            self._points().extend(points)
+            self.points_since_train += len(points)
+            self.new_points_sum += float(points.sum())
+
+    def training_data(self) -> np.ndarray:
+        # A copy: the fit runs in the background while new points keep arriving
+        with self._lock:
+            return self._points().view().astype(np.float64)
+
+    def swap_model(self, model: IsolationForest, data: np.ndarray, consumed: int):
+        """Install a model refitted in the background.
+
+        The points keep any values learned while the fit was running; only
+        the `consumed` points the fit already saw stop counting as new.
+        """
+        with self._lock:
+            new_since_snapshot = max(0, self.points_since_train - consumed)
+            points = self._points().view()
+            new_sum = float(points[max(0, len(points) - new_since_snapshot):].sum())
+            self.model = model
+            self.trained = True
+            self._reset_training_stats(data)
+            if new_since_snapshot:
+                self.points_since_train = new_since_snapshot
+                self.new_points_sum = new_sum
+
+    def drift(self) -> float:
+        """Shift of the mean of points since the last fit, in training std units"""
+        if self.points_since_train == 0:
+            return 0.0
+        recent_mean = self.new_points_sum / self.points_since_train
+        return abs(recent_mean - self.train_mean) / (self.train_std + 1e-9)
@@ -1,34 +1,132 @@
-from fastapi import FastAPI, HTTPException
+import time
+IMPORT_STARTED = time.perf_counter()  # reported as aiml_startup_seconds
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Any, Optional, Protocol
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from collections import deque
 import uvicorn
 import logging
+import asyncio
+import json
+import sys
+import threading
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
-import joblib
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-# Prophet import with fallback
-try:
-    from prophet import Prophet
-    PROPHET_AVAILABLE = True
-except ImportError:
-    PROPHET_AVAILABLE = False
-    logging.warning("Prophet not installed. Using fallback forecasting methods.")
+from model_executor import ModelExecutor, ExecutorSaturated
+from forecast_cache import ForecastEntry, ForecastModelCache, history_fingerprint
+from result_cache import ResultCache
+from detector_cache import DetectorCache
+from micro_batcher import MicroBatcher
+from moving_average import forecast_histories
+from seasonal import seasonal_forecast
+import schedule_optimizer
+import payloads
+import server_timing
+from model_store import ModelStore
+from model_writer import ModelWriter
+from preloader import ModelPreloader, StoredModel
+from retrain_scheduler import RetrainPolicy, RetrainScheduler
+from ring_buffer import RingBuffer
+from series_store import SeriesStore
+from shared_state import SharedModelState
+from device_settings import DeviceSettings
+from statistical_detector import StatisticalDetector
+from fleet_detector import FleetDetector, FleetModel, FleetRegistry, FLEET_PREFIX
+from forest_model import RetrainableForest, fit_isolation_forest, forest_nbytes
+from model_backends import BackendLoader
+from metrics import (
+    BACKEND_LOAD_SECONDS, FORECASTS, MODEL_FIT_SECONDS, MODEL_PREDICT_SECONDS,
+    MODEL_STORE_SECONDS, STARTUP_SECONDS, MetricsMiddleware, monitor_event_loop_lag,
+    register_stats
+)
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from profiling import ProfilingMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Heavy optional backends (Prophet) load on a background thread; until they
+# are ready, forecasts use the moving average. See model_backends.
+model_backends = BackendLoader(
+    on_loaded=lambda name, seconds: BACKEND_LOAD_SECONDS.labels(name).set(seconds)
+)
+
+def warm_up_prophet(prophet):
+    """Tiny fit so Stan model loading and compilation happen before the first request"""
+    df = pd.DataFrame({
+        'ds': pd.date_range(end=datetime.now(), periods=48, freq='h'),
+        'y': 50 + 10 * np.sin(np.arange(48) * 2 * np.pi / 24)
+    })
+    prophet.Prophet(daily_seasonality=True, weekly_seasonality=False).fit(df)
+
+def init_model_worker():
+    """Process pool initializer: import and warm up Prophet in each worker,
+    where the fits run, so no forecast pays for it"""
+    if not model_backends.installed("prophet"):
+        return
+    try:
+        import prophet
+        warm_up_prophet(prophet)
+    except Exception as e:
+        # Raising here would break the whole pool; prophet_loaded reports it
+        logger.error(f"Warming up Prophet in worker {os.getpid()} failed: {e!r}")
+
+def prophet_loaded() -> bool:
+    """Whether this (worker) process has imported Prophet"""
+    return "prophet" in sys.modules
+
+# Process pool for CPU-bound model work (Prophet / IsolationForest fits)
+POOL_KIND = os.getenv("AIML_POOL_KIND", "process")
+POOL_WORKERS = int(os.getenv("AIML_POOL_WORKERS", "0")) or None  # 0 = cores - 1
+POOL_MAX_QUEUE = int(os.getenv("AIML_POOL_MAX_QUEUE", "32"))
+POOL_TASK_TIMEOUT = float(os.getenv("AIML_POOL_TASK_TIMEOUT", "120"))
+
+model_executor = ModelExecutor(
+    max_workers=POOL_WORKERS,
+    max_queue=POOL_MAX_QUEUE,
+    task_timeout=POOL_TASK_TIMEOUT,
+    kind=POOL_KIND,
+    initializer=init_model_worker,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    model_store.purge_temp()
+    model_backends.start_all()
+    preloader.start()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    sweeper = (asyncio.create_task(sweep_detectors(DETECTOR_CACHE_SWEEP_SECONDS))
+               if DETECTOR_CACHE_SWEEP_SECONDS > 0 else None)
+    startup_seconds = time.perf_counter() - IMPORT_STARTED
+    STARTUP_SECONDS.set(startup_seconds)
+    logger.info(f"Service started in {startup_seconds:.2f}s")
+    yield
+    lag_monitor.cancel()
+    if sweeper is not None:
+        sweeper.cancel()
+    retrain_scheduler.shutdown()
+    fleet_retrainer.shutdown()
+    model_executor.shutdown()
+    model_writer.close()  # write queued models while still holding their writer locks
+    shared_state.release_all()
+
 app = FastAPI(
     title="AI/ML Microservice",
     description="AI/ML service for IoT classroom automation system with enhanced forecasting",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -39,25 +137,166 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Server-Timing: per-phase durations (parse, load, fit, predict, ...) of each request
+app.add_middleware(server_timing.ServerTimingMiddleware)
+
+# Requests sent with `X-Profile: <AIML_PROFILE_TOKEN>` are profiled into
+# AIML_PROFILE_DIR (folded stacks for flame graphs; no token = off). Requests
+# that take longer than AIML_SLOW_REQUEST_SECONDS (0 = off) to start their
+# response log their hottest stacks.
+PROFILE_DIR = Path(os.getenv("AIML_PROFILE_DIR", "./profiles"))
+PROFILE_TOKEN = os.getenv("AIML_PROFILE_TOKEN", "")
+PROFILE_INTERVAL_MS = float(os.getenv("AIML_PROFILE_INTERVAL_MS", "1"))
+SLOW_REQUEST_SECONDS = float(os.getenv("AIML_SLOW_REQUEST_SECONDS", "5"))
+app.add_middleware(
+    ProfilingMiddleware,
+    profile_dir=PROFILE_DIR,
+    token=PROFILE_TOKEN,
+    slow_seconds=SLOW_REQUEST_SECONDS,
+    interval=PROFILE_INTERVAL_MS / 1000,
+)
 
 # Create models directory
 MODELS_DIR = Path("./models")
 MODELS_DIR.mkdir(exist_ok=True)
 
+# Atomic, versioned model files; compression (joblib level) disables mmap loading,
+# which is off by default (see model_store)
+MODEL_COMPRESS = int(os.getenv("AIML_MODEL_COMPRESS", "0"))
+MODEL_MMAP = os.getenv("AIML_MODEL_MMAP", "0") == "1"
+model_store = ModelStore(MODELS_DIR, compress=MODEL_COMPRESS, mmap=MODEL_MMAP)
+
+# Models are saved by a background writer AIML_PERSIST_DELAY_SECONDS after the
+# request that changed them; repeated saves in between write only the latest
+# state, and a batch shares one directory fsync (0 = save synchronously)
+PERSIST_DELAY_SECONDS = float(os.getenv("AIML_PERSIST_DELAY_SECONDS", "1"))
+
+# Several uvicorn workers: one writer per detector, replicas reload when its
+# file changes (checked at most every AIML_MODEL_SYNC_SECONDS). See shared_state.
+SHARED_STATE = os.getenv("AIML_SHARED_STATE", "1") == "1"
+MODEL_SYNC_SECONDS = float(os.getenv("AIML_MODEL_SYNC_SECONDS", "5"))
+
+# Server-side device series (POST /series/{device_id}), stored next to MODELS_DIR
+SERIES_DIR = Path(os.getenv("AIML_SERIES_DIR", str(MODELS_DIR.parent / "series")))
+SERIES_MAX_POINTS = int(os.getenv("AIML_SERIES_MAX_POINTS", "10080"))  # a week of minutes
+SERIES_RETENTION_HOURS = float(os.getenv("AIML_SERIES_RETENTION_HOURS", "168"))  # 0 = keep all
+SERIES_MAX_DEVICES = int(os.getenv("AIML_SERIES_MAX_DEVICES", "1024"))
+series_store = SeriesStore(
+    SERIES_DIR,
+    max_points=SERIES_MAX_POINTS,
+    retention=SERIES_RETENTION_HOURS * 3600,
+    max_devices=SERIES_MAX_DEVICES
+)
+
+# Moving-average fallback: window length and weighting (sma, wma or ewma)
+MA_WINDOW = int(os.getenv("AIML_MA_WINDOW", "3"))
+MA_WEIGHTING = os.getenv("AIML_MA_WEIGHTING", "sma")
+
+# Detector baseline: most recent normal points kept for retraining.
+# IsolationForest fits on float32 anyway, so float32 halves memory for free.
+BASELINE_SIZE = int(os.getenv("AIML_BASELINE_SIZE", "1000"))
+BASELINE_DTYPE = np.dtype(os.getenv("AIML_BASELINE_DTYPE", "float32"))
+
+# Background detector retraining (0 disables a trigger)
+RETRAIN_EVERY_POINTS = int(os.getenv("AIML_RETRAIN_EVERY_POINTS", "100"))
+RETRAIN_EVERY_SECONDS = float(os.getenv("AIML_RETRAIN_EVERY_SECONDS", "0"))
+RETRAIN_DRIFT_THRESHOLD = float(os.getenv("AIML_RETRAIN_DRIFT_THRESHOLD", "3.0"))
+
+# Anomaly engine used when neither the request nor the device picks one
+DEFAULT_ANOMALY_ENGINE = os.getenv("AIML_ANOMALY_ENGINE", "isolation_forest")
+
+# Fleet engine: one shared forest per device class, refitted after this many
+# new pooled points (see fleet_detector)
+DEFAULT_DEVICE_CLASS = os.getenv("AIML_DEVICE_CLASS", "default")
+FLEET_POOL_SIZE = int(os.getenv("AIML_FLEET_POOL_SIZE", "10000"))
+FLEET_RETRAIN_POINTS = int(os.getenv("AIML_FLEET_RETRAIN_POINTS", "2000"))
+
+# Micro-batching of anomaly scoring: requests for the same detector arriving
+# within the wait are scored in one call (0 ms disables batching)
+ANOMALY_BATCH_WAIT_MS = float(os.getenv("AIML_ANOMALY_BATCH_WAIT_MS", "2"))
+ANOMALY_BATCH_MAX = int(os.getenv("AIML_ANOMALY_BATCH_MAX", "64"))
+
+# Longest forecast a request may ask for (hourly steps); the moving-average
+# coefficients are built and cached per horizon, so it has to be bounded
+FORECAST_MAX_PERIODS = int(os.getenv("AIML_FORECAST_MAX_PERIODS", str(24 * 30)))
+
+# Identical forecast requests within this many seconds share one result
+FORECAST_RESULT_TTL = float(os.getenv("AIML_FORECAST_RESULT_TTL", "30"))
+FORECAST_RESULT_CACHE_SIZE = int(os.getenv("AIML_FORECAST_RESULT_CACHE_SIZE", "1024"))
+
+# Streaming anomaly detection: recent scores kept per device for the threshold
+STREAM_WINDOW = int(os.getenv("AIML_STREAM_WINDOW", "100"))
+
+# Fitted Prophet forecasts are reused until this many new points arrive
+FORECAST_REFIT_POINTS = int(os.getenv("AIML_FORECAST_REFIT_POINTS", "12"))
+FORECAST_CACHE_SIZE = int(os.getenv("AIML_FORECAST_CACHE_SIZE", "256"))
+
+# In-memory anomaly detector budget (LRU, idle TTL in seconds; 0 disables TTL)
+DETECTOR_CACHE_MAX_ENTRIES = int(os.getenv("AIML_DETECTOR_CACHE_MAX_ENTRIES", "1000"))
+DETECTOR_CACHE_MAX_MB = float(os.getenv("AIML_DETECTOR_CACHE_MAX_MB", "256"))
+DETECTOR_CACHE_TTL = float(os.getenv("AIML_DETECTOR_CACHE_TTL", "3600"))
+# Idle detectors are evicted (and written back) by a sweep this often, even
+# when no new device arrives to push them out (0 disables the sweep)
+DETECTOR_CACHE_SWEEP_SECONDS = float(os.getenv("AIML_DETECTOR_CACHE_SWEEP_SECONDS", "60"))
+
+# Startup warm-up: the AIML_PRELOAD_MODELS most recently saved models are loaded
+# on AIML_PRELOAD_WORKERS threads, up to AIML_PRELOAD_MAX_MB (0 models = off)
+PRELOAD_MODELS = int(os.getenv("AIML_PRELOAD_MODELS", "256"))
+PRELOAD_MAX_MB = float(os.getenv("AIML_PRELOAD_MAX_MB", str(DETECTOR_CACHE_MAX_MB / 2)))
+PRELOAD_WORKERS = int(os.getenv("AIML_PRELOAD_WORKERS", "4"))
+
 # Pydantic models
 class ForecastRequest(BaseModel):
     device_id: str
-    history: List[float]
-    periods: int = 5
+    history: Optional[List[float]] = None  # omitted: use the stored series
+    window: Optional[int] = Field(None, ge=1, le=SERIES_MAX_POINTS)  # last N stored points (default: all retained)
+    periods: int = Field(5, ge=0, le=FORECAST_MAX_PERIODS)
+    model_type: Optional[str] = None  # auto (default), moving_average, seasonal or prophet
+
+class BatchForecastRequest(BaseModel):
+    items: List[ForecastRequest]
 
 class ScheduleRequest(BaseModel):
     device_id: str
     constraints: Optional[Dict[str, Any]] = None
-    historical_usage: Optional[List[float]] = None
+    historical_usage: Optional[List[float]] = None  # hourly, ending now
+
+class BatchScheduleRequest(BaseModel):
+    items: List[ScheduleRequest]
 
 class AnomalyRequest(BaseModel):
     device_id: str
+    values: Optional[List[float]] = None  # omitted: use the stored series
+    window: Optional[int] = Field(None, ge=1, le=SERIES_MAX_POINTS)  # last N stored points (default: all retained)
+    engine: Optional[str] = None  # isolation_forest or statistical; default per device
+
+class EngineRequest(BaseModel):
+    engine: str
+    device_class: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9_-]+$")  # fleet engine
+
+class SeriesAppendRequest(BaseModel):
+    values: List[float]
+    timestamps: Optional[List[datetime]] = None  # ISO strings or epoch seconds; default: now
+
+class SeriesAppendResponse(BaseModel):
+    device_id: str
+    accepted: int
+    dropped: int  # older than the latest stored reading
+    points: int
+    timestamp: str
+
+class SeriesResponse(BaseModel):
+    device_id: str
+    timestamps: List[float]  # epoch seconds
     values: List[float]
+    timestamp: str
+
+class StreamReading(BaseModel):
+    device_id: str
+    value: Optional[float] = None
+    values: Optional[List[float]] = None
+    engine: Optional[str] = None
 
 class ForecastResponse(BaseModel):
     device_id: str
@@ -65,12 +304,18 @@ class ForecastResponse(BaseModel):
     confidence: List[float]
     timestamp: str
     model_type: str
+    timings: Optional[Dict[str, float]] = None  # ms per phase, with ?timings=1
 
 class ScheduleResponse(BaseModel):
     device_id: str
     schedule: Dict[str, Any]
     energy_savings: float
     timestamp: str
+    budget_met: Optional[bool] = None  # None when no energy_budget was given
+    timings: Optional[Dict[str, float]] = None  # ms per phase, with ?timings=1
+
+class BatchScheduleResponse(BaseModel):
+    results: List[ScheduleResponse]
 
 class AnomalyResponse(BaseModel):
     device_id: str
@@ -78,31 +323,157 @@ class AnomalyResponse(BaseModel):
     scores: List[float]
     threshold: float
     timestamp: str
+    engine: str = "isolation_forest"
+    timings: Optional[Dict[str, float]] = None  # ms per phase, with ?timings=1
+
+class AnomalyEvent(BaseModel):
+    device_id: str
+    seq: int
+    value: float
+    score: float
+    threshold: float
+    timestamp: str
+
+# Binary payloads (see payloads.py): /forecast and /anomaly take the series
+# as JSON, .npy, raw floats, Arrow or msgpack, and answer per Accept header
+def series_request_body(model) -> dict:
+    """OpenAPI requestBody for an endpoint that parses its body itself"""
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                payloads.JSON: {"schema": model.model_json_schema()},
+                payloads.NPY: binary,
+                payloads.RAW: binary,
+                payloads.ARROW: binary,
+                payloads.MSGPACK: binary,
+            }
+        }
+    }
+
+async def parse_series_request(http_request: Request, model, field: str):
+    """Build `model` from a JSON or binary body; the series lands in `field`.
+
+    Binary series are set as float64 numpy arrays without per-element
+    validation; scalar fields are validated as usual (from the query string
+    for array formats).
+    """
+    try:
+        fmt = payloads.request_format(http_request.headers.get("content-type"))
+        body = await http_request.body()
+        if fmt == payloads.JSON:
+            return model.model_validate_json(body)
+        if fmt == payloads.MSGPACK:
+            fields, series = payloads.decode_msgpack(body, field)
+        else:
+            fields = dict(http_request.query_params)
+            series = payloads.decode_series(body, fmt, field, dtype=fields.pop("dtype", None))
+        if series is None:
+            return model.model_validate(fields)
+        request = model.model_validate({**fields, field: []})
+    except payloads.PayloadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+    return request.model_copy(update={field: series})
+
+async def with_stored_series(request, field: str):
+    """Fill `field` from the device's stored series when the request omits it"""
+    if getattr(request, field) is not None:
+        return request
+    with server_timing.phase("load"):
+        stored = await model_executor.run_io(series_store.window, request.device_id, request.window)
+    if stored is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No '{field}' given and no stored series for {request.device_id}"
+        )
+    return request.model_copy(update={field: stored[1]})
+
+def with_timings(http_request: Request, response: BaseModel) -> BaseModel:
+    """Add the phase timings so far to `response` if the caller asked (?timings=1)"""
+    timings = server_timing.current()
+    if timings is None or not server_timing.requested(http_request.query_params):
+        return response
+    # A copy: forecast responses may be shared through forecast_results
+    return response.model_copy(update={"timings": timings.snapshot()})
+
+def negotiated_response(http_request: Request, response: BaseModel, columns: Dict[str, Any]):
+    """Return `response` in the format asked for by the Accept header"""
+    fmt = payloads.response_format(http_request.headers.get("accept"))
+    if fmt == payloads.JSON:
+        return response
+    try:
+        if fmt == payloads.MSGPACK:
+            return Response(payloads.pack(response.model_dump()), media_type=payloads.MSGPACK)
+        # Per-point fields travel as `columns`, the rest as headers (timings are in Server-Timing)
+        scalars = {key: value for key, value in response.model_dump(exclude={"timings"}).items()
+                   if not isinstance(value, list)}
+        body, headers = payloads.encode(fmt, scalars, columns)
+    except payloads.PayloadError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    return Response(body, media_type=fmt, headers=headers)
 
 # Model persistence functions
+def write_model(key: tuple, model):
+    """Write a (device_id, model_type) model file; the directory is synced per batch"""
+    with MODEL_STORE_SECONDS.labels("save").time():
+        path = model_store.save(key[0], key[1], model, sync_dir=False)
+    logger.info(f"Saved model: {path}")
+
+model_writer = ModelWriter(write_model, sync=model_store.sync_dir, delay=PERSIST_DELAY_SECONDS)
+
 def save_model(device_id: str, model_type: str, model):
-    """Save model to disk"""
-    try:
-        path = MODELS_DIR / f"{device_id}_{model_type}.pkl"
-        joblib.dump(model, path)
-        logger.info(f"Saved model: {path}")
-    except Exception as e:
-        logger.error(f"Error saving model: {e}")
+    """Queue a model to be saved (atomically, see ModelStore) by the background writer"""
+    model_writer.submit((device_id, model_type), model)
 
 def load_model(device_id: str, model_type: str):
-    """Load model from disk"""
+    """Load model from disk (or the newer copy still queued for writing)"""
+    pending = model_writer.get((device_id, model_type))
+    if pending is not None:
+        # The queued copy is still to be pickled: hand out a copy of it
+        return pending.snapshot() if hasattr(pending, "snapshot") else pending
     try:
-        path = MODELS_DIR / f"{device_id}_{model_type}.pkl"
-        if path.exists():
-            logger.info(f"Loaded model: {path}")
-            return joblib.load(path)
+        with MODEL_STORE_SECONDS.labels("load").time():
+            model = model_store.load(device_id, model_type)
+        if model is not None:
+            logger.info(f"Loaded model: {device_id}_{model_type}")
+        return model
     except Exception as e:
         logger.error(f"Error loading model: {e}")
     return None
 
+class AnomalyEngine(Protocol):
+    """Interface of a per-device anomaly detection engine.
+
+    predict_async returns (anomaly indices, scores) where scores follow the
+    IsolationForest decision_function convention (negative = anomalous).
+    The first call with enough values trains the engine.
+    """
+    engine: str
+    device_id: str
+    trained: bool
+
+    async def predict_async(self, new_data: np.ndarray, executor: ModelExecutor) -> tuple: ...
+
+    def snapshot(self) -> "AnomalyEngine": ...
+
+    def nbytes(self) -> int: ...
+
 # Anomaly Detection Class
-class AnomalyDetector:
-    """Stateful anomaly detector with incremental learning"""
+class AnomalyDetector(RetrainableForest):
+    """Stateful anomaly detector with incremental learning.
+
+    Only the first fit happens on the request path (there is nothing to score
+    with before it); later refits are scheduled by RetrainScheduler and
+    swapped in with swap_model, on the scheduler's thread (see
+    forest_model.RetrainableForest for the locking).
+    """
+    engine = "isolation_forest"
+
     def __init__(self, device_id: str):
         self.device_id = device_id
         self.model = IsolationForest(
@@ -111,16 +482,63 @@ class AnomalyDetector:
             n_estimators=100
         )
         self.trained = False
-        self.baseline = []
-        
+        self.baseline = RingBuffer(BASELINE_SIZE, BASELINE_DTYPE)
+        self._lock = threading.Lock()
+        self._reset_training_stats([])
+
+    def __setstate__(self, state):
+        # Older pickles keep the baseline as a list and lack the retrain fields
+        super().__setstate__(state)
+        if isinstance(self.baseline, list):
+            self.baseline = RingBuffer.from_array(self.baseline, BASELINE_SIZE, BASELINE_DTYPE)
+        if "points_since_train" not in state:
+            self._reset_training_stats(self.baseline.view())
+
+    def _points(self) -> RingBuffer:
+        return self.baseline
+
+    def _install(self, model: IsolationForest, data: np.ndarray):
+        """Swap in a fitted model together with the baseline it was trained on"""
+        with self._lock:
+            self.model = model
+            self.baseline = RingBuffer.from_array(data, BASELINE_SIZE, BASELINE_DTYPE)
+            self.trained = True
+            self._reset_training_stats(data)
+
     def train(self, data: np.ndarray):
         """Train model on baseline data"""
         if len(data) >= 10:
-            self.model.fit(data.reshape(-1, 1))
-            self.baseline = data.tolist()
-            self.trained = True
-            save_model(self.device_id, "anomaly", self)
+            self._install(fit_isolation_forest(data), data)
+            persist_detector(self)
             logger.info(f"Trained anomaly detector for {self.device_id}")
+
+    async def train_async(self, data: np.ndarray, executor: ModelExecutor):
+        """Train model on baseline data without blocking the event loop"""
+        if len(data) >= 10:
+            model = await executor.run(fit_isolation_forest, data)
+            self._install(model, data)
+            with server_timing.phase("persist"):
+                persist_detector(self)  # queued; see model_writer
+            logger.info(f"Trained anomaly detector for {self.device_id}")
+
+    def _score(self, new_data: np.ndarray):
+        """Score new data and grow the baseline; returns (anomalies, scores)"""
+        model = self.model  # may be swapped by a background retrain meanwhile
+        scores = model.decision_function(new_data.reshape(-1, 1))
+        predictions = model.predict(new_data.reshape(-1, 1))
+        
+        # Find anomalies
+        anomalies = [i for i, pred in enumerate(predictions) if pred == -1]
+        
+        # Incremental learning: Add normal points to baseline
+        # (the ring buffer keeps only the most recent BASELINE_SIZE points)
+        self._learn(new_data[predictions == 1])
+        
+        return anomalies, scores.tolist()
+
+    def nbytes(self) -> int:
+        """Rough memory footprint: forest node arrays plus the baseline buffer"""
+        return self.baseline.nbytes + (forest_nbytes(self.model) if self.trained else 0)
     
     def predict(self, new_data: np.ndarray):
         """Detect anomalies in new data"""
@@ -131,123 +549,568 @@ class AnomalyDetector:
             scores = self.model.decision_function(new_data.reshape(-1, 1))
             return [], scores.tolist()  # No anomalies in baseline but return scores
         
-        # Predict on new data
-        scores = self.model.decision_function(new_data.reshape(-1, 1))
-        predictions = self.model.predict(new_data.reshape(-1, 1))
-        
-        # Find anomalies
-        anomalies = [i for i, pred in enumerate(predictions) if pred == -1]
-        
-        # Incremental learning: Add normal points to baseline
-        normal_points = new_data[predictions == 1]
-        if len(normal_points) > 0:
-            self.baseline.extend(normal_points.tolist())
-            # Keep only recent 1000 points
-            self.baseline = self.baseline[-1000:]
-            # Retrain periodically
-            if len(self.baseline) % 100 == 0:
-                self.train(np.array(self.baseline))
-        
-        return anomalies, scores.tolist()
+        return self._score(new_data)
+
+    async def predict_async(self, new_data: np.ndarray, executor: ModelExecutor):
+        """Detect anomalies in new data, running the initial fit on the executor"""
+        if not self.trained:
+            await self.train_async(new_data, executor)
+            scores = self.model.decision_function(new_data.reshape(-1, 1))
+            return [], scores.tolist()
+
+        return self._score(new_data)
+
+# Pluggable anomaly engines and the model_type each one is persisted under
+# (fleet detectors are attached to their class's model in get_detector)
+ANOMALY_ENGINES = {
+    "isolation_forest": AnomalyDetector,
+    "statistical": StatisticalDetector,
+    "fleet": FleetDetector,
+}
+ANOMALY_MODEL_TYPES = {
+    "isolation_forest": "anomaly",
+    "statistical": "anomaly_statistical",
+    "fleet": "anomaly_fleet",
+}
+
+def model_type(engine: str) -> str:
+    """Store model_type of an engine's detectors (or of a shared model such as FleetModel)"""
+    return ANOMALY_MODEL_TYPES.get(engine, engine)
+
+# Engine and fleet device class chosen per device via PUT /models/{device_id}/engine,
+# stored next to the device's models so every worker (and a restart) sees them
+SETTINGS_MODEL_TYPE = "settings"
+
+device_settings = DeviceSettings(
+    load=lambda device_id: model_store.load(device_id, SETTINGS_MODEL_TYPE),
+    save=lambda device_id, settings: model_store.save(device_id, SETTINGS_MODEL_TYPE, settings),
+    stamp=lambda device_id: model_store.stamp(device_id, SETTINGS_MODEL_TYPE),
+    check_interval=MODEL_SYNC_SECONDS
+)
+
+async def get_device_settings(device_id: str) -> dict:
+    settings = device_settings.cached(device_id)
+    if settings is None:
+        settings = await model_executor.run_io(device_settings.load, device_id)
+    return settings
+
+def device_class(settings: dict) -> str:
+    return settings.get("device_class", DEFAULT_DEVICE_CLASS)
+
+shared_state = SharedModelState(
+    MODELS_DIR,
+    stamp=lambda key: model_store.stamp(key[0], model_type(key[1])),
+    name=lambda key: f"{key[0]}_{model_type(key[1])}",
+    check_interval=MODEL_SYNC_SECONDS,
+    enabled=SHARED_STATE
+)
 
-# Global detector cache
-anomaly_detectors = {}
+def persist_detector(detector: AnomalyEngine, claim: bool = True):
+    """Save a detector if this worker is its writer; replicas are never saved.
+
+    The writer pickles a snapshot taken now, not the live detector, which
+    keeps scoring (and being retrained) until the queued save runs.
+    Background callbacks pass ``claim=False``: a detector evicted while its
+    retrain ran has released its writer lock, which must not be taken back.
+    """
+    key = (detector.device_id, detector.engine)
+    if shared_state.is_writer(key) if claim else shared_state.holds(key):
+        save_model(detector.device_id, model_type(detector.engine), detector.snapshot())
+
+def state_save_due(detector: AnomalyEngine) -> bool:
+    """Whether a statistical or fleet detector's running state should be saved.
+
+    No retrain saves them, so they are saved on the retrain triggers instead:
+    after RETRAIN_EVERY_POINTS learned points, or RETRAIN_EVERY_SECONDS.
+    """
+    if detector.points_since_save == 0:
+        return False
+    return bool(
+        (RETRAIN_EVERY_POINTS and detector.points_since_save >= RETRAIN_EVERY_POINTS)
+        or (RETRAIN_EVERY_SECONDS and time.time() - detector.saved_at >= RETRAIN_EVERY_SECONDS)
+    )
+
+def load_detector(key: tuple):
+    # Claim the writer role first, so a new writer starts from the newest file
+    shared_state.is_writer(key)
+    version = model_store.stamp(key[0], model_type(key[1]))
+    detector = load_model(key[0], model_type(key[1]))
+    shared_state.loaded(key, version)
+    return detector
+
+def evict_detector(key: tuple, detector: AnomalyEngine):
+    if shared_state.holds(key):
+        # On disk before the lock goes: the next writer loads from the file
+        model_writer.write((key[0], model_type(key[1])), detector.snapshot())
+    shared_state.release(key)
+
+# Global detector cache, keyed by (device_id, engine); bounded, and evicted
+# detectors are written back to disk (by their writer) and released
+anomaly_detectors = DetectorCache(
+    loader=load_detector,
+    factory=lambda key: ANOMALY_ENGINES[key[1]](key[0]),
+    saver=evict_detector,
+    sizeof=lambda detector: detector.nbytes(),
+    max_entries=DETECTOR_CACHE_MAX_ENTRIES,
+    max_bytes=int(DETECTOR_CACHE_MAX_MB * 1024 * 1024),
+    ttl=DETECTOR_CACHE_TTL
+)
+
+async def sweep_detectors(interval: float):
+    """Periodically evict idle detectors (the write-backs run off the loop)"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            evicted = await model_executor.run_io(anomaly_detectors.sweep)
+            if evicted:
+                logger.info(f"Evicted {evicted} idle detectors")
+        except Exception as e:
+            logger.error(f"Detector sweep failed: {e!r}")
+
+def _persist_retrained(detector: AnomalyDetector):
+    persist_detector(detector, claim=False)
+    anomaly_detectors.refresh((detector.device_id, detector.engine))
+
+retrain_scheduler = RetrainScheduler(
+    model_executor,
+    RetrainPolicy(
+        every_points=RETRAIN_EVERY_POINTS,
+        every_seconds=RETRAIN_EVERY_SECONDS,
+        drift_threshold=RETRAIN_DRIFT_THRESHOLD
+    ),
+    fit_fn=fit_isolation_forest,
+    on_swapped=_persist_retrained,
+    observe_fit=MODEL_FIT_SECONDS.labels("isolation_forest").observe
+)
+
+def predict_batch(detector: AnomalyEngine, values: np.ndarray) -> tuple:
+    """Score a micro-batch with a trained detector in one call"""
+    with MODEL_PREDICT_SECONDS.labels(detector.engine).time():
+        return detector.predict(values)
+
+anomaly_batcher = MicroBatcher(
+    predict_batch,
+    max_batch=ANOMALY_BATCH_MAX,
+    max_wait=ANOMALY_BATCH_WAIT_MS / 1000
+)
+
+# Shared fleet models, one per device class; written by a single worker
+# like detectors, refitted in the background on their pooled points
+def fleet_key(name: str) -> tuple:
+    return (FLEET_PREFIX + name, FleetModel.engine)
+
+def load_fleet(name: str) -> Optional[FleetModel]:
+    return load_detector(fleet_key(name))
+
+def persist_fleet(fleet: FleetModel):
+    persist_detector(fleet)
+
+def _persist_refitted_fleet(fleet: FleetModel):
+    persist_detector(fleet, claim=False)
+
+fleets = FleetRegistry(
+    loader=load_fleet,
+    factory=lambda name: FleetModel(name, pool_size=FLEET_POOL_SIZE),
+    stale=lambda name: shared_state.stale(fleet_key(name))
+)
+
+fleet_retrainer = RetrainScheduler(
+    model_executor,
+    RetrainPolicy(
+        every_points=FLEET_RETRAIN_POINTS,
+        every_seconds=RETRAIN_EVERY_SECONDS,
+        drift_threshold=RETRAIN_DRIFT_THRESHOLD
+    ),
+    fit_fn=fit_isolation_forest,
+    on_swapped=_persist_refitted_fleet,
+    observe_fit=MODEL_FIT_SECONDS.labels("fleet").observe
+)
+
+# Fitted forecast cache (memory first, MODELS_DIR second)
+forecast_cache = ForecastModelCache(
+    loader=lambda device_id: load_model(device_id, "forecast"),
+    max_entries=FORECAST_CACHE_SIZE
+)
+
+# Warm-up of the hottest stored models; shared fleet models first, as every
+# device of their class needs them
+ENGINES_BY_MODEL_TYPE = {model_type: engine for engine, model_type in ANOMALY_MODEL_TYPES.items()}
+PRELOAD_PRIORITY = {model_type(FleetModel.engine): 0, **dict.fromkeys(ENGINES_BY_MODEL_TYPE, 1), "forecast": 2}
+
+# Every model type stored per device (what GET/DELETE /models/{device_id} cover)
+DEVICE_MODEL_TYPES = (*ANOMALY_MODEL_TYPES.values(), "forecast", "forecast_model", SETTINGS_MODEL_TYPE)
+
+def scan_models() -> List[StoredModel]:
+    return [StoredModel(*stored) for stored in model_store.stored(PRELOAD_PRIORITY)]
+
+def preload_model(model: StoredModel) -> int:
+    """Load a stored model into its registry; returns the bytes it takes (0 = not loaded)"""
+    if model.model_type == model_type(FleetModel.engine):
+        return fleets.get(model.device_id[len(FLEET_PREFIX):]).nbytes()
+    if model.model_type == "forecast":
+        return model.size if forecast_cache.load(model.device_id) is not None else 0
+    return anomaly_detectors.warm((model.device_id, ENGINES_BY_MODEL_TYPE[model.model_type]))
+
+preloader = ModelPreloader(
+    scan=scan_models,
+    load=preload_model,
+    max_models=min(PRELOAD_MODELS, DETECTOR_CACHE_MAX_ENTRIES),
+    max_bytes=int(PRELOAD_MAX_MB * 1024 * 1024),
+    workers=PRELOAD_WORKERS,
+    priority=lambda model: PRELOAD_PRIORITY[model.model_type]
+)
+
+# Finished forecasts keyed on (device_id, history hash, periods, engine);
+# degraded fallbacks are not kept
+forecast_results = ResultCache(
+    max_entries=FORECAST_RESULT_CACHE_SIZE,
+    ttl=FORECAST_RESULT_TTL,
+    cacheable=lambda response: response.model_type != "moving_average_fallback"
+)
+
+# Subsystem stats, read by Prometheus at scrape time
+register_stats("executor", model_executor.stats)
+register_stats("detector_cache", anomaly_detectors.stats, counters=("hits", "misses", "loads", "evictions"))
+register_stats("retrain", retrain_scheduler.stats, counters=("scheduled", "coalesced", "deferred", "completed", "failed"))
+register_stats("forecast_cache", lambda: {"entries": len(forecast_cache)})
+register_stats("series", series_store.stats)
+register_stats("forecast_results", forecast_results.stats, counters=("hits", "misses", "coalesced", "evictions"))
+register_stats("fleets", fleets.stats, counters=("reloads",))
+register_stats("fleet_retrain", fleet_retrainer.stats, counters=("scheduled", "coalesced", "deferred", "completed", "failed"))
+register_stats("shared_state", shared_state.stats, counters=("reloads",))
+register_stats("device_settings", device_settings.stats, counters=("reloads",))
+register_stats("anomaly_batcher", anomaly_batcher.stats, counters=("batches", "requests", "points"))
+register_stats("model_writer", model_writer.stats, counters=("submitted", "coalesced", "written", "batches", "failed"))
+register_stats("preload", preloader.status)
 
 # Helper functions
 def simple_moving_average_forecast(history: List[float], periods: int) -> tuple:
     """Simple moving average forecast for limited data"""
-    history = np.array(history)
-    window = min(len(history), 3)
-    
-    predictions = []
-    for _ in range(periods):
-        pred = np.mean(history[-window:])
-        predictions.append(pred)
-        history = np.append(history, pred)
+    predictions = forecast_histories([history], periods, MA_WINDOW, MA_WEIGHTING)[0]
     
     # Lower confidence for simple method
     confidence = [0.5] * periods
+    return predictions.tolist(), confidence
+
+def batch_moving_average_forecast(histories: List[List[float]], periods: List[int]) -> tuple:
+    """Moving average forecast for many devices in one vectorized pass.
+
+    Returns per-device (predictions, confidence) lists.
+    """
+    out = forecast_histories(histories, max(periods), MA_WINDOW, MA_WEIGHTING)
+    predictions = [out[i, :p].tolist() for i, p in enumerate(periods)]
+    confidence = [[0.5] * p for p in periods]
     return predictions, confidence
 
-def calculate_energy_savings(device_id: str, schedule: dict, historical_usage: List[float]) -> float:
-    """Calculate actual energy savings based on usage patterns"""
+FORECAST_MODEL_TYPES = ("auto", "moving_average", "seasonal", "prophet")
+
+def interval_confidence(predictions, lower_bound, upper_bound) -> List[float]:
+    """Confidence (0.1-0.95) from how wide the prediction interval is"""
+    return [
+        max(0.1, min(0.95, 1 - (upper - lower) / (abs(pred) + 0.001)))
+        for pred, lower, upper in zip(predictions, lower_bound, upper_bound)
+    ]
+
+def seasonal_forecast_batch(items: List[ForecastRequest]) -> List[ForecastResponse]:
+    """Harmonic-regression forecasts for many devices in one batched solve"""
+    with MODEL_FIT_SECONDS.labels("seasonal").time():
+        results = seasonal_forecast([item.history for item in items], [item.periods for item in items])
+    timestamp = datetime.now().isoformat()
+    return [
+        ForecastResponse(
+            device_id=item.device_id,
+            forecast=[max(0, min(100, p)) for p in predictions],
+            confidence=interval_confidence(predictions, lower_bound, upper_bound),
+            timestamp=timestamp,
+            model_type="seasonal"
+        )
+        for item, (predictions, lower_bound, upper_bound) in zip(items, results)
+    ]
+
+def load_prophet_in_workers():
+    """With a process pool, Prophet is imported and warmed up in the workers
+    (init_model_worker), never here: a worker forked while this process was
+    halfway through importing it could deadlock on the import lock"""
+    if not model_executor.submit(prophet_loaded).result():
+        raise RuntimeError("Prophet failed to load in the model workers")
+
+model_backends.register(
+    "prophet", "prophet", warmup=warm_up_prophet,
+    load=load_prophet_in_workers if POOL_KIND == "process" else None
+)
+PROPHET_AVAILABLE = model_backends.installed("prophet")
+
+def prophet_ready() -> bool:
+    """Whether Prophet has been loaded; the first call starts loading it"""
+    return model_backends.ready("prophet")
+
+def fit_prophet_forecast(device_id: str, history: List[float], horizon: int) -> ForecastEntry:
+    """Fit Prophet on hourly history and persist it.
+
+    Runs inside a model executor worker, which also saves the fitted model
+    to MODELS_DIR (as "forecast_model"). Returns a ForecastEntry holding only
+    the next `horizon` hours of forecast, so the Prophet model never crosses
+    back into the service process.
+    """
+    from prophet import Prophet  # imported and warmed up by init_model_worker
     
-    if not historical_usage or len(historical_usage) < 24:
-        return 0.0  # Not enough data
+    # Prepare data for Prophet (requires 'ds' and 'y' columns)
+    df = pd.DataFrame({
+        'ds': pd.date_range(end=datetime.now(), periods=len(history), freq='h'),
+        'y': history
+    })
     
-    # Calculate baseline consumption (24h average)
-    baseline_consumption = np.mean(historical_usage)
+    # Initialize Prophet with classroom-specific settings
+    model = Prophet(
+        daily_seasonality=True,      # Capture daily patterns
+        weekly_seasonality=True,     # Weekday vs weekend
+        yearly_seasonality=False,    # Not needed for classroom
+        changepoint_prior_scale=0.05 # Sensitivity to trend changes
+    )
     
-    # Calculate optimized consumption based on schedule
-    optimized_hours = 0
-    total_hours = 0
+    # Add custom seasonalities for classroom hours
+    model.add_seasonality(
+        name='school_hours',
+        period=24,
+        fourier_order=5,
+        condition_name='is_school_hours'
+    )
     
-    for day, times in schedule.items():
-        if times['priority'] == 'off':
-            optimized_hours += 0  # Completely off
-        elif times['priority'] == 'low':
-            optimized_hours += 8 * 0.3  # 30% usage
-        elif times['priority'] == 'medium':
-            optimized_hours += 10 * 0.6  # 60% usage
-        else:  # high
-            optimized_hours += 10 * 1.0  # Full usage
-        total_hours += 24
+    # Mark school hours (9 AM - 5 PM)
+    df['is_school_hours'] = df['ds'].dt.hour.between(9, 17)
     
-    # Calculate savings percentage
-    if total_hours > 0:
-        savings_percentage = (1 - (optimized_hours / total_hours)) * 100
-    else:
-        savings_percentage = 0
+    # Fit model
+    model.fit(df)
     
-    # Apply realistic bounds (10-40% savings)
-    return max(10.0, min(40.0, savings_percentage))
-
-def build_optimized_schedule(constraints: Dict[str, Any]) -> Dict[str, Any]:
-    """Build optimized schedule based on constraints"""
-    base_schedule = {
-        "monday": {"start": "08:00", "end": "18:00", "priority": "high"},
-        "tuesday": {"start": "08:00", "end": "18:00", "priority": "high"},
-        "wednesday": {"start": "08:00", "end": "18:00", "priority": "high"},
-        "thursday": {"start": "08:00", "end": "18:00", "priority": "high"},
-        "friday": {"start": "08:00", "end": "18:00", "priority": "high"},
-        "saturday": {"start": "09:00", "end": "17:00", "priority": "medium"},
-        "sunday": {"start": "00:00", "end": "00:00", "priority": "off"}
-    }
-
-    # Apply constraints
-    if "class_schedule" in constraints:
-        class_hours = constraints["class_schedule"]
-        for day in base_schedule:
-            if day.lower() in ["saturday", "sunday"] and not class_hours.get("weekends", False):
-                base_schedule[day] = {"start": "00:00", "end": "00:00", "priority": "off"}
-
-    if "energy_budget" in constraints:
-        budget = constraints["energy_budget"]
-        if budget < 50:  # Low budget
-            for day in base_schedule:
-                if base_schedule[day]["priority"] == "high":
-                    base_schedule[day]["priority"] = "medium"
+    # Make future dataframe
+    future = model.make_future_dataframe(periods=horizon, freq='h')
+    future['is_school_hours'] = future['ds'].dt.hour.between(9, 17)
+    
+    # Predict
+    forecast = model.predict(future)
     
-    return base_schedule
+    # Extract predictions and confidence intervals
+    entry = ForecastEntry(
+        history,
+        forecast['yhat'].tail(horizon).to_numpy(),
+        forecast['yhat_lower'].tail(horizon).to_numpy(),
+        forecast['yhat_upper'].tail(horizon).to_numpy()
+    )
+    
+    # Save the fitted model here: unpickling it in the service would import Prophet
+    model_store.save(device_id, "forecast_model", model)
+    return entry
+
+def calculate_energy_savings(device_id: str, schedule: dict, historical_usage: List[float]) -> float:
+    """Percent of the device's observed weekly usage the schedule saves"""
+    return schedule_optimizer.energy_savings(schedule, historical_usage)
+
+def plan_schedules(requests: List[ScheduleRequest]) -> List[ScheduleResponse]:
+    """Optimize many devices' weekly schedules in one vectorized pass.
+
+    Devices with less than a day of history are planned against a flat
+    profile and the default class hours, and report no savings.
+    """
+    if not requests:
+        return []
+    now = datetime.now()
+    # Fit: usage profiles and demand levels from the histories
+    with server_timing.phase("fit"):
+        histories = [request.historical_usage or [] for request in requests]
+        has_history = np.array([len(h) >= schedule_optimizer.MIN_HISTORY for h in histories])
+        profiles = np.array([
+            schedule_optimizer.usage_profile(history, now) if enough else np.ones(schedule_optimizer.HOURS_PER_WEEK)
+            for history, enough in zip(histories, has_history)
+        ])
+        needs = np.where(has_history[:, None], schedule_optimizer.demand(profiles),
+                         schedule_optimizer.default_demand())
+
+        required, budgets = [], []
+        for i, request in enumerate(requests):
+            constraints = request.constraints or {}
+            needs[i], hours = schedule_optimizer.apply_class_schedule(needs[i], constraints.get("class_schedule"))
+            budget = constraints.get("energy_budget")
+            if budget is not None and (isinstance(budget, bool) or not isinstance(budget, (int, float))):
+                raise ValueError(f"energy_budget must be a number (percent of usage), got {budget!r}")
+            required.append(hours)
+            budgets.append(np.nan if budget is None else float(budget))
+
+    with server_timing.phase("predict"):
+        plan = schedule_optimizer.optimize(profiles, needs, np.array(required), np.array(budgets))
+
+    with server_timing.phase("postprocess"):
+        timestamp = now.isoformat()
+        responses = []
+        for i, request in enumerate(requests):
+            savings = (1 - plan["energy"][i] / plan["baseline"][i]) * 100 if has_history[i] and plan["baseline"][i] > 0 else 0.0
+            budget_met = plan["budget_met"][i]
+            responses.append(ScheduleResponse(
+                device_id=request.device_id,
+                schedule=schedule_optimizer.schedule_dict(plan["levels"][i], needs[i]),
+                energy_savings=round(float(savings), 2),
+                timestamp=timestamp,
+                budget_met=None if np.isnan(budget_met) else bool(budget_met)
+            ))
+    return responses
 
 # API Endpoints
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/ready")
+async def readiness(engines: Optional[str] = None, warm: bool = False):
+    """Readiness probe reporting which model engines are loaded.
+
+    Moving-average and anomaly engines are always ready; lazily loaded
+    backends (Prophet) report their loading state. `engines` is an optional
+    comma-separated list the caller requires; the probe fails with 503 until
+    all of them are ready. `preload` reports the startup warm-up of stored
+    models; with `warm=true` the probe also fails until it has finished.
+    """
+    backends = model_backends.status()
+    states = {name: "ready" for name in ("moving_average", *ANOMALY_ENGINES)}
+    states.update({name: backend["state"] for name, backend in backends.items()})
+
+    required = [name for name in (engines or "").split(",") if name]
+    unknown = [name for name in required if name not in states]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown engines: {unknown}")
+    preload = preloader.status()
+    ready = all(states[name] == "ready" for name in required)
+    if warm:
+        ready = ready and preloader.done.is_set()
+
+    body = {
+        "ready": ready,
+        "engines": states,
+        "backends": backends,
+        "preload": preload,
+        "timestamp": datetime.now().isoformat()
+    }
+    if not ready:
+        raise HTTPException(status_code=503, detail=body)
+    return body
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "prophet_available": PROPHET_AVAILABLE,
+        "backends": model_backends.status(),
         "models_dir": str(MODELS_DIR),
+        "executor": model_executor.stats(),
+        "detector_cache": anomaly_detectors.stats(),
+        "retrain": retrain_scheduler.stats(),
+        "forecast_results": forecast_results.stats(),
+        "anomaly_batcher": anomaly_batcher.stats(),
+        "shared_state": shared_state.stats(),
+        "model_writer": model_writer.stats(),
+        "preload": preloader.status(),
+        "fleets": fleets.stats(),
+        "series": series_store.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
-@app.post("/forecast", response_model=ForecastResponse)
+async def prophet_forecast(device_id: str, history: List[float], periods: int) -> ForecastResponse:
+    """Prophet forecast, reusing a cached fit while the history hasn't moved on.
+
+    Cached forecasts come from memory first and MODELS_DIR second; a new fit
+    (run in the process pool) is only made once FORECAST_REFIT_POINTS new
+    points have arrived. Any failure falls back to the moving average.
+    """
+    try:
+        with server_timing.phase("load"):
+            entry = forecast_cache.get(device_id)
+            if entry is None:
+                entry = await model_executor.run_io(forecast_cache.load, device_id)
+        
+        cached = None
+        if entry is not None:
+            with server_timing.phase("predict"), MODEL_PREDICT_SECONDS.labels("prophet").time():
+                offset = entry.new_points(history, FORECAST_REFIT_POINTS)
+                if offset is not None:
+                    cached = entry.slice(offset, periods)
+        
+        if cached is not None:
+            predictions, lower_bound, upper_bound = cached
+        else:
+            with server_timing.phase("fit"), MODEL_FIT_SECONDS.labels("prophet").time():
+                entry = await model_executor.run(
+                    fit_prophet_forecast, device_id, history, periods + FORECAST_REFIT_POINTS
+                )
+            # The worker saved the fitted model; the forecast is saved and cached here
+            save_model(device_id, "forecast", entry)
+            forecast_cache.put(device_id, entry)
+            predictions, lower_bound, upper_bound = entry.slice(0, periods)
+        
+        with server_timing.phase("postprocess"):
+            # Calculate confidence (0-1 scale)
+            confidence = interval_confidence(predictions, lower_bound, upper_bound)
+            
+            # Ensure reasonable bounds (0-100)
+            predictions = [max(0, min(100, p)) for p in predictions]
+        
+        return ForecastResponse(
+            device_id=device_id,
+            forecast=predictions,
+            confidence=confidence,
+            timestamp=datetime.now().isoformat(),
+            model_type="prophet"
+        )
+        
+    except Exception as prophet_error:
+        # Also covers a saturated pool (ExecutorSaturated) and slow fits (TimeoutError)
+        logger.error(f"Prophet forecasting failed: {prophet_error!r}, falling back to simple method")
+        predictions, confidence = simple_moving_average_forecast(history, periods)
+        return ForecastResponse(
+            device_id=device_id,
+            forecast=predictions,
+            confidence=confidence,
+            timestamp=datetime.now().isoformat(),
+            model_type="moving_average_fallback"
+        )
+
+@app.post("/forecast", response_model=ForecastResponse,
+          openapi_extra=series_request_body(ForecastRequest))
+async def forecast_endpoint(http_request: Request):
+    """Forecast from a JSON or binary history (see payloads)"""
+    request = await parse_series_request(http_request, ForecastRequest, "history")
+    server_timing.mark("parse")
+    response = with_timings(http_request, await forecast_usage(request))
+    return negotiated_response(http_request, response, {
+        "forecast": np.asarray(response.forecast, dtype=np.float64),
+        "confidence": np.asarray(response.confidence, dtype=np.float64),
+    })
+
+async def compute_forecast(request: ForecastRequest, engine: str) -> ForecastResponse:
+    """Run one forecast with the given engine (no caching)"""
+    if engine == "seasonal":
+        with server_timing.phase("fit"):
+            return seasonal_forecast_batch([request])[0]
+    if engine == "prophet":
+        return await prophet_forecast(request.device_id, request.history, request.periods)
+    
+    with server_timing.phase("predict"), MODEL_PREDICT_SECONDS.labels("moving_average").time():
+        predictions, confidence = simple_moving_average_forecast(request.history, request.periods)
+    return ForecastResponse(
+        device_id=request.device_id,
+        forecast=predictions,
+        confidence=confidence,
+        timestamp=datetime.now().isoformat(),
+        model_type="moving_average"
+    )
+
 async def forecast_usage(request: ForecastRequest):
     """Enhanced forecasting with Prophet or fallback methods"""
     try:
+        request = await with_stored_series(request, "history")
         device_id = request.device_id
         history = request.history
         periods = request.periods
+        model_type = request.model_type or "auto"
         
         # Validate data quality
         if len(history) < 3:
@@ -255,91 +1118,32 @@ async def forecast_usage(request: ForecastRequest):
                 status_code=400,
                 detail="Need at least 3 data points for forecasting"
             )
+        if model_type not in FORECAST_MODEL_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown model_type '{model_type}', expected one of {list(FORECAST_MODEL_TYPES)}"
+            )
+        if model_type == "prophet" and not prophet_ready():
+            raise HTTPException(status_code=503, detail="Prophet is not loaded")
         
+        if model_type == "seasonal":
+            engine = "seasonal"
         # Check for data quality issues
-        if len(history) < 7 or not PROPHET_AVAILABLE:
-            logger.warning(f"Limited data ({len(history)} points) or Prophet unavailable for {device_id}")
-            predictions, confidence = simple_moving_average_forecast(history, periods)
-            return ForecastResponse(
-                device_id=device_id,
-                forecast=predictions,
-                confidence=confidence,
-                timestamp=datetime.now().isoformat(),
-                model_type="moving_average"
-            )
+        elif model_type == "moving_average" or len(history) < 7 or not prophet_ready():
+            if model_type != "moving_average":
+                logger.warning(f"Limited data ({len(history)} points) or Prophet not loaded for {device_id}")
+            engine = "moving_average"
+        else:
+            engine = "prophet"
         
-        # Use Prophet for advanced forecasting
-        try:
-            # Prepare data for Prophet (requires 'ds' and 'y' columns)
-            df = pd.DataFrame({
-                'ds': pd.date_range(end=datetime.now(), periods=len(history), freq='h'),
-                'y': history
-            })
-            
-            # Initialize Prophet with classroom-specific settings
-            model = Prophet(
-                daily_seasonality=True,      # Capture daily patterns
-                weekly_seasonality=True,     # Weekday vs weekend
-                yearly_seasonality=False,    # Not needed for classroom
-                changepoint_prior_scale=0.05 # Sensitivity to trend changes
-            )
-            
-            # Add custom seasonalities for classroom hours
-            model.add_seasonality(
-                name='school_hours',
-                period=24,
-                fourier_order=5,
-                condition_name='is_school_hours'
-            )
-            
-            # Mark school hours (9 AM - 5 PM)
-            df['is_school_hours'] = df['ds'].dt.hour.between(9, 17)
-            
-            # Fit model
-            model.fit(df)
-            
-            # Make future dataframe
-            future = model.make_future_dataframe(periods=periods, freq='h')
-            future['is_school_hours'] = future['ds'].dt.hour.between(9, 17)
-            
-            # Predict
-            forecast = model.predict(future)
-            
-            # Extract predictions and confidence intervals
-            predictions = forecast['yhat'].tail(periods).tolist()
-            lower_bound = forecast['yhat_lower'].tail(periods).tolist()
-            upper_bound = forecast['yhat_upper'].tail(periods).tolist()
-            
-            # Calculate confidence (0-1 scale)
-            confidence = [
-                max(0.1, min(0.95, 1 - (upper - lower) / (abs(pred) + 0.001)))
-                for pred, lower, upper in zip(predictions, lower_bound, upper_bound)
-            ]
-            
-            # Ensure reasonable bounds (0-100)
-            predictions = [max(0, min(100, p)) for p in predictions]
-            
-            # Save model
-            save_model(device_id, "forecast", model)
-            
-            return ForecastResponse(
-                device_id=device_id,
-                forecast=predictions,
-                confidence=confidence,
-                timestamp=datetime.now().isoformat(),
-                model_type="prophet"
-            )
-            
-        except Exception as prophet_error:
-            logger.error(f"Prophet forecasting failed: {prophet_error}, falling back to simple method")
-            predictions, confidence = simple_moving_average_forecast(history, periods)
-            return ForecastResponse(
-                device_id=device_id,
-                forecast=predictions,
-                confidence=confidence,
-                timestamp=datetime.now().isoformat(),
-                model_type="moving_average_fallback"
-            )
+        # Identical concurrent requests share one computation
+        key = (device_id, history_fingerprint(history), periods, engine)
+        with server_timing.phase("load"):
+            response, cache_status = await forecast_results.get(key, lambda: compute_forecast(request, engine))
+        server_timing.describe("load", cache_status)
+        
+        FORECASTS.labels(response.model_type).inc()
+        return response
         
     except HTTPException:
         raise  # Re-raise HTTP exceptions as-is
@@ -347,41 +1151,254 @@ async def forecast_usage(request: ForecastRequest):
         logger.error(f"Forecast error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Forecast failed: {str(e)}")
 
+@app.post("/forecast/batch")
+async def forecast_batch(request: BatchForecastRequest):
+    """Forecast a fleet of devices in one call.
+
+    Streams one NDJSON line per device as soon as it is ready: short
+    histories and seasonal items are answered first from one vectorized
+    moving-average pass and one batched seasonal solve, Prophet items follow
+    as their fits complete in the process pool.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+
+    invalid, short, seasonal_items, prophet_items = [], [], [], []
+    for item in request.items:
+        model_type = item.model_type or "auto"
+        try:
+            item = await with_stored_series(item, "history")
+        except HTTPException as e:
+            invalid.append((item, e.detail))
+            continue
+        if len(item.history) < 3:
+            invalid.append((item, "Need at least 3 data points for forecasting"))
+        elif model_type not in FORECAST_MODEL_TYPES:
+            invalid.append((item, f"Unknown model_type '{model_type}'"))
+        elif model_type == "prophet" and not prophet_ready():
+            invalid.append((item, "Prophet is not loaded"))
+        elif model_type == "seasonal":
+            seasonal_items.append(item)
+        elif model_type == "moving_average" or len(item.history) < 7 or not prophet_ready():
+            short.append(item)
+        else:
+            prophet_items.append(item)
+
+    async def stream():
+        for item, error in invalid:
+            yield json.dumps({"device_id": item.device_id, "error": error}) + "\n"
+
+        if short:
+            with MODEL_PREDICT_SECONDS.labels("moving_average").time():
+                predictions, confidence = batch_moving_average_forecast(
+                    [item.history for item in short],
+                    [item.periods for item in short]
+                )
+            FORECASTS.labels("moving_average").inc(len(short))
+            timestamp = datetime.now().isoformat()
+            for item, preds, conf in zip(short, predictions, confidence):
+                yield ForecastResponse(
+                    device_id=item.device_id,
+                    forecast=preds,
+                    confidence=conf,
+                    timestamp=timestamp,
+                    model_type="moving_average"
+                ).model_dump_json() + "\n"
+
+        if seasonal_items:
+            FORECASTS.labels("seasonal").inc(len(seasonal_items))
+            for response in seasonal_forecast_batch(seasonal_items):
+                yield response.model_dump_json() + "\n"
+
+        # Fan Prophet fits out across the pool without hogging its whole queue
+        slots = asyncio.Semaphore(model_executor.max_workers)
+
+        async def run_one(item: ForecastRequest) -> ForecastResponse:
+            key = (item.device_id, history_fingerprint(item.history), item.periods, "prophet")
+
+            async def compute():
+                async with slots:
+                    return await compute_forecast(item, "prophet")
+
+            response, _ = await forecast_results.get(key, compute)
+            return response
+
+        tasks = [asyncio.ensure_future(run_one(item)) for item in prophet_items]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                response = await next_done
+                FORECASTS.labels(response.model_type).inc()
+                yield response.model_dump_json() + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @app.post("/schedule", response_model=ScheduleResponse)
-async def optimize_schedule(request: ScheduleRequest):
-    """Optimize schedule with real energy savings calculations"""
+async def optimize_schedule(request: ScheduleRequest, http_request: Request):
+    """Optimize a device's weekly on/off/dim schedule from its usage history"""
+    server_timing.mark("parse")
     try:
-        device_id = request.device_id
-        constraints = request.constraints or {}
-        historical_usage = request.historical_usage or []
-        
-        # Build optimized schedule
-        base_schedule = build_optimized_schedule(constraints)
-        
-        # Calculate REAL energy savings
-        energy_savings = calculate_energy_savings(
-            device_id, 
-            base_schedule, 
-            historical_usage
-        )
-        
-        return ScheduleResponse(
-            device_id=device_id,
-            schedule=base_schedule,
-            energy_savings=round(energy_savings, 2),
-            timestamp=datetime.now().isoformat()
-        )
-        
+        return with_timings(http_request, plan_schedules([request])[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Schedule optimization error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Schedule optimization failed: {str(e)}")
 
-@app.post("/anomaly", response_model=AnomalyResponse)
+@app.post("/schedule/batch", response_model=BatchScheduleResponse)
+async def optimize_schedule_batch(request: BatchScheduleRequest):
+    """Optimize many devices' schedules in one vectorized call"""
+    try:
+        # Milliseconds per hundred devices, but keep large fleets off the loop
+        results = await model_executor.run_io(plan_schedules, request.items)
+        return BatchScheduleResponse(results=results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch schedule optimization error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Schedule optimization failed: {str(e)}")
+
+async def resolve_engine(device_id: str, engine: Optional[str]) -> str:
+    """Engine for a request: explicit choice, then the device's, then the default"""
+    if not engine:
+        engine = (await get_device_settings(device_id)).get("engine", DEFAULT_ANOMALY_ENGINE)
+    if engine not in ANOMALY_ENGINES:
+        raise ValueError(f"Unknown anomaly engine '{engine}', expected one of {sorted(ANOMALY_ENGINES)}")
+    return engine
+
+async def get_detector(device_id: str, engine: str) -> AnomalyEngine:
+    """Get or create a device's detector (memory first, then disk)"""
+    key = (device_id, engine)
+    with server_timing.phase("load"):
+        detector = anomaly_detectors.get(key)
+        if detector is not None and shared_state.stale(key):
+            # A replica whose writer (another worker) has saved a newer version
+            anomaly_detectors.discard(key)
+            detector = None
+        if detector is None:
+            detector = await model_executor.run_io(anomaly_detectors.load, key)
+        if isinstance(detector, FleetDetector):
+            # Follows class changes and newer copies saved by other workers
+            name = device_class(await get_device_settings(device_id))
+            detector.attach(await model_executor.run_io(fleets.get, name))
+    return detector
+
+async def score_anomalies(device_id: str, values: np.ndarray, engine: str) -> tuple:
+    """Run values through the device's detector, training it on first use"""
+    detector = await get_detector(device_id, engine)
+    fleet = detector.fleet if isinstance(detector, FleetDetector) else None
+    if not detector.trained or (fleet is not None and not fleet.trained):
+        # A first fit (or a class model still to fit) runs on the executor
+        fleet_was_trained = fleet is not None and fleet.trained
+        with server_timing.phase("fit"), MODEL_FIT_SECONDS.labels(engine).time():
+            anomalies, scores = await detector.predict_async(values, model_executor)
+        with server_timing.phase("persist"):
+            # First fit: re-measure it, which may evict (and save) other detectors
+            await model_executor.run_io(anomaly_detectors.refresh, (device_id, engine))
+            if not isinstance(detector, AnomalyDetector):
+                persist_detector(detector)  # an AnomalyDetector saves its own fit
+            if fleet is not None and fleet.trained and not fleet_was_trained:
+                persist_fleet(fleet)
+        return anomalies, scores
+
+    # Trained: score together with concurrent requests for the same detector
+    # (predict includes the wait for the batch to fill)
+    with server_timing.phase("predict"):
+        anomalies, scores = await anomaly_batcher.submit((device_id, engine), detector, values)
+    if isinstance(detector, AnomalyDetector) and shared_state.is_writer((device_id, engine)):
+        retrain_scheduler.maybe_schedule(detector)
+    elif fleet is not None and shared_state.is_writer(fleet_key(fleet.name)):
+        fleet_retrainer.maybe_schedule(fleet)
+    if not isinstance(detector, AnomalyDetector) and state_save_due(detector):
+        persist_detector(detector)
+    return anomalies, scores
+
+class AnomalyStream:
+    """Per-connection state for streaming anomaly detection.
+
+    Readings arrive one (or a few) at a time. Until a device's detector is
+    trained they are buffered; once 10 are available the detector trains on
+    them. After that each reading is scored incrementally and only anomalies
+    produce an outgoing event.
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, List[float]] = {}
+        self.recent_scores: Dict[str, deque] = {}
+        self.seq: Dict[str, int] = {}
+
+    async def feed(self, device_id: str, values: List[float],
+                   engine: Optional[str] = None) -> List[AnomalyEvent]:
+        engine = await resolve_engine(device_id, engine)
+        first_seq = self.seq.get(device_id, 0)
+        self.seq[device_id] = first_seq + len(values)
+
+        detector = await get_detector(device_id, engine)
+        if not detector.trained:
+            buffered = self.pending.setdefault(device_id, [])
+            buffered.extend(values)
+            if len(buffered) < 10:
+                return []
+            # Initial training on the buffered readings (no events for a baseline)
+            del self.pending[device_id]
+            _, scores = await score_anomalies(device_id, np.array(buffered), engine)
+            self.recent_scores.setdefault(device_id, deque(maxlen=STREAM_WINDOW)).extend(scores)
+            return []
+
+        anomalies, scores = await score_anomalies(device_id, np.array(values), engine)
+        recent = self.recent_scores.setdefault(device_id, deque(maxlen=STREAM_WINDOW))
+        recent.extend(scores)
+        threshold = float(np.percentile(recent, 10))
+        timestamp = datetime.now().isoformat()
+        return [
+            AnomalyEvent(
+                device_id=device_id,
+                seq=first_seq + i,
+                value=values[i],
+                score=scores[i],
+                threshold=threshold,
+                timestamp=timestamp
+            )
+            for i in anomalies
+        ]
+
+    async def handle_line(self, line) -> List[str]:
+        """Process one JSON message; returns the JSON lines to send back"""
+        try:
+            reading = StreamReading.model_validate_json(line)
+            values = reading.values if reading.values is not None else [reading.value]
+            if values == [None]:
+                raise ValueError("Reading needs 'value' or 'values'")
+            events = await self.feed(reading.device_id, values, reading.engine)
+            return [event.model_dump_json() for event in events]
+        except (ValidationError, ValueError) as e:
+            return [json.dumps({"error": f"Invalid reading: {e}"})]
+        except Exception as e:
+            logger.error(f"Anomaly stream error: {str(e)}")
+            return [json.dumps({"error": f"Anomaly detection failed: {str(e)}"})]
+
+@app.post("/anomaly", response_model=AnomalyResponse,
+          openapi_extra=series_request_body(AnomalyRequest))
+async def anomaly_endpoint(http_request: Request):
+    """Anomaly detection on JSON or binary values (see payloads)"""
+    request = await parse_series_request(http_request, AnomalyRequest, "values")
+    server_timing.mark("parse")
+    response = with_timings(http_request, await detect_anomalies(request))
+    anomaly = np.zeros(len(response.scores), dtype=bool)
+    anomaly[response.anomalies] = True
+    return negotiated_response(http_request, response, {
+        "score": np.asarray(response.scores, dtype=np.float64),
+        "anomaly": anomaly,
+    })
+
 async def detect_anomalies(request: AnomalyRequest):
     """Incremental anomaly detection"""
     try:
+        request = await with_stored_series(request, "values")
         device_id = request.device_id
-        values = np.array(request.values)
+        values = np.asarray(request.values, dtype=np.float64)
         
         if len(values) < 10:
             raise HTTPException(
@@ -389,42 +1406,163 @@ async def detect_anomalies(request: AnomalyRequest):
                 detail="Need at least 10 data points for anomaly detection"
             )
         
-        # Get or create detector
-        if device_id not in anomaly_detectors:
-            # Try to load from disk
-            loaded = load_model(device_id, "anomaly")
-            if loaded:
-                anomaly_detectors[device_id] = loaded
-            else:
-                anomaly_detectors[device_id] = AnomalyDetector(device_id)
+        engine = await resolve_engine(device_id, request.engine)
+        anomalies, scores = await score_anomalies(device_id, values, engine)
         
-        detector = anomaly_detectors[device_id]
-        anomalies, scores = detector.predict(values)
-        
-        threshold = np.percentile(scores, 10) if len(scores) > 0 else 0
-        
-        return AnomalyResponse(
-            device_id=device_id,
-            anomalies=anomalies,
-            scores=scores,
-            threshold=float(threshold),
-            timestamp=datetime.now().isoformat()
-        )
+        with server_timing.phase("postprocess"):
+            threshold = np.percentile(scores, 10) if len(scores) > 0 else 0
+            
+            return AnomalyResponse(
+                device_id=device_id,
+                anomalies=anomalies,
+                scores=scores,
+                threshold=float(threshold),
+                timestamp=datetime.now().isoformat(),
+                engine=engine
+            )
         
     except HTTPException:
         raise  # Re-raise HTTP exceptions as-is
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorSaturated as e:
+        logger.warning(f"Anomaly detection rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        logger.error(f"Anomaly detector training timed out for {request.device_id}")
+        raise HTTPException(status_code=504, detail="Anomaly detector training timed out")
     except Exception as e:
         logger.error(f"Anomaly detection error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Anomaly detection failed: {str(e)}")
 
+@app.websocket("/anomaly/stream")
+async def anomaly_stream_ws(websocket: WebSocket):
+    """Streaming anomaly detection: send readings, receive anomaly events"""
+    await websocket.accept()
+    stream = AnomalyStream()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            for reply in await stream.handle_line(message):
+                await websocket.send_text(reply)
+    except WebSocketDisconnect:
+        pass
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body generator consumes the request body itself.
+
+    The stock class may run a disconnect listener that competes with the
+    generator for request body messages; here a disconnect surfaces through
+    request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+@app.post("/anomaly/stream")
+async def anomaly_stream_ndjson(request: Request):
+    """NDJSON variant of /anomaly/stream for clients without WebSockets.
+
+    The request body is a stream of readings, one JSON object per line; the
+    response streams back one line per anomaly event as readings arrive.
+    """
+    stream = AnomalyStream()
+
+    async def events():
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    for reply in await stream.handle_line(line):
+                        yield reply + "\n"
+        if buffer.strip():
+            for reply in await stream.handle_line(buffer):
+                yield reply + "\n"
+
+    return DuplexStreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/series/{device_id}", response_model=SeriesAppendResponse,
+          openapi_extra=series_request_body(SeriesAppendRequest))
+async def append_series(device_id: str, http_request: Request):
+    """Append readings to a device's stored series (JSON or a binary values body)"""
+    request = await parse_series_request(http_request, SeriesAppendRequest, "values")
+    values = np.asarray(request.values, dtype=np.float64)
+    if request.timestamps is None:
+        timestamps = np.full(len(values), time.time())
+    elif len(request.timestamps) != len(values):
+        raise HTTPException(status_code=400, detail="timestamps and values must have the same length")
+    else:
+        timestamps = np.array([t.timestamp() for t in request.timestamps])
+
+    accepted, dropped = await model_executor.run_io(series_store.append, device_id, timestamps, values)
+    series = series_store.get(device_id)
+    return SeriesAppendResponse(
+        device_id=device_id,
+        accepted=accepted,
+        dropped=dropped,
+        points=len(series) if series is not None else 0,
+        timestamp=datetime.now().isoformat()
+    )
+
+@app.get("/series/{device_id}", response_model=SeriesResponse)
+async def get_series(device_id: str, http_request: Request, window: Optional[int] = None,
+                     since: Optional[datetime] = None):
+    """A device's stored readings (last `window` points, at or after `since`)"""
+    stored = await model_executor.run_io(
+        series_store.window, device_id, window, since.timestamp() if since else None
+    )
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No stored series for {device_id}")
+    timestamps, values = stored
+    response = SeriesResponse(
+        device_id=device_id,
+        timestamps=timestamps.tolist(),
+        values=values.tolist(),
+        timestamp=datetime.now().isoformat()
+    )
+    return negotiated_response(http_request, response, {"timestamps": timestamps, "values": values})
+
+@app.delete("/series/{device_id}")
+async def clear_device_series(device_id: str):
+    """Delete a device's stored series"""
+    cleared = await model_executor.run_io(series_store.delete, device_id)
+    return {
+        "device_id": device_id,
+        "cleared": cleared,
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.get("/models/{device_id}")
 async def get_model_info(device_id: str):
     """Get information about trained models for a device"""
-    model_files = list(MODELS_DIR.glob(f"{device_id}_*.pkl"))
+    model_files = model_store.files(device_id, DEVICE_MODEL_TYPES)
+    settings = await get_device_settings(device_id)
     return {
         "device_id": device_id,
         "models": [f.name for f in model_files],
-        "in_memory": device_id in anomaly_detectors,
+        "in_memory": any((device_id, engine) in anomaly_detectors for engine in ANOMALY_ENGINES),
+        "engine": settings.get("engine", DEFAULT_ANOMALY_ENGINE),
+        "device_class": device_class(settings),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.put("/models/{device_id}/engine")
+async def set_device_engine(device_id: str, request: EngineRequest):
+    """Choose the anomaly engine used for a device's requests by default"""
+    if request.engine not in ANOMALY_ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown anomaly engine '{request.engine}', expected one of {sorted(ANOMALY_ENGINES)}"
+        )
+    settings = await model_executor.run_io(
+        lambda: device_settings.update(device_id, engine=request.engine, device_class=request.device_class)
+    )
+    return {
+        "device_id": device_id,
+        "engine": request.engine,
+        "device_class": device_class(settings),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -432,16 +1570,19 @@ async def get_model_info(device_id: str):
 async def clear_device_models(device_id: str):
     """Clear all models for a device"""
     try:
-        model_files = list(MODELS_DIR.glob(f"{device_id}_*.pkl"))
-        for f in model_files:
-            f.unlink()
+        model_writer.cancel(lambda key: key[0] == device_id)
+        cleared = model_store.delete(device_id, DEVICE_MODEL_TYPES)
         
-        if device_id in anomaly_detectors:
-            del anomaly_detectors[device_id]
+        for engine in ANOMALY_ENGINES:
+            anomaly_detectors.discard((device_id, engine))
+            shared_state.forget((device_id, engine))  # and its lock file
+        device_settings.forget(device_id)
+        forecast_cache.invalidate(device_id)
+        forecast_results.invalidate(device_id)
         
         return {
             "device_id": device_id,
-            "cleared": len(model_files),
+            "cleared": cleared,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -0,0 +1,147 @@
+"""
+Prometheus metrics for the AI/ML service.
+
+``/health`` only says the process is up. The metrics here cover the rest:
+per-route request latency, fit/predict timings per model type, model store
+I/O, the share of forecasts that fell back to the moving average, and
+event-loop lag. Cache, executor and retrain figures are not instrumented on
+the hot path at all; ``StatsCollector`` reads the existing ``stats()`` dicts
+when Prometheus scrapes ``/metrics``.
+"""
+
+import asyncio
+import time
+from typing import Callable, Iterable
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Model work ranges from sub-millisecond predictions to multi-second fits
+MODEL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+REQUEST_LATENCY = Histogram(
+    "aiml_http_request_duration_seconds",
+    "HTTP request latency (streaming responses until the last chunk)",
+    ["method", "route", "status"],
+)
+MODEL_FIT_SECONDS = Histogram(
+    "aiml_model_fit_seconds",
+    "Model fit duration, including time queued in the executor",
+    ["model_type"],
+    buckets=MODEL_BUCKETS,
+)
+MODEL_PREDICT_SECONDS = Histogram(
+    "aiml_model_predict_seconds",
+    "Prediction / scoring duration with an already fitted model",
+    ["model_type"],
+    buckets=MODEL_BUCKETS,
+)
+MODEL_STORE_SECONDS = Histogram(
+    "aiml_model_store_seconds",
+    "Model store save/load duration",
+    ["operation"],
+    buckets=MODEL_BUCKETS,
+)
+FORECASTS = Counter(
+    "aiml_forecasts_total",
+    "Forecasts served, by the model that produced them",
+    ["model_type"],
+)
+STARTUP_SECONDS = Gauge(
+    "aiml_startup_seconds",
+    "Time from importing main until the service was ready to serve",
+)
+BACKEND_LOAD_SECONDS = Gauge(
+    "aiml_backend_load_seconds",
+    "Time to import and warm up a lazily loaded model backend",
+    ["backend"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "aiml_event_loop_lag_seconds",
+    "How late the event loop woke up a sleeping task",
+    buckets=LAG_BUCKETS,
+)
+EVENT_LOOP_LAG_LAST = Gauge(
+    "aiml_event_loop_lag_last_seconds",
+    "Most recent event loop lag sample",
+)
+
+
+class StatsCollector:
+    """Expose the numeric fields of a ``stats()`` dict at scrape time.
+
+    Every numeric key becomes ``aiml_{subsystem}_{key}``; keys listed in
+    ``counters`` are exported as counters (``_total``), the rest as gauges.
+    """
+
+    def __init__(self, subsystem: str, stats: Callable[[], dict], counters: Iterable[str] = ()):
+        self.subsystem = subsystem
+        self.stats = stats
+        self.counters = set(counters)
+
+    def collect(self):
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"aiml_{self.subsystem}_{key}"
+            if key in self.counters:
+                metric = CounterMetricFamily(name, f"{self.subsystem} {key}")
+            else:
+                metric = GaugeMetricFamily(name, f"{self.subsystem} {key}")
+            metric.add_metric([], value)
+            yield metric
+
+
+def register_stats(subsystem: str, stats: Callable[[], dict], counters: Iterable[str] = (),
+                   registry=REGISTRY) -> StatsCollector:
+    collector = StatsCollector(subsystem, stats, counters)
+    registry.register(collector)
+    return collector
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording REQUEST_LATENCY for every HTTP request.
+
+    Requests are labelled with the route template (``/models/{device_id}``),
+    never the raw path, so per-device URLs don't explode label cardinality.
+    Written as plain ASGI so streaming responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            ).observe(time.perf_counter() - start)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Sample event-loop lag forever: how much later than asked a sleep returns"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
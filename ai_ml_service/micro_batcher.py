@@ -0,0 +1,134 @@
+"""
+Micro-batching for anomaly scoring.
+
+Under load, bursts of ``/anomaly`` requests arrive for the same devices, and
+each one paid for its own ``decision_function`` and ``predict`` calls, most of
+which is fixed per-call overhead in sklearn. ``MicroBatcher`` holds a request
+for up to ``max_wait`` seconds so that others for the same detector can join
+it, scores the concatenated values with one call and hands every request its
+own slice of the result.
+
+The first request for a key (the leader) waits and then flushes the batch; a
+request that fills the batch to ``max_batch`` flushes it straight away.
+Requests wait on ``concurrent.futures.Future`` objects, so batches may mix
+callers from different event loops or threads.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+
+class _Batch:
+    def __init__(self, target):
+        self.target = target
+        self.chunks: List[np.ndarray] = []
+        self.futures: List[Future] = []
+        self.flushed = False
+
+
+def split_result(anomalies, scores, lengths: List[int]) -> List[Tuple[list, list]]:
+    """Split (anomaly indices, scores) of concatenated values back per chunk"""
+    anomalies = np.asarray(anomalies, dtype=np.int64)
+    results = []
+    start = 0
+    for length in lengths:
+        end = start + length
+        lo, hi = np.searchsorted(anomalies, [start, end])
+        results.append(((anomalies[lo:hi] - start).tolist(), list(scores[start:end])))
+        start = end
+    return results
+
+
+class MicroBatcher:
+    """Coalesces scoring calls per key into one vectorized call.
+
+    ``score(target, values)`` returns (anomaly indices, scores) for a 1-D
+    array, like a trained detector's ``predict``. ``max_wait`` is the longest
+    a request waits for company (0 disables batching); ``max_batch`` caps the
+    number of requests per call.
+    """
+
+    def __init__(self, score: Callable[[object, np.ndarray], tuple],
+                 max_batch: int = 64, max_wait: float = 0.002):
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending: Dict[Hashable, _Batch] = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.points = 0
+        self.largest = 0
+
+    async def submit(self, key: Hashable, target, values: np.ndarray) -> Tuple[list, list]:
+        """Score `values` with `target`, batched with other requests for `key`"""
+        if self.max_wait <= 0 or self.max_batch <= 1:
+            self._record(1, len(values))
+            anomalies, scores = self.score(target, values)
+            return list(anomalies), list(scores)
+
+        future = Future()
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[key] = _Batch(target)
+            batch.chunks.append(values)
+            batch.futures.append(future)
+            full = len(batch.futures) >= self.max_batch
+
+        result = asyncio.wrap_future(future)
+        if full:
+            self._flush(key, batch)
+        elif leader:
+            try:
+                # Returns early when a request filling the batch flushed it
+                await asyncio.wait({result}, timeout=self.max_wait)
+            finally:
+                # Flush even when cancelled, or the others would wait forever
+                self._flush(key, batch)
+        return await result
+
+    def _flush(self, key: Hashable, batch: _Batch):
+        with self._lock:
+            if batch.flushed:
+                return
+            batch.flushed = True
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+
+        lengths = [len(chunk) for chunk in batch.chunks]
+        self._record(len(lengths), sum(lengths))
+        try:
+            values = batch.chunks[0] if len(lengths) == 1 else np.concatenate(batch.chunks)
+            anomalies, scores = self.score(batch.target, values)
+            results = split_result(anomalies, scores, lengths)
+        except Exception as e:
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(batch.futures, results):
+            future.set_result(result)
+
+    def _record(self, requests: int, points: int):
+        with self._lock:
+            self.batches += 1
+            self.requests += requests
+            self.points += points
+            self.largest = max(self.largest, requests)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "points": self.points,
+            "pending": len(self._pending),
+            "largest_batch": self.largest,
+            "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
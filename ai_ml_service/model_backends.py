@@ -0,0 +1,141 @@
+"""
+Lazy loading of optional, heavy model backends.
+
+Importing ``prophet`` pulls in cmdstanpy, plotting and a compiled Stan
+model, which used to add seconds to every start (and every ``--reload``)
+before the service could answer anything. ``BackendLoader`` imports such
+backends on a background thread instead and warms them up with a tiny fit,
+so moving-average and anomaly traffic is served straight away and
+``/ready`` can report which engines have finished loading.
+
+Whether a backend is *installed* is checked with ``importlib.util.find_spec``,
+which does not import it. A backend used only in other processes (model
+executor workers) can pass its own ``load`` instead, which waits for those
+processes to be ready without importing anything here.
+"""
+
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"          # installed, loading not started yet
+LOADING = "loading"
+READY = "ready"
+UNAVAILABLE = "unavailable"  # not installed
+FAILED = "failed"            # import or warm-up raised
+
+
+def is_installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class Backend:
+    """One lazily loaded backend: ``module`` is imported, then ``warmup(module)`` runs.
+
+    A custom ``load()`` replaces both (the backend is loaded somewhere else).
+    """
+
+    def __init__(self, name: str, module: str, warmup: Optional[Callable] = None,
+                 load: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.module = module
+        self.warmup = warmup
+        self.load = load
+        self.state = PENDING if is_installed(module) else UNAVAILABLE
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.loaded = threading.Event()
+        if self.state == UNAVAILABLE:
+            self.loaded.set()
+
+
+class BackendLoader:
+    """Registry of lazily loaded backends, each loaded at most once.
+
+    ``on_loaded(name, seconds)`` is called after a backend becomes ready.
+    """
+
+    def __init__(self, on_loaded: Optional[Callable[[str, float], None]] = None):
+        self.on_loaded = on_loaded
+        self._backends: Dict[str, Backend] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, module: str, warmup: Optional[Callable] = None,
+                 load: Optional[Callable[[], None]] = None) -> Backend:
+        backend = Backend(name, module, warmup, load)
+        self._backends[name] = backend
+        if backend.state == UNAVAILABLE:
+            logger.warning(f"{module} not installed; {name} backend disabled")
+        return backend
+
+    def installed(self, name: str) -> bool:
+        return self._backends[name].state != UNAVAILABLE
+
+    def start(self, name: str) -> bool:
+        """Start loading `name` in the background; False if already started or not installed"""
+        backend = self._backends[name]
+        with self._lock:
+            if backend.state != PENDING:
+                return False
+            backend.state = LOADING
+        threading.Thread(
+            target=self._load, args=(backend,), name=f"load-{name}", daemon=True
+        ).start()
+        return True
+
+    def start_all(self):
+        for name in self._backends:
+            self.start(name)
+
+    def ready(self, name: str) -> bool:
+        """Whether `name` can be used now; the first call kicks off its loading"""
+        backend = self._backends[name]
+        if backend.state == PENDING:
+            self.start(name)
+        return backend.state == READY
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> bool:
+        """Block until `name` has finished loading (successfully or not)"""
+        self.ready(name)
+        self._backends[name].loaded.wait(timeout)
+        return self._backends[name].state == READY
+
+    def _load(self, backend: Backend):
+        start = time.perf_counter()
+        try:
+            if backend.load is not None:
+                backend.load()
+            else:
+                module = importlib.import_module(backend.module)
+                if backend.warmup is not None:
+                    backend.warmup(module)
+        except Exception as e:
+            backend.error = repr(e)
+            backend.state = FAILED
+            logger.error(f"Loading {backend.name} backend failed: {e!r}")
+        else:
+            backend.load_seconds = time.perf_counter() - start
+            backend.state = READY
+            logger.info(f"{backend.name} backend ready in {backend.load_seconds:.2f}s")
+            if self.on_loaded is not None:
+                self.on_loaded(backend.name, backend.load_seconds)
+        finally:
+            backend.loaded.set()
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "state": backend.state,
+                "load_seconds": backend.load_seconds,
+                "error": backend.error,
+            }
+            for name, backend in self._backends.items()
+        }
@@ -0,0 +1,152 @@
+"""
+Execution layer for CPU-bound model work.
+
+Prophet and IsolationForest fits take anywhere from tens of milliseconds to
+several seconds. Running them directly inside an ``async def`` handler blocks
+the uvicorn event loop, so ``/health`` and cheap moving-average forecasts
+queue up behind them. ``ModelExecutor`` runs that work in a process pool
+instead, with a bounded number of outstanding tasks and a per-task timeout.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when the executor already holds ``max_queue`` outstanding tasks"""
+
+
+def default_worker_count() -> int:
+    """Leave one core for the event loop, but always use at least one worker"""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class ModelExecutor:
+    """Bounded process pool for fits, predictions and other heavy model work.
+
+    ``kind`` is ``"process"`` (default) or ``"thread"``. The thread variant is
+    useful for debugging and for environments where forking is not allowed.
+    The pool is created lazily on first use so importing ``main`` stays cheap.
+    ``initializer`` (process pools only) runs once in each worker process as
+    it starts, e.g. to import and warm up a heavy backend there.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: int = 32,
+        task_timeout: float = 120.0,
+        kind: str = "process",
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.max_workers = max_workers or default_worker_count()
+        self.max_queue = max_queue
+        self.task_timeout = task_timeout
+        self.kind = kind
+        self.initializer = initializer
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Tasks submitted to the pool that have not finished yet"""
+        return self._pending
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.kind == "process":
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers, initializer=self.initializer
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="model-worker",
+                    )
+                logger.info(f"Started {self.kind} pool with {self.max_workers} workers")
+            return self._pool
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_queue:
+                raise ExecutorSaturated(
+                    f"Model executor is saturated ({self._pending} tasks pending)"
+                )
+            self._pending += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Submit ``fn(*args)`` without waiting; for background work.
+
+        Raises ``ExecutorSaturated`` if too many tasks are outstanding.
+        """
+        self._acquire()
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self._reset_pool()
+            raise
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Run ``fn(*args)`` in the pool and await its result.
+
+        Raises ``ExecutorSaturated`` if too many tasks are outstanding and
+        ``asyncio.TimeoutError`` if the task exceeds its timeout. A timed-out
+        task cannot be interrupted inside a worker process, so its slot stays
+        occupied until it finishes; this keeps the queue bound honest.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout or self.task_timeout
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time
+            self._reset_pool()
+            raise
+
+    async def run_io(self, fn: Callable, *args) -> Any:
+        """Run blocking I/O such as ``joblib.dump`` on the default thread pool"""
+        return await asyncio.to_thread(fn, *args)
+
+    def _reset_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            logger.warning("Model executor pool is broken, restarting it")
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "pending": self._pending,
+            "max_queue": self.max_queue,
+            "task_timeout": self.task_timeout,
+        }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,186 @@
+"""
+Crash-safe on-disk store for fitted models.
+
+Models used to be written with a bare ``joblib.dump`` straight onto
+``MODELS_DIR/{device_id}_{model_type}.pkl``: a crash mid-write left a
+truncated pickle behind and nothing recorded what was in a file. The store
+writes an envelope ``{"schema", "version", "saved_at", "model_type",
+"model"}`` to a temp file in the same directory, fsyncs it and renames it
+over ``{device_id}_{model_type}.joblib``, so readers only ever see a complete
+file. Legacy ``.pkl`` files are still read.
+
+Uncompressed files can optionally be loaded with ``mmap_mode``, which maps
+bare numpy arrays in the payload read-only from the file. It is off by
+default: sklearn trees copy their node arrays into their own memory when
+unpickled, so a mapped IsolationForest gains nothing and loads slower.
+"""
+
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 2
+EXTENSION = ".joblib"
+LEGACY_EXTENSION = ".pkl"
+TEMP_PREFIX = ".tmp-"
+
+
+class ModelStore:
+    """Atomic, versioned model files under one directory.
+
+    ``compress`` is a joblib compression level (0 disables it). Compressed
+    files cannot be memory-mapped, so ``mmap`` only applies when it is 0.
+    """
+
+    def __init__(self, root: Path, compress: int = 0, mmap: bool = False):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.compress = compress
+        self.mmap = mmap
+
+    def path(self, device_id: str, model_type: str) -> Path:
+        return self.root / f"{device_id}_{model_type}{EXTENSION}"
+
+    def legacy_path(self, device_id: str, model_type: str) -> Path:
+        return self.root / f"{device_id}_{model_type}{LEGACY_EXTENSION}"
+
+    def save(self, device_id: str, model_type: str, model, sync_dir: bool = True) -> Path:
+        """Write a model atomically (temp file + fsync + rename).
+
+        With ``sync_dir=False`` the rename is only durable after the next
+        ``sync_dir()``, so a batch of saves can share one directory fsync.
+        """
+        envelope = {
+            "schema": SCHEMA_VERSION,
+            "version": time.time_ns(),
+            "saved_at": datetime.now().isoformat(),
+            "model_type": model_type,
+            "model": model,
+        }
+        path = self.path(device_id, model_type)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=TEMP_PREFIX, suffix=EXTENSION)
+        os.close(fd)
+        try:
+            joblib.dump(envelope, tmp, compress=self.compress)
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        if sync_dir:
+            self.sync_dir()
+
+        # The new file supersedes any pre-store pickle
+        self.legacy_path(device_id, model_type).unlink(missing_ok=True)
+        return path
+
+    def load(self, device_id: str, model_type: str):
+        """Load a model, or None if there is none (or it has an unknown schema)"""
+        envelope = self.load_envelope(device_id, model_type)
+        return envelope["model"] if envelope is not None else None
+
+    def load_envelope(self, device_id: str, model_type: str) -> Optional[dict]:
+        path = self.path(device_id, model_type)
+        if path.exists():
+            mmap_mode = "r" if self.mmap and not self.compress else None
+            envelope = joblib.load(path, mmap_mode=mmap_mode)
+            if not isinstance(envelope, dict) or envelope.get("schema") != SCHEMA_VERSION:
+                logger.warning(f"Ignoring {path}: unsupported schema")
+                return None
+            return envelope
+
+        legacy = self.legacy_path(device_id, model_type)
+        if legacy.exists():
+            return {
+                "schema": 1,
+                "version": legacy.stat().st_mtime_ns,
+                "saved_at": datetime.fromtimestamp(legacy.stat().st_mtime).isoformat(),
+                "model_type": model_type,
+                "model": joblib.load(legacy),
+            }
+        return None
+
+    def stamp(self, device_id: str, model_type: str) -> Optional[tuple]:
+        """Cheap fingerprint of a model's file, changing with every save (None if absent)"""
+        for path in (self.path(device_id, model_type), self.legacy_path(device_id, model_type)):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        return None
+
+    def files(self, device_id: str, model_types: Iterable[str]) -> List[Path]:
+        """The device's stored files of the given model types.
+
+        Matched by exact name: a ``{device_id}_*`` glob would also pick up
+        the files of devices whose ids start with ``{device_id}_``.
+        """
+        return sorted(
+            path for model_type in model_types
+            for path in (self.path(device_id, model_type), self.legacy_path(device_id, model_type))
+            if path.exists()
+        )
+
+    def stored(self, model_types: Iterable[str]) -> List[Tuple[str, str, float, int]]:
+        """(device_id, model_type, mtime, size) of every stored model of the given types.
+
+        Device ids may contain underscores, so file names are split on the
+        known model types (longest first).
+        """
+        suffixes = sorted(model_types, key=len, reverse=True)
+        models = []
+        for path in self.root.glob(f"*{EXTENSION}"):
+            stem = path.name[:-len(EXTENSION)]
+            for model_type in suffixes:
+                if stem.endswith(f"_{model_type}") and len(stem) > len(model_type) + 1:
+                    try:
+                        stat = path.stat()
+                    except FileNotFoundError:
+                        break
+                    models.append((stem[:-len(model_type) - 1], model_type, stat.st_mtime, stat.st_size))
+                    break
+        return models
+
+    def delete(self, device_id: str, model_types: Iterable[str]) -> int:
+        """Remove the device's files of the given model types; returns how many were removed"""
+        removed = 0
+        for f in self.files(device_id, model_types):
+            f.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def purge_temp(self, older_than: float = 3600) -> int:
+        """Remove temp files left behind by writes interrupted by a crash"""
+        cutoff = time.time() - older_than
+        removed = 0
+        for f in self.root.glob(f"{TEMP_PREFIX}*"):
+            try:
+                if f.stat().st_mtime < cutoff:
+                    f.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def sync_dir(self):
+        """Make renames into the directory durable (not supported on every platform)"""
+        try:
+            fd = os.open(self.root, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
@@ -0,0 +1,172 @@
+"""
+Background, debounced model persistence.
+
+Every first fit, background retrain and Prophet refit used to write its model
+with a full ``joblib.dump`` plus two fsyncs before the request (or the
+retrain callback) could carry on, and a device that was trained twice in a
+second was written twice. ``ModelWriter`` queues saves instead:
+
+- ``submit(key, model)`` returns at once. The save happens on a background
+  thread ``delay`` seconds later; if the same key is submitted again in the
+  meantime only the latest model is written.
+- Everything due is written as one batch and the directory is fsynced once
+  for the whole batch (``sync``) instead of once per file.
+- ``get(key)`` returns a model that is queued or being written, so a reload
+  never reads an older file than the last save.
+- ``flush()`` writes everything now; ``close()`` flushes and stops the thread
+  on shutdown. ``write(key, model)`` saves synchronously, for callers that
+  must know the file is on disk (a worker handing a model over to another).
+
+With ``delay=0`` every submit is written synchronously, as before.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWriter:
+    """Debounced write-behind queue for ``save(key, model)``.
+
+    ``save`` writes one model without the final directory fsync; ``sync``
+    (optional) makes a batch of writes durable.
+    """
+
+    def __init__(self, save: Callable[[Hashable, object], None],
+                 sync: Optional[Callable[[], None]] = None, delay: float = 1.0):
+        self.save = save
+        self.sync = sync
+        self.delay = delay
+        self._pending: Dict[Hashable, object] = {}
+        self._writing: Dict[Hashable, object] = {}
+        self._first_pending: Optional[float] = None
+        self._lock = threading.Condition()
+        self._write_lock = threading.Lock()  # one batch at a time, in order
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.submitted = 0
+        self.coalesced = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    def submit(self, key: Hashable, model):
+        """Queue `model` to be saved under `key`, replacing a queued older state"""
+        if self.delay <= 0 or self._closed:
+            self.write(key, model)
+            return
+        with self._lock:
+            self.submitted += 1
+            if key in self._pending:
+                self.coalesced += 1
+            elif not self._pending:
+                self._first_pending = time.monotonic()
+            self._pending[key] = model
+            self._ensure_thread()
+            self._lock.notify()
+
+    def get(self, key: Hashable):
+        """The model queued or being written for `key`, or None"""
+        with self._lock:
+            model = self._pending.get(key)
+            return model if model is not None else self._writing.get(key)
+
+    def write(self, key: Hashable, model):
+        """Save now (blocking), superseding a queued save of `key`"""
+        with self._write_lock:
+            with self._lock:
+                self._pending.pop(key, None)
+                self._writing[key] = model
+            try:
+                self._write_batch({key: model})
+            finally:
+                with self._lock:
+                    self._writing.clear()
+
+    def cancel(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop queued saves whose key matches (the models were deleted).
+
+        Waits for a batch being written, so no cancelled model lands on disk
+        after this returns.
+        """
+        with self._write_lock, self._lock:
+            keys = [key for key in self._pending if predicate(key)]
+            for key in keys:
+                del self._pending[key]
+            return len(keys)
+
+    def flush(self):
+        """Write everything queued now (blocking)"""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+            try:
+                self._write_batch(batch)
+            finally:
+                with self._lock:
+                    self._writing = {}
+
+    def close(self):
+        """Flush and stop the background thread (shutdown); later submits write synchronously"""
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._lock.wait()
+                if self._closed:
+                    return
+                due = self._first_pending + self.delay
+                now = time.monotonic()
+                if now < due:
+                    # Saves submitted meanwhile join this batch
+                    self._lock.wait(due - now)
+                    continue
+            self.flush()
+
+    def _write_batch(self, batch: Dict[Hashable, object]):
+        if not batch:
+            return
+        written = 0
+        for key, model in batch.items():
+            try:
+                self.save(key, model)
+                written += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Saving model {key} failed: {e!r}")
+        if written and self.sync is not None:
+            try:
+                self.sync()
+            except OSError as e:
+                logger.warning(f"Syncing saved models failed: {e!r}")
+        with self._lock:
+            self.written += written
+            self.batches += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "written": self.written,
+                "batches": self.batches,
+                "failed": self.failed,
+                "delay_seconds": self.delay,
+            }
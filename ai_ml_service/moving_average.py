@@ -0,0 +1,95 @@
+"""
+Closed-form recursive moving-average forecasting.
+
+The recursive window-mean forecast feeds each prediction back into the
+window: y[t+1] = sum_j w[j] * y[t+1-W+j]. Every step is linear in the last
+``window`` observed values, so the h-step-ahead forecast is a fixed linear
+combination of them. ``forecast_coefficients`` computes that
+``(periods, window)`` matrix once per configuration (and caches it); a
+forecast is then a single matrix product, for one device or a 2-D stack of
+many devices at once, with no per-step array copies.
+"""
+
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+WEIGHTINGS = ("sma", "wma", "ewma")
+
+
+def window_weights(window: int, weighting: str = "sma", alpha: Optional[float] = None) -> np.ndarray:
+    """Weights over a window ordered oldest -> newest, summing to 1.
+
+    sma: equal weights; wma: linearly increasing (1..window);
+    ewma: alpha * (1 - alpha)^age, alpha defaulting to 2 / (window + 1).
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    if weighting == "sma":
+        weights = np.ones(window)
+    elif weighting == "wma":
+        weights = np.arange(1, window + 1, dtype=np.float64)
+    elif weighting == "ewma":
+        alpha = 2.0 / (window + 1) if alpha is None else alpha
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        age = np.arange(window - 1, -1, -1)
+        weights = alpha * (1 - alpha) ** age
+    else:
+        raise ValueError(f"Unknown weighting '{weighting}', expected one of {WEIGHTINGS}")
+    return weights / weights.sum()
+
+
+@lru_cache(maxsize=128)
+def forecast_coefficients(
+    window: int, periods: int, weighting: str = "sma", alpha: Optional[float] = None
+) -> np.ndarray:
+    """(periods, window) matrix mapping the last `window` values to each forecast step"""
+    weights = window_weights(window, weighting, alpha)
+    # Row i expresses window slot i as a combination of the observed values
+    state = np.eye(window)
+    coefficients = np.empty((periods, window))
+    for step in range(periods):
+        row = weights @ state
+        coefficients[step] = row
+        state = np.roll(state, -1, axis=0)
+        state[-1] = row
+    # Guard against rounding drift in the row sums
+    coefficients /= coefficients.sum(axis=1, keepdims=True)
+    coefficients.setflags(write=False)
+    return coefficients
+
+
+def moving_average_forecast(
+    windows: np.ndarray, periods: int, weighting: str = "sma", alpha: Optional[float] = None
+) -> np.ndarray:
+    """Forecast from the last values of one (1-D) or many (2-D, one row per device) series.
+
+    The last axis holds the window, oldest value first. Returns an array of
+    shape ``windows.shape[:-1] + (periods,)``.
+    """
+    windows = np.asarray(windows, dtype=np.float64)
+    coefficients = forecast_coefficients(windows.shape[-1], periods, weighting, alpha)
+    # Coefficient rows sum to 1, so forecasting deviations from the latest
+    # value is equivalent and keeps flat series exactly flat
+    latest = windows[..., -1:]
+    return latest + (windows - latest) @ coefficients.T
+
+
+def forecast_histories(
+    histories: List[List[float]], periods: int, window: int = 3,
+    weighting: str = "sma", alpha: Optional[float] = None
+) -> np.ndarray:
+    """Forecast ragged histories, batching together those sharing a window length.
+
+    Histories shorter than `window` use all their points, like the single
+    device path. Returns a (n_histories, periods) array.
+    """
+    out = np.empty((len(histories), periods))
+    lengths = np.array([min(len(h), window) for h in histories])
+    for width in np.unique(lengths):
+        rows = np.flatnonzero(lengths == width)
+        stacked = np.array([histories[i][-width:] for i in rows], dtype=np.float64)
+        out[rows] = moving_average_forecast(stacked, periods, weighting, alpha)
+    return out
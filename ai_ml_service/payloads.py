@@ -0,0 +1,223 @@
+"""
+Binary request/response payloads for long series.
+
+A 10k-point history sent as JSON is parsed into 10k Python floats and then
+validated one by one, which costs more than most of the models. Besides
+JSON, ``/forecast`` and ``/anomaly`` accept the series as:
+
+- ``application/x-npy``: a 1-D ``.npy`` file
+- ``application/octet-stream``: raw little-endian numbers (``?dtype=float32``,
+  default float64; float, int and uint dtypes only)
+- ``application/vnd.apache.arrow.stream``: Arrow IPC stream with one numeric
+  column (the series field name, or the first column); needs pyarrow
+- ``application/msgpack``: the JSON object, packed; the series may be a list
+  or ``bin`` holding little-endian float64s; needs msgpack
+
+For the array formats the scalar fields (``device_id``, ``periods`` ...) come
+from the query string. float64 input is wrapped with ``np.frombuffer`` over
+the request body, so it is never copied or converted per element.
+
+Responses follow the ``Accept`` header with the same formats. msgpack
+responses have the JSON shape; array formats carry the per-point columns in
+the body (a structured ``.npy`` array, an Arrow table, or the first column
+as raw float64) and the scalar fields as ``X-*`` headers (Arrow also stores
+them in the schema metadata).
+
+pyarrow and msgpack are listed in requirements.txt; without them their
+formats are answered with 415 and everything else keeps working.
+"""
+
+import io
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+NPY = "application/x-npy"
+RAW = "application/octet-stream"
+ARROW = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+
+FORMATS = {
+    JSON: JSON,
+    NPY: NPY,
+    "application/npy": NPY,
+    RAW: RAW,
+    ARROW: ARROW,
+    "application/x-msgpack": MSGPACK,
+    MSGPACK: MSGPACK,
+}
+
+
+class PayloadError(ValueError):
+    """Body can't be decoded (bad data, or a format whose library is missing)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _media_type(header: Optional[str]) -> str:
+    return (header or "").split(";")[0].strip().lower()
+
+
+def request_format(content_type: Optional[str]) -> str:
+    """Payload format for a Content-Type header (missing means JSON)"""
+    media_type = _media_type(content_type) or JSON
+    if media_type not in FORMATS:
+        raise PayloadError(f"Unsupported content type: {media_type}", status_code=415)
+    return FORMATS[media_type]
+
+
+def response_format(accept: Optional[str]) -> str:
+    """First supported format listed in an Accept header (default JSON)"""
+    for part in (accept or "").split(","):
+        media_type = _media_type(part)
+        if media_type in FORMATS:
+            return FORMATS[media_type]
+    return JSON
+
+
+def _require(module, name: str):
+    if module is None:
+        raise PayloadError(f"{name} is not installed on the server", status_code=415)
+    return module
+
+
+def _as_series(array: np.ndarray) -> np.ndarray:
+    if array.ndim != 1:
+        raise PayloadError(f"Expected a 1-D series, got shape {array.shape}")
+    if array.dtype.kind not in "fiu":
+        raise PayloadError(f"Expected numeric values, got dtype {array.dtype}")
+    # float64 passes through as is (no copy); other widths are converted once
+    array = array.astype(np.float64, copy=False)
+    if not np.isfinite(array).all():
+        raise PayloadError("Series contains NaN or infinite values")
+    return array
+
+
+def decode_series(body: bytes, fmt: str, field: str, dtype: Optional[str] = None) -> np.ndarray:
+    """Decode an NPY, raw or Arrow body into a float64 numpy array"""
+    if fmt == RAW:
+        try:
+            raw_dtype = np.dtype(dtype or "float64").newbyteorder("<")
+        except (TypeError, ValueError) as e:
+            raise PayloadError(f"Invalid dtype: {e}")
+        if raw_dtype.kind not in "fiu":
+            # Object, string and void dtypes can't be read from raw bytes
+            raise PayloadError(f"Expected a numeric dtype, got {raw_dtype}")
+        if len(body) % raw_dtype.itemsize:
+            raise PayloadError(f"Body length is not a multiple of {raw_dtype.itemsize} bytes")
+        return _as_series(np.frombuffer(body, dtype=raw_dtype))
+
+    if fmt == NPY:
+        stream = io.BytesIO(body)
+        try:
+            version = np.lib.format.read_magic(stream)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(stream)
+            elif version == (2, 0):
+                header = np.lib.format.read_array_header_2_0(stream)
+            else:
+                raise ValueError(f"unsupported format version {version}")
+            shape, fortran_order, npy_dtype = header
+        except ValueError as e:
+            raise PayloadError(f"Invalid .npy payload: {e}")
+        if npy_dtype.hasobject:
+            raise PayloadError("Object arrays are not accepted")
+        count = int(np.prod(shape))
+        if len(body) - stream.tell() < count * npy_dtype.itemsize:
+            raise PayloadError("Truncated .npy payload")
+        array = np.frombuffer(body, dtype=npy_dtype, count=count, offset=stream.tell())
+        return _as_series(array.reshape(shape, order="F" if fortran_order else "C"))
+
+    if fmt == ARROW:
+        _require(pa, "pyarrow")
+        try:
+            table = pa.ipc.open_stream(body).read_all()
+        except pa.ArrowInvalid as e:
+            raise PayloadError(f"Invalid Arrow stream: {e}")
+        if table.num_columns == 0:
+            raise PayloadError("Arrow stream has no columns")
+        column = table.column(field) if field in table.column_names else table.column(0)
+        if column.null_count:
+            raise PayloadError("Series contains nulls")
+        # Zero-copy for a single chunk; several chunks are concatenated once
+        chunk = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        return _as_series(chunk.to_numpy(zero_copy_only=False))
+
+    raise PayloadError(f"{fmt} does not carry a bare series")
+
+
+def decode_msgpack(body: bytes, field: str) -> Tuple[dict, Optional[np.ndarray]]:
+    """Unpack a msgpack object; returns (scalar fields, series or None)"""
+    _require(msgpack, "msgpack")
+    try:
+        data = msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise PayloadError(f"Invalid msgpack payload: {e}")
+    if not isinstance(data, dict):
+        raise PayloadError("msgpack payload must be a map")
+    values = data.pop(field, None)
+    if values is None:
+        return data, None
+    if isinstance(values, bytes):
+        return data, decode_series(values, RAW, field)
+    try:
+        return data, _as_series(np.asarray(values, dtype=np.float64))
+    except (TypeError, ValueError) as e:
+        raise PayloadError(f"Invalid '{field}': {e}")
+
+
+def pack(data: dict) -> bytes:
+    """msgpack-encode a response object (same shape as its JSON)"""
+    return _require(msgpack, "msgpack").packb(data)
+
+
+def _header_name(key: str) -> str:
+    return "X-" + "-".join(part.capitalize() for part in key.split("_"))
+
+
+def encode(fmt: str, scalars: Dict[str, object], columns: Dict[str, np.ndarray]) -> Tuple[bytes, Dict[str, str]]:
+    """Encode an array-format (NPY, raw, Arrow) response; returns (body, headers).
+
+    ``scalars`` are the single-valued fields, ``columns`` equal-length
+    per-point arrays.
+    """
+    headers = {_header_name(key): str(value) for key, value in scalars.items()}
+    if fmt == RAW:
+        first = next(iter(columns.values()))
+        return np.ascontiguousarray(first, dtype="<f8").tobytes(), headers
+
+    if fmt == NPY:
+        length = len(next(iter(columns.values())))
+        record = np.empty(length, dtype=[(name, np.asarray(values).dtype.newbyteorder("<"))
+                                         for name, values in columns.items()])
+        for name, values in columns.items():
+            record[name] = values
+        stream = io.BytesIO()
+        np.save(stream, record, allow_pickle=False)
+        return stream.getvalue(), headers
+
+    if fmt == ARROW:
+        _require(pa, "pyarrow")
+        table = pa.table(
+            {name: np.asarray(values) for name, values in columns.items()},
+            metadata={key: str(value) for key, value in scalars.items()}
+        )
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), headers
+
+    raise PayloadError(f"Cannot encode {fmt}")
@@ -0,0 +1,149 @@
+"""
+Startup warm-up of the most recently used models.
+
+After a restart every device's first ``/anomaly`` call loaded its detector
+from MODELS_DIR on the request path, so a deploy showed up as a latency
+spike across the whole fleet. ``ModelPreloader`` scans the stored models
+once at startup, ranks them and loads the top ``max_models`` into the
+in-memory registries on a small thread pool, until ``max_bytes`` of
+(estimated) model memory is used. It runs in the background: requests are
+served meanwhile, and ``status()`` (reported by ``/ready``) shows progress.
+
+Models are ranked by ``priority`` (shared models such as a device class's
+fleet forest first), then by when their file was last written: detectors
+are saved when they are fitted, retrained or evicted, so recently written
+files belong to recently active devices.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+DISABLED = "disabled"
+FAILED = "failed"
+
+
+class StoredModel(NamedTuple):
+    device_id: str
+    model_type: str
+    mtime: float
+    size: int  # file size in bytes
+
+
+class ModelPreloader:
+    """Loads the hottest stored models in parallel, within a memory budget.
+
+    ``scan()`` lists the stored models; ``load(model)`` puts one into its
+    registry and returns the bytes it takes there (0 if it was not loaded,
+    e.g. a request got there first). ``priority(model)`` ranks model types
+    (lower first).
+    """
+
+    def __init__(self, scan: Callable[[], List[StoredModel]], load: Callable[[StoredModel], int],
+                 max_models: int = 256, max_bytes: int = 128 * 1024 * 1024, workers: int = 4,
+                 priority: Callable[[StoredModel], int] = lambda model: 0):
+        self.scan = scan
+        self.load = load
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        self.priority = priority
+        self.state = DISABLED if max_models <= 0 else PENDING
+        self.candidates = 0
+        self.loaded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+        if self.state == DISABLED:
+            self.done.set()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def rank(self, models: List[StoredModel]) -> List[StoredModel]:
+        ranked = sorted(models, key=lambda model: (self.priority(model), -model.mtime))
+        return ranked[:self.max_models]
+
+    def start(self) -> bool:
+        """Start warming up in the background; False if disabled or already started"""
+        with self._lock:
+            if self.state != PENDING:
+                return False
+            self.state = LOADING
+        threading.Thread(target=self._run, name="model-preload", daemon=True).start()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the warm-up has finished (successfully or not)"""
+        return self.done.wait(timeout)
+
+    def _run(self):
+        self._started = time.perf_counter()
+        try:
+            ranked = self.rank(self.scan())
+            self.candidates = len(ranked)
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="preload") as pool:
+                for _ in pool.map(self._load_one, ranked):
+                    pass
+        except Exception as e:
+            self.error = repr(e)
+            self.state = FAILED
+            logger.error(f"Model preload failed: {e!r}")
+        else:
+            self.state = READY
+        finally:
+            self.seconds = time.perf_counter() - self._started
+            self.done.set()
+        if self.state == READY:
+            logger.info(f"Preloaded {self.loaded} of {self.candidates} models "
+                        f"({self.bytes / 1e6:.1f} MB) in {self.seconds:.2f}s")
+
+    def _load_one(self, model: StoredModel):
+        with self._lock:
+            over_budget = self.bytes >= self.max_bytes
+        if over_budget:
+            self._count(skipped=1)
+            return
+        try:
+            size = self.load(model)
+        except Exception as e:
+            logger.warning(f"Preloading {model.device_id} {model.model_type} failed: {e!r}")
+            self._count(failed=1)
+            return
+        if size:
+            self._count(loaded=1, size=size)
+        else:
+            self._count(skipped=1)
+
+    def _count(self, loaded=0, skipped=0, failed=0, size=0):
+        with self._lock:
+            self.loaded += loaded
+            self.skipped += skipped
+            self.failed += failed
+            self.bytes += size
+
+    def status(self) -> dict:
+        finished = self.loaded + self.skipped + self.failed
+        elapsed = self.seconds if self.seconds is not None else (
+            time.perf_counter() - self._started if self.state == LOADING else None)
+        return {
+            "state": self.state,
+            "candidates": self.candidates,
+            "loaded": self.loaded,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "progress": round(finished / self.candidates, 4) if self.candidates else float(self.state == READY),
+            "seconds": round(elapsed, 3) if elapsed is not None else None,
+            "error": self.error,
+        }
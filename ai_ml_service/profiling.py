@@ -0,0 +1,253 @@
+"""
+On-demand request profiling and a slow-request log.
+
+When a ``/forecast`` takes seconds in production, latency histograms say
+that it was slow but not where the time went (frame building, the Stan fit,
+``predict`` over the history, ``joblib.dump``). ``ProfilingMiddleware`` adds:
+
+- Opt-in profiling: a request carrying ``X-Profile: <token>`` (or
+  ``?profile=<token>``) runs under a sampling profiler, and the samples are
+  written to ``profile_dir`` as a folded-stacks file
+  (``thread;module:function;... count`` per line), the input format of
+  ``flamegraph.pl``, speedscope and most other flame-graph tools. The
+  response names the file in ``X-Profile-File``. Without a token configured
+  the hook is off.
+- Slow-request log: a watchdog thread notices any request whose response
+  has not started after ``slow_seconds``, then samples the process's stacks
+  until it starts, logs the hottest stacks and writes them next to the
+  profiles. Only the time to the response start counts, so long-lived
+  streams (``POST /anomaly/stream``) are not sampled for their whole life.
+
+Stopping the profiler, writing the files and logging happen on a worker
+thread after the response, never on the event loop.
+
+Samples come from ``sys._current_frames()``, so every thread of the process
+is seen (the event loop and the thread pools). Idle threads are skipped;
+concurrent requests show up in each other's profiles. Work running in the
+model *process* pool is invisible; use ``AIML_POOL_KIND=thread`` to include
+it.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_PARAM = "profile"
+EXTENSION = ".folded"
+
+# Leaf frames of threads that are waiting rather than working
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+def sample_stacks(exclude=()) -> Counter:
+    """One folded stack per busy thread, root first"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = Counter()
+    for ident, frame in sys._current_frames().items():
+        if ident in exclude:
+            continue
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            continue
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        labels.append(names.get(ident, str(ident)))
+        stacks[";".join(reversed(labels))] += 1
+    return stacks
+
+
+class StackSampler:
+    """Samples every thread's stack every ``interval`` seconds on a daemon thread"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.stacks.update(sample_stacks(exclude=(me,)))
+            self.samples += 1
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+
+def write_folded(stacks: Counter, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def summarize(stacks: Counter, top: int = 5) -> str:
+    """The `top` hottest stacks, innermost few frames each"""
+    total = sum(stacks.values()) or 1
+    lines = []
+    for stack, count in stacks.most_common(top):
+        frames = stack.split(";")
+        tail = " <- ".join(reversed(frames[-4:]))
+        lines.append(f"  {100 * count / total:5.1f}%  {tail}")
+    return "\n".join(lines)
+
+
+def profile_name(method: str, path: str, suffix: str = "") -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    return f"{stamp}-{os.getpid()}-{method}-{slug}{suffix}{EXTENSION}"
+
+
+class _Watched:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.monotonic()
+        self.elapsed: Optional[float] = None  # until the response started
+        self.stacks = Counter()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware for opt-in request profiles and the slow-request log.
+
+    ``token`` enables ``X-Profile`` / ``?profile=`` (empty = disabled);
+    ``slow_seconds`` is the slow-request threshold (0 = disabled);
+    ``interval`` is the profiler's sampling period in seconds.
+    """
+
+    def __init__(self, app, profile_dir: Path, token: str = "", slow_seconds: float = 5.0,
+                 interval: float = 0.005):
+        self.app = app
+        self.profile_dir = Path(profile_dir)
+        self.token = token
+        self.slow_seconds = slow_seconds
+        self.interval = interval
+        self._inflight: Dict[int, _Watched] = {}
+        self._lock = threading.Lock()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def _requested(self, scope) -> bool:
+        if not self.token:
+            return False
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                return value.decode("latin-1") == self.token
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get(PROFILE_PARAM, [None])[0] == self.token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        watched = None
+        if self.slow_seconds > 0:
+            watched = _Watched(scope["method"], scope["path"])
+            with self._lock:
+                self._inflight[id(watched)] = watched
+            self._ensure_watchdog()
+
+        sampler = name = None
+        if self._requested(scope):
+            name = profile_name(scope["method"], scope["path"])
+            sampler = StackSampler(self.interval).start()
+
+        async def send_watched(message):
+            if message["type"] == "http.response.start":
+                if watched is not None:
+                    self._unwatch(watched)
+                if sampler is not None:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-profile-file", name.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_watched)
+        finally:
+            if watched is not None:
+                self._unwatch(watched)  # no response was started (an error)
+            if sampler is not None or (watched is not None and watched.stacks):
+                await asyncio.to_thread(self._finish, scope, sampler, name, watched)
+
+    def _unwatch(self, watched: _Watched):
+        with self._lock:
+            if self._inflight.pop(id(watched), None) is not None:
+                watched.elapsed = time.monotonic() - watched.started
+
+    def _finish(self, scope, sampler: Optional[StackSampler], name: Optional[str],
+                watched: Optional[_Watched]):
+        """Stop the profiler and write the files (blocking; off the event loop)"""
+        if sampler is not None:
+            path = write_folded(sampler.stop(), self.profile_dir / name)
+            logger.info(f"Profiled {scope['method']} {scope['path']}: {sampler.samples} samples in {path}")
+        if watched is not None and watched.stacks:
+            self._log_slow(watched)
+
+    def _ensure_watchdog(self):
+        if self._watchdog is not None:
+            return
+        with self._lock:
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch, name="slow-request-watchdog", daemon=True)
+                self._watchdog.start()
+
+    def _watch(self):
+        # Coarser than the profiler: this runs for every slow request
+        period = min(0.05, self.slow_seconds / 10)
+        me = threading.get_ident()
+        while True:
+            time.sleep(period)
+            deadline = time.monotonic() - self.slow_seconds
+            with self._lock:
+                slow = [w for w in self._inflight.values() if w.started <= deadline]
+            if slow:
+                stacks = sample_stacks(exclude=(me,))
+                with self._lock:
+                    for watched in slow:
+                        if id(watched) in self._inflight:  # not started responding meanwhile
+                            watched.stacks.update(stacks)
+
+    def _log_slow(self, watched: _Watched):
+        elapsed = watched.elapsed if watched.elapsed is not None else time.monotonic() - watched.started
+        path = write_folded(watched.stacks, self.profile_dir / profile_name(watched.method, watched.path, "-slow"))
+        logger.warning(
+            f"Slow request {watched.method} {watched.path} took {elapsed:.2f}s to respond "
+            f"(threshold {self.slow_seconds}s); hottest stacks after the threshold, "
+            f"full profile in {path}:\n{summarize(watched.stacks)}"
+        )
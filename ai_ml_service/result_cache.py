@@ -0,0 +1,123 @@
+"""
+Short-lived result cache with single-flight deduplication.
+
+Dashboards (several open tabs) and proxy retries send identical forecast
+requests within seconds of each other, and each one used to run its own
+fit. ``ResultCache`` keeps finished results for ``ttl`` seconds and makes
+concurrent callers with the same key share one computation: the first
+caller (the leader) computes, the others await its result.
+
+The in-flight marker is a ``concurrent.futures.Future``, so callers on
+different event loops (or threads) coalesce as well.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+
+
+class ResultCache:
+    """TTL + LRU bounded results, computed at most once at a time per key.
+
+    ``cacheable(result)`` decides whether a finished result is kept (e.g.
+    not degraded fallbacks); uncacheable results are still shared with the
+    callers that were waiting for them. Keys are tuples whose first item is
+    the device id, so ``invalidate(device_id)`` can drop a device's entries.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0,
+                 cacheable: Optional[Callable[[object], bool]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cacheable = cacheable or (lambda result: True)
+        self._entries: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get(self, key: Tuple, compute: Callable[[], Awaitable]) -> Tuple[object, str]:
+        """Cached or freshly computed result for `key`; returns (result, HIT/MISS/COALESCED)"""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() < entry[0]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1], HIT
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = Future()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                return await self._lead(key, future, compute), MISS
+            try:
+                # shield: a cancelled waiter must not cancel the shared future
+                return await asyncio.shield(asyncio.wrap_future(future)), COALESCED
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; compete to become the next one
+
+    async def _lead(self, key, future: Future, compute: Callable[[], Awaitable]):
+        try:
+            result = await compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            if isinstance(e, Exception):
+                future.set_exception(e)
+            else:
+                future.cancel()
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            if self.ttl > 0 and self.cacheable(result):
+                self._entries[key] = (time.monotonic() + self.ttl, result)
+                self._entries.move_to_end(key)
+                self._evict()
+        future.set_result(result)
+        return result
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+            self.evictions += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, device_id: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == device_id]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
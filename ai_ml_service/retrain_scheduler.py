@@ -0,0 +1,159 @@
+"""
+Background retraining for anomaly detectors.
+
+Retraining used to happen inline in ``AnomalyDetector.predict``, so the
+unlucky request that crossed the retrain point paid for a full fit plus a
+model save. ``RetrainScheduler`` decides when a detector is due (policy),
+submits the fit to the model executor without waiting for it, and swaps the
+new model in once it is ready. At most one retrain per device is in flight;
+further requests for the same device are coalesced into it.
+
+Scheduling is loop-agnostic (plain ``concurrent.futures``), so it works the
+same from request handlers, the streaming endpoints and tests.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from model_executor import ExecutorSaturated, ModelExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RetrainPolicy:
+    """When a trained detector should be refitted; 0 disables a trigger.
+
+    every_points: after this many new normal points since the last fit
+    every_seconds: once the model is this old (and new points arrived)
+    drift_threshold: when the mean of new points has moved this many
+        training standard deviations away from the training mean
+    """
+
+    def __init__(self, every_points: int = 100, every_seconds: float = 0,
+                 drift_threshold: float = 3.0, min_drift_points: int = 10):
+        self.every_points = every_points
+        self.every_seconds = every_seconds
+        self.drift_threshold = drift_threshold
+        self.min_drift_points = min_drift_points
+
+    def reason(self, detector) -> Optional[str]:
+        """Why `detector` should be retrained now, or None"""
+        if not detector.trained or detector.points_since_train == 0:
+            return None
+        if self.every_points and detector.points_since_train >= self.every_points:
+            return "points"
+        if self.every_seconds and time.time() - detector.trained_at >= self.every_seconds:
+            return "interval"
+        if (self.drift_threshold and detector.points_since_train >= self.min_drift_points
+                and detector.drift() >= self.drift_threshold):
+            return "drift"
+        return None
+
+
+class RetrainScheduler:
+    """Coalescing background retrainer.
+
+    ``fit_fn(data)`` runs on the model executor and returns a fitted model.
+    ``on_swapped(detector)`` runs after the new model is installed (e.g. to
+    persist it); it runs on the scheduler's own thread, never on a request.
+    ``detector.swap_model`` runs on that thread too, while requests keep
+    scoring, so detectors guard their counters and baseline with a lock.
+    ``observe_fit(seconds)`` receives the duration of each successful fit,
+    measured from submission (so it includes time queued in the executor).
+    """
+
+    def __init__(self, executor: ModelExecutor, policy: RetrainPolicy,
+                 fit_fn: Callable, on_swapped: Optional[Callable] = None,
+                 observe_fit: Optional[Callable[[float], None]] = None):
+        self.executor = executor
+        self.policy = policy
+        self.fit_fn = fit_fn
+        self.on_swapped = on_swapped
+        self.observe_fit = observe_fit
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrain")
+        self.scheduled = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.deferred = 0
+
+    def maybe_schedule(self, detector) -> bool:
+        """Schedule a retrain if the policy says the detector is due"""
+        reason = self.policy.reason(detector)
+        if reason is None:
+            return False
+        return self.request(detector, reason)
+
+    def request(self, detector, reason: str = "manual") -> bool:
+        """Start a background retrain unless one is already running for the device"""
+        device_id = detector.device_id
+        with self._lock:
+            if device_id in self._inflight:
+                self.coalesced += 1
+                return False
+            data = detector.training_data()
+            consumed = detector.points_since_train
+            submitted = time.monotonic()
+            try:
+                future = self.executor.submit(self.fit_fn, data)
+            except ExecutorSaturated:
+                # Still due on the next scored batch
+                self.deferred += 1
+                return False
+            self._inflight[device_id] = future
+            self.scheduled += 1
+
+        logger.info(f"Scheduled retrain for {device_id} ({reason}, {len(data)} points)")
+        future.add_done_callback(
+            lambda f: self._finisher.submit(
+                self._finish, detector, data, consumed, f, time.monotonic() - submitted
+            )
+        )
+        return True
+
+    def _finish(self, detector, data, consumed: int, future: Future, elapsed: float):
+        try:
+            model = future.result()
+            if self.observe_fit is not None:
+                self.observe_fit(elapsed)
+            detector.swap_model(model, data, consumed)
+            self.completed += 1
+            if self.on_swapped is not None:
+                self.on_swapped(detector)
+            logger.info(f"Retrained anomaly detector for {detector.device_id}")
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Retrain failed for {detector.device_id}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.pop(detector.device_id, None)
+
+    def in_flight(self, device_id: str) -> bool:
+        return device_id in self._inflight
+
+    def wait_idle(self, timeout: float = 30.0) -> bool:
+        """Block until every scheduled retrain has been swapped in"""
+        deadline = time.monotonic() + timeout
+        while self._inflight:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "scheduled": self.scheduled,
+            "coalesced": self.coalesced,
+            "deferred": self.deferred,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def shutdown(self):
+        self._finisher.shutdown(wait=True)
@@ -0,0 +1,114 @@
+"""
+Fixed-capacity numpy ring buffer for detector baselines.
+
+Baselines used to be Python lists (about 32 bytes per float once boxed) that
+were extended, re-sliced to the last 1000 points and copied again with
+``np.array`` for every training run. ``RingBuffer`` stores the values in a
+typed array instead. Each value is written twice, at ``i`` and
+``i + capacity``, so the most recent ``len(buffer)`` values are always one
+contiguous slice: appends are O(1) and ``view()`` returns them in order
+without copying.
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+
+class RingBuffer:
+    """Last ``capacity`` values of a series, oldest first"""
+
+    __slots__ = ("_data", "_capacity", "_end", "_size")
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self._capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._end = 0  # next write position in [0, capacity)
+        self._size = 0
+
+    @classmethod
+    def from_array(cls, values: Iterable[float], capacity: int, dtype=np.float32) -> "RingBuffer":
+        buffer = cls(capacity, dtype)
+        buffer.extend(values)
+        return buffer
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float):
+        self._data[self._end] = value
+        self._data[self._end + self._capacity] = value
+        self._end = (self._end + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def extend(self, values: Iterable[float]):
+        values = np.asarray(values, dtype=self._data.dtype).ravel()
+        n = len(values)
+        if n == 0:
+            return
+        cap = self._capacity
+        if n >= cap:
+            self._data[:cap] = values[-cap:]
+            self._data[cap:] = values[-cap:]
+            self._end = 0
+            self._size = cap
+            return
+
+        first = min(n, cap - self._end)
+        self._data[self._end:self._end + first] = values[:first]
+        self._data[self._end + cap:self._end + cap + first] = values[:first]
+        rest = n - first
+        if rest:
+            self._data[:rest] = values[first:]
+            self._data[cap:cap + rest] = values[first:]
+        self._end = (self._end + n) % cap
+        self._size = min(self._size + n, cap)
+
+    def view(self) -> np.ndarray:
+        """Read-only, ordered view of the stored values (no copy).
+
+        The view aliases the buffer, so it changes as values are appended;
+        copy it before handing it to work that outlives the current call.
+        """
+        if self._end >= self._size:
+            view = self._data[self._end - self._size:self._end]
+        else:
+            view = self._data[self._end + self._capacity - self._size:self._end + self._capacity]
+        view = view.view()
+        view.flags.writeable = False
+        return view
+
+    def tolist(self) -> list:
+        return self.view().tolist()
+
+    def clear(self):
+        self._end = 0
+        self._size = 0
+
+    def __reduce__(self):
+        # Pickle only the ordered values, not the mirrored 2x storage
+        return (
+            _restore_ring_buffer,
+            (self._capacity, self._data.dtype.str, self.view().copy()),
+        )
+
+    def __repr__(self) -> str:
+        return f"RingBuffer(size={self._size}, capacity={self._capacity}, dtype={self.dtype})"
+
+
+def _restore_ring_buffer(capacity: int, dtype: str, values: np.ndarray) -> RingBuffer:
+    return RingBuffer.from_array(values, capacity, np.dtype(dtype))
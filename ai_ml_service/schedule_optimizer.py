@@ -0,0 +1,242 @@
+"""
+Hour-of-week schedule optimizer.
+
+A week is 168 hourly slots (Monday 00:00 = slot 0). A device's hourly usage
+history is folded into a 168-slot profile, from which a demand level per slot
+is derived (0 = idle, 1 = fully in use). Every day is then given one of a
+fixed set of candidate plans: off all day, or "on" over a contiguous window
+with optional "dim" shoulders of 1-2 hours either side. A plan costs the
+energy it uses plus ``comfort`` times the demand it leaves unserved; hours
+listed in the class schedule must be on.
+
+Energy and served demand of every candidate are two matrix products of the
+(devices x days x 24) profiles with the (candidates x 24) plan masks, so a
+whole fleet is evaluated in one shot. An ``energy_budget`` (percent of the
+observed weekly usage) is met by lowering ``comfort`` until the week fits.
+
+Slots are local wall-clock hours, like ``seasonal``.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+HOURS_PER_WEEK = 168
+EPOCH_SLOT = 72  # 1970-01-01 00:00 was a Thursday
+DIM_LEVEL = 0.5
+MAX_SHOULDER = 2
+DEFAULT_COMFORT = 2.0
+COMFORT_GRID = np.geomspace(0.05, DEFAULT_COMFORT, 16)
+MIN_HISTORY = 24
+
+# Assumed use when neither history nor a class schedule says otherwise
+# (the previous fixed template): weekdays 08-18, Saturday 09-17
+DEFAULT_CLASS_HOURS = (8, 18)
+
+
+def hour_of_week(n: int, end: Optional[datetime] = None) -> np.ndarray:
+    """Slots of `n` hourly readings, the last one in the hour of `end` (default now)"""
+    end = end or datetime.now()
+    end_hour = int((end.replace(tzinfo=None) - datetime(1970, 1, 1)).total_seconds() // 3600)
+    return (np.arange(end_hour - n + 1, end_hour + 1) + EPOCH_SLOT) % HOURS_PER_WEEK
+
+
+def usage_profile(history, end: Optional[datetime] = None) -> np.ndarray:
+    """Mean usage per hour-of-week slot.
+
+    Slots the history does not reach take that hour's mean over the other
+    days, and failing that the overall mean.
+    """
+    history = np.asarray(history, dtype=np.float64)
+    slots = hour_of_week(len(history), end)
+    counts = np.bincount(slots, minlength=HOURS_PER_WEEK)
+    sums = np.bincount(slots, weights=history, minlength=HOURS_PER_WEEK)
+    profile = np.divide(sums, counts, out=np.full(HOURS_PER_WEEK, np.nan), where=counts > 0)
+
+    by_hour = profile.reshape(7, 24)
+    seen = ~np.isnan(by_hour)
+    hourly = np.divide(np.nansum(by_hour, axis=0), seen.sum(axis=0),
+                       out=np.full(24, np.nan), where=seen.any(axis=0))
+    by_hour = np.where(seen, by_hour, hourly)
+    overall = float(history.mean()) if len(history) else 0.0
+    return np.where(np.isnan(by_hour), overall, by_hour).ravel()
+
+
+def demand(profile: np.ndarray) -> np.ndarray:
+    """Demand level per slot: usage scaled between standby (p10) and peak (p95)"""
+    standby, peak = np.percentile(profile, [10, 95], axis=-1, keepdims=True)
+    span = peak - standby
+    flat = span <= 1e-9 * np.maximum(np.abs(peak), 1.0)
+    scaled = np.clip((profile - standby) / np.where(flat, 1.0, span), 0.0, 1.0)
+    return np.where(flat, (profile > 0).astype(np.float64), scaled)
+
+
+def _parse_hour(value, default: int) -> int:
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+    hour, _, minute = str(value).partition(":")
+    # A class ending at 17:30 needs the 17:00 slot
+    return int(hour) + (1 if minute and int(minute) > 0 else 0)
+
+
+def class_hours(class_schedule: Optional[Dict[str, Any]]) -> np.ndarray:
+    """Slots that must be on for a ``class_schedule`` constraint.
+
+    ``{"weekends": bool, "start": "08:00", "end": "18:00"}``, plus optional
+    per-day ``{"monday": ["09:00", "15:00"], ...}`` overrides (an empty list
+    frees the day).
+    """
+    required = np.zeros((7, 24), dtype=bool)
+    if not class_schedule:
+        return required.ravel()
+    start = _parse_hour(class_schedule.get("start"), DEFAULT_CLASS_HOURS[0])
+    end = _parse_hour(class_schedule.get("end"), DEFAULT_CLASS_HOURS[1])
+    days = 7 if class_schedule.get("weekends", False) else 5
+    required[:days, start:end] = True
+    for i, day in enumerate(DAYS):
+        if day in class_schedule:
+            hours = class_schedule[day] or []
+            required[i] = False
+            if hours:
+                required[i, _parse_hour(hours[0], start):_parse_hour(hours[1], end)] = True
+    return required.ravel()
+
+
+def apply_class_schedule(need: np.ndarray, class_schedule: Optional[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """(need, required) for a ``class_schedule``: class hours are required and
+    fully needed; without ``weekends`` the weekend has no demand"""
+    required = class_hours(class_schedule)
+    need = need.copy()
+    if class_schedule and not class_schedule.get("weekends", False):
+        need.reshape(7, 24)[5:] = 0.0
+    return np.maximum(need, required), required
+
+
+def default_demand() -> np.ndarray:
+    need = np.zeros((7, 24))
+    need[:5, DEFAULT_CLASS_HOURS[0]:DEFAULT_CLASS_HOURS[1]] = 1.0
+    need[5, 9:17] = 1.0
+    return need.ravel()
+
+
+@lru_cache(maxsize=1)
+def candidate_plans() -> Tuple[np.ndarray, np.ndarray]:
+    """(on, dim) masks, (candidates x 24), of every plan for one day"""
+    on, dim = [np.zeros(24)], [np.zeros(24)]
+    for start in range(24):
+        for end in range(start + 1, 25):
+            for shoulder in range(MAX_SHOULDER + 1):
+                window = np.zeros(24)
+                window[start:end] = 1.0
+                shoulders = np.zeros(24)
+                shoulders[max(start - shoulder, 0):start] = 1.0
+                shoulders[end:min(end + shoulder, 24)] = 1.0
+                if shoulder and not shoulders.any():
+                    continue  # shoulders fell off the day; same as shoulder=0
+                on.append(window)
+                dim.append(shoulders)
+    return np.array(on), np.array(dim)
+
+
+def optimize(profiles: np.ndarray, needs: np.ndarray, required: np.ndarray,
+             budgets: np.ndarray) -> Dict[str, np.ndarray]:
+    """Best weekly plan for each device.
+
+    ``profiles``, ``needs`` and ``required`` are (devices x 168); ``budgets``
+    is percent of each device's profile energy (NaN = no budget). Returns
+    ``levels`` (devices x 168, 0 / DIM_LEVEL / 1), ``energy`` and ``baseline``
+    (profile units per week), ``served`` (share of demand met) and
+    ``budget_met`` (NaN where there was no budget).
+    """
+    on, dim = candidate_plans()
+    P = profiles.reshape(-1, 7, 24)
+    N = needs.reshape(-1, 7, 24)
+    R = required.reshape(-1, 7, 24).astype(np.float64)
+
+    # (devices x days x candidates)
+    energy = P @ (on + DIM_LEVEL * dim).T
+    served = (P * N) @ on.T + (P * np.minimum(N, DIM_LEVEL)) @ dim.T
+    unserved = (P * N).sum(axis=-1, keepdims=True) - served
+    infeasible = np.where(R @ (1.0 - on).T > 0, np.inf, 0.0)
+
+    # One plan per day for every comfort weight, cheapest weight first
+    choices = np.stack([np.argmin(energy + comfort * unserved + infeasible, axis=-1)
+                        for comfort in COMFORT_GRID], axis=-1)  # devices x days x grid
+    weekly = np.take_along_axis(energy, choices, axis=-1).sum(axis=1)  # devices x grid
+
+    baseline = P.sum(axis=(1, 2))
+    has_budget = ~np.isnan(budgets)
+    allowance = np.where(has_budget, budgets, 100.0) / 100.0 * baseline
+    fits = weekly <= allowance[:, None] + 1e-9
+    # Most comfortable weight that fits the budget, else the leanest plan
+    last_fit = np.where(fits.any(axis=1), COMFORT_GRID.size - 1 - np.argmax(fits[:, ::-1], axis=1), 0)
+    pick = np.where(has_budget, last_fit, COMFORT_GRID.size - 1)
+
+    days = np.take_along_axis(choices, pick[:, None, None], axis=-1)[..., 0]  # devices x days
+    levels = (on[days] + DIM_LEVEL * dim[days]).reshape(-1, HOURS_PER_WEEK)
+    chosen_served = np.take_along_axis(served, days[..., None], axis=-1)[..., 0].sum(axis=1)
+    total_need = (P * N).sum(axis=(1, 2))
+    used = (profiles * levels).sum(axis=1)
+    return {
+        "levels": levels,
+        "energy": used,
+        "baseline": baseline,
+        "served": np.divide(chosen_served, total_need, out=np.ones_like(total_need), where=total_need > 0),
+        "budget_met": np.where(has_budget, used <= allowance + 1e-9, np.nan),
+    }
+
+
+def _clock(hour: int) -> str:
+    return f"{hour:02d}:00"
+
+
+def schedule_dict(levels: np.ndarray, needs: np.ndarray) -> Dict[str, Dict[str, Any]]:
+    """Per-day ``{"start", "end", "priority", "levels"}`` for one device's week"""
+    schedule = {}
+    for day, day_levels, day_need in zip(DAYS, levels.reshape(7, 24), needs.reshape(7, 24)):
+        on_hours = np.flatnonzero(day_levels >= 1.0)
+        if len(on_hours) == 0:
+            entry = {"start": "00:00", "end": "00:00", "priority": "off"}
+        else:
+            covered = np.minimum(day_levels, day_need).sum() / max(day_need.sum(), 1e-9)
+            priority = "high" if covered >= 0.9 else "medium" if covered >= 0.5 else "low"
+            entry = {"start": _clock(on_hours[0]), "end": _clock(on_hours[-1] + 1), "priority": priority}
+        entry["levels"] = day_levels.tolist()
+        schedule[day] = entry
+    return schedule
+
+
+# Usage multipliers of a priority when a schedule has no per-hour levels
+PRIORITY_LEVELS = {"off": 0.0, "low": 0.3, "medium": 0.6, "high": 1.0}
+
+
+def schedule_levels(schedule: Dict[str, Dict[str, Any]]) -> np.ndarray:
+    """Hour-of-week levels of a schedule (``levels`` lists, or start/end/priority)"""
+    levels = np.zeros((7, 24))
+    for i, day in enumerate(DAYS):
+        entry = schedule.get(day)
+        if not entry:
+            continue
+        if "levels" in entry:
+            levels[i] = entry["levels"]
+            continue
+        start, end = _parse_hour(entry.get("start"), 0), _parse_hour(entry.get("end"), 0)
+        levels[i, start:end or 24] = PRIORITY_LEVELS.get(entry.get("priority"), 1.0)
+    return levels.ravel()
+
+
+def energy_savings(schedule: Dict[str, Dict[str, Any]], history: List[float],
+                   end: Optional[datetime] = None) -> float:
+    """Percent of the observed weekly usage a schedule saves (0 without a day of history)"""
+    if history is None or len(history) < MIN_HISTORY:
+        return 0.0
+    profile = usage_profile(history, end)
+    baseline = profile.sum()
+    if baseline <= 0:
+        return 0.0
+    return float((1.0 - (profile * schedule_levels(schedule)).sum() / baseline) * 100)
@@ -0,0 +1,212 @@
+"""
+Per-device time-series store.
+
+Clients used to send a device's whole history with every ``/forecast`` and
+``/anomaly`` call. ``SeriesStore`` keeps the readings server-side instead:
+``POST /series/{device_id}`` appends them, and requests can refer to the
+stored series by device id and window.
+
+Each device is two columns, float64 epoch-second timestamps and float64
+values. In memory they are ``RingBuffer``s of ``max_points``, so retention
+by count is free; retention by age is applied when reading. On disk each
+column is an append-only file of little-endian float64s under ``root``, so an
+ingest writes only the new readings. Once a file holds twice ``max_points``
+it is compacted (rewritten atomically with just the retained tail). After a
+crash between the two appends the shorter column wins on load.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+logger = logging.getLogger(__name__)
+
+DTYPE = np.dtype("<f8")
+COLUMNS = ("timestamps", "values")
+EXTENSION = ".f64"
+
+
+class DeviceSeries:
+    """Retained readings of one device, oldest first"""
+
+    def __init__(self, max_points: int):
+        self.timestamps = RingBuffer(max_points, DTYPE)
+        self.values = RingBuffer(max_points, DTYPE)
+        self.on_disk = 0  # rows in the column files, compacted or not
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def last_timestamp(self) -> float:
+        return float(self.timestamps.view()[-1]) if len(self.timestamps) else -np.inf
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        self.timestamps.extend(timestamps)
+        self.values.extend(values)
+
+    def window(self, points: Optional[int] = None, since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Copies of the last `points` readings at or after `since`"""
+        with self.lock:
+            timestamps, values = self.timestamps.view(), self.values.view()
+            start = 0
+            if since is not None:
+                start = int(np.searchsorted(timestamps, since, side="left"))
+            if points is not None:
+                start = max(start, len(values) - points)
+            return timestamps[start:].copy(), values[start:].copy()
+
+
+class SeriesStore:
+    """Bounded per-device series, persisted as append-only column files.
+
+    ``retention`` (seconds, 0 = none) drops old readings from reads and
+    compactions; ``max_points`` bounds each device; at most ``max_devices``
+    series are kept in memory (least recently used are dropped, they stay on
+    disk).
+    """
+
+    def __init__(self, root: Path, max_points: int = 10080, retention: float = 0,
+                 max_devices: int = 1024):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_points = max_points
+        self.retention = retention
+        self.max_devices = max_devices
+        self._series: "OrderedDict[str, DeviceSeries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, device_id: str, column: str) -> Path:
+        return self.root / f"{device_id}_{column}{EXTENSION}"
+
+    def get(self, device_id: str) -> Optional[DeviceSeries]:
+        """A device's series from memory, else disk; None if it has none"""
+        with self._lock:
+            series = self._series.get(device_id)
+            if series is not None:
+                self._series.move_to_end(device_id)
+                return series
+        series = self._load(device_id)
+        return self._remember(device_id, series) if series is not None else None
+
+    def _remember(self, device_id: str, series: DeviceSeries) -> DeviceSeries:
+        with self._lock:
+            # Another thread may have loaded it meanwhile; keep the first
+            series = self._series.setdefault(device_id, series)
+            self._series.move_to_end(device_id)
+            while len(self._series) > self.max_devices:
+                self._series.popitem(last=False)
+        return series
+
+    def _load(self, device_id: str) -> Optional[DeviceSeries]:
+        paths = [self.path(device_id, column) for column in COLUMNS]
+        if not all(p.exists() for p in paths):
+            return None
+        timestamps, values = (np.fromfile(p, dtype=DTYPE) for p in paths)
+        n = min(len(timestamps), len(values))
+        series = DeviceSeries(self.max_points)
+        series.extend(timestamps[:n], values[:n])
+        series.on_disk = n
+        return series
+
+    def append(self, device_id: str, timestamps, values) -> Tuple[int, int]:
+        """Append readings; returns (accepted, dropped).
+
+        Readings are ordered by timestamp; any older than the device's
+        latest stored reading are dropped.
+        """
+        timestamps = np.asarray(timestamps, dtype=DTYPE)
+        values = np.asarray(values, dtype=DTYPE)
+        if timestamps.shape != values.shape or timestamps.ndim != 1:
+            raise ValueError("timestamps and values must be 1-D and the same length")
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, values = timestamps[order], values[order]
+
+        series = self.get(device_id)
+        if series is None:
+            series = self._remember(device_id, DeviceSeries(self.max_points))
+
+        with series.lock:
+            keep = timestamps >= series.last_timestamp
+            timestamps, values = timestamps[keep], values[keep]
+            if len(values):
+                series.extend(timestamps, values)
+                self._append_files(device_id, series, timestamps, values)
+        return len(values), int((~keep).sum())
+
+    def _append_files(self, device_id: str, series: DeviceSeries, timestamps, values):
+        if series.on_disk + len(values) > 2 * self.max_points:
+            self._compact(device_id, series)
+            return
+        for column, data in zip(COLUMNS, (timestamps, values)):
+            with open(self.path(device_id, column), "ab") as f:
+                f.write(data.tobytes())
+        series.on_disk += len(values)
+
+    def _compact(self, device_id: str, series: DeviceSeries):
+        timestamps, values = series.timestamps.view(), series.values.view()
+        if self.retention:
+            start = int(np.searchsorted(timestamps, time.time() - self.retention))
+            timestamps, values = timestamps[start:], values[start:]
+        for column, data in zip(COLUMNS, (timestamps, values)):
+            path = self.path(device_id, column)
+            fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-", suffix=EXTENSION)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+        series.on_disk = len(values)
+        logger.info(f"Compacted series for {device_id} to {len(values)} points")
+
+    def window(self, device_id: str, points: Optional[int] = None,
+               since: Optional[float] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(timestamps, values) of a device within retention, or None if unknown"""
+        series = self.get(device_id)
+        if series is None:
+            return None
+        if self.retention:
+            cutoff = time.time() - self.retention
+            since = cutoff if since is None else max(since, cutoff)
+        return series.window(points, since)
+
+    def delete(self, device_id: str) -> int:
+        """Forget a device's series; returns how many files were removed"""
+        with self._lock:
+            self._series.pop(device_id, None)
+        removed = 0
+        for column in COLUMNS:
+            path = self.path(device_id, column)
+            if path.exists():
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def devices(self) -> List[str]:
+        suffix = f"_{COLUMNS[1]}{EXTENSION}"
+        return sorted(p.name[:-len(suffix)] for p in self.root.glob(f"*{suffix}"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = list(self._series.values())
+        return {
+            "devices_loaded": len(loaded),
+            "points_loaded": sum(len(series) for series in loaded),
+            "bytes": sum(series.values.nbytes + series.timestamps.nbytes for series in loaded),
+            "max_points": self.max_points,
+            "retention": self.retention,
+        }
@@ -0,0 +1,171 @@
+"""
+Per-phase request timings, reported in a ``Server-Timing`` header.
+
+The latency of a ``/forecast`` or ``/anomaly`` call is mostly one of a few
+phases: parsing and validating the body, looking up or loading the model,
+fitting it, predicting, post-processing the result and persisting the model.
+``ServerTimingMiddleware`` gives every HTTP request a ``RequestTimings``
+(through a context variable); the service marks its phases with
+``phase(name)``, and the response carries
+
+    Server-Timing: parse;dur=0.41, load;dur=2.3, fit;dur=812.5, persist;dur=9.8, total;dur=826.1
+
+(milliseconds), which browsers' dev tools show and callers such as the Node
+proxy can log. Phases are exclusive: time spent in a phase nested inside
+another (``persist`` during a first ``fit``) is not counted twice. A phase
+entered more than once adds up.
+
+Code running outside a request (background retrains, tests calling helpers
+directly) has no timings, and ``phase`` does nothing there.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+HEADER = b"server-timing"
+TIMINGS_PARAM = "timings"
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:  # a worker thread (run_io) has no running loop
+        return None
+
+
+class _OpenPhase:
+    def __init__(self, name: str, outer: Optional["_OpenPhase"]):
+        self.name = name
+        self.task = _current_task()
+        # A phase opened by another task (one started from inside it) runs
+        # concurrently with this one; don't pause it
+        self.outer = outer if outer is not None and outer.task is self.task else None
+        self.resumed = time.perf_counter()
+
+
+class RequestTimings:
+    """Accumulated seconds per phase of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.descriptions: Dict[str, str] = {}
+        self._open: ContextVar[Optional[_OpenPhase]] = ContextVar("open_phase", default=None)
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def describe(self, name: str, description: str):
+        """Attach a description (``desc=``) to a phase, recording it if needed"""
+        self.phases.setdefault(name, 0.0)
+        self.descriptions[name] = description
+
+    def mark(self, name: str):
+        """Record the time since the request started as `name` (e.g. ``parse``,
+        which FastAPI does before the endpoint runs), less phases already
+        recorded"""
+        elapsed = time.perf_counter() - self.started - sum(self.phases.values())
+        self.add(name, max(elapsed, 0.0))
+
+    @contextmanager
+    def phase(self, name: str):
+        opened = _OpenPhase(name, self._open.get())
+        if opened.outer is not None:
+            self.add(opened.outer.name, opened.resumed - opened.outer.resumed)
+        token = self._open.set(opened)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.add(name, now - opened.resumed)
+            self._open.reset(token)
+            if opened.outer is not None:
+                opened.outer.resumed = now
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def snapshot(self) -> Dict[str, float]:
+        """Milliseconds per phase so far, plus ``total``"""
+        timings = {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()}
+        timings["total"] = round(self.total() * 1000, 3)
+        return timings
+
+    def header(self) -> str:
+        entries = []
+        for name, ms in self.snapshot().items():
+            entry = f"{name};dur={ms}"
+            if name in self.descriptions:
+                entry += f';desc="{self.descriptions[name]}"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current() -> Optional[RequestTimings]:
+    """Timings of the request being served, if any"""
+    return _timings.get()
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block as phase `name` of the current request"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    with timings.phase(name):
+        yield
+
+
+def mark(name: str):
+    timings = _timings.get()
+    if timings is not None:
+        timings.mark(name)
+
+
+def describe(name: str, description: str):
+    timings = _timings.get()
+    if timings is not None:
+        timings.describe(name, description)
+
+
+def requested(query_params) -> bool:
+    """Whether the caller asked for a ``timings`` field (``?timings=1``)"""
+    return query_params.get(TIMINGS_PARAM, "").lower() in ("1", "true", "yes")
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware that times each HTTP request and adds ``Server-Timing``.
+
+    The header is written with the response start, so for a streaming
+    response it covers the work done before the first chunk only.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _timings.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((HEADER, timings.header().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
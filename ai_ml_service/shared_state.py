@@ -0,0 +1,184 @@
+"""
+Model state shared between uvicorn workers.
+
+With ``uvicorn --workers N`` every worker process used to keep its own
+detector per device, train it on the requests it happened to receive and
+write it back over the same model file as the others. ``SharedModelState``
+coordinates the workers through the filesystem:
+
+- Single writer: for each model (e.g. a device's anomaly detector) one worker
+  holds an exclusive ``flock`` on ``{root}/.locks/{name}.lock``. Only that
+  worker learns incrementally, retrains and saves the model. The lock is held
+  until the model leaves the worker's cache, or until the process exits (the
+  kernel drops it even on a crash), after which another worker claims it.
+- Replicas: the other workers serve read-only copies and check, at most once
+  per ``check_interval``, whether the model file changed since they loaded
+  it. A replica is reloaded once its file changes; updates made to it in the
+  meantime are discarded, never written back.
+
+Each held lock keeps a file descriptor open. Claiming fails safe: if the
+lock file cannot be opened (e.g. the process ran out of descriptors) the
+worker serves the model as a replica. ``forget`` removes a deleted model's
+lock file, but only while no worker holds it; a claim re-checks that its
+file was not removed meanwhile.
+
+Without ``fcntl`` (Windows) or with ``enabled=False`` the process is the
+writer for everything, which is the single-worker behaviour.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_DIR = ".locks"
+LOCK_EXTENSION = ".lock"
+
+
+class SharedModelState:
+    """Per-model writer election and replica staleness checks.
+
+    ``stamp(key)`` returns a cheap fingerprint of a model's file (None if it
+    has none); ``name(key)`` turns a key into a lock file name.
+    """
+
+    def __init__(self, root: Path, stamp: Callable[[Hashable], Optional[tuple]],
+                 name: Callable[[Hashable], str] = str, check_interval: float = 5.0,
+                 enabled: bool = True):
+        self.root = Path(root) / LOCK_DIR
+        self.stamp = stamp
+        self.name = name
+        self.check_interval = check_interval
+        self.enabled = enabled and fcntl is not None
+        if self.enabled:
+            self.root.mkdir(parents=True, exist_ok=True)
+        self._held: Dict[Hashable, int] = {}  # key -> fd holding the lock
+        self._claim_attempts: Dict[Hashable, float] = {}
+        self._versions: Dict[Hashable, Optional[tuple]] = {}
+        self._checked: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def is_writer(self, key: Hashable) -> bool:
+        """Whether this process may learn into and save the model for `key`.
+
+        Claims the model if nobody holds it; a failed claim is retried at most
+        once per ``check_interval`` (the writer may have let go meanwhile).
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            if key in self._held:
+                return True
+            now = time.monotonic()
+            if now - self._claim_attempts.get(key, -self.check_interval) < self.check_interval:
+                return False
+            self._claim_attempts[key] = now
+
+            path = self._path(key)
+            try:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError as e:
+                logger.warning(f"Cannot open {path.name} ({e!r}); serving it as a replica")
+                return False
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                    raise FileNotFoundError(path)  # removed by forget meanwhile; retry later
+            except OSError:
+                os.close(fd)
+                return False
+            self._held[key] = fd
+            self._claim_attempts.pop(key, None)
+            logger.info(f"Worker {os.getpid()} is the writer for {self.name(key)}")
+            return True
+
+    def _path(self, key: Hashable) -> Path:
+        return self.root / f"{self.name(key)}{LOCK_EXTENSION}"
+
+    def holds(self, key: Hashable) -> bool:
+        """Whether this process is already the writer for `key` (never claims)"""
+        return not self.enabled or key in self._held
+
+    def release(self, key: Hashable):
+        """Give up writing `key` (it left this worker's cache)"""
+        with self._lock:
+            fd = self._held.pop(key, None)
+            self._versions.pop(key, None)
+            self._checked.pop(key, None)
+        if fd is not None:
+            os.close(fd)  # closing the descriptor drops the flock
+
+    def forget(self, key: Hashable):
+        """Release `key` and remove its lock file (the model was deleted).
+
+        The file is only removed while this process can lock it, i.e. no
+        other worker is its writer.
+        """
+        self.release(key)
+        with self._lock:
+            self._claim_attempts.pop(key, None)
+        if not self.enabled:
+            return
+        path = self._path(key)
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            path.unlink()
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def release_all(self):
+        for key in list(self._held):
+            self.release(key)
+
+    def loaded(self, key: Hashable, version: Optional[tuple]):
+        """Record the file version (a ``stamp``) a model was loaded from"""
+        with self._lock:
+            self._versions[key] = version
+            self._checked[key] = time.monotonic()
+
+    def stale(self, key: Hashable) -> bool:
+        """Whether a replica's file changed since it was loaded (never for the writer).
+
+        A replica may take over as writer here; it is reported stale if the
+        previous writer saved after it was loaded, so it reloads before it
+        writes anything.
+        """
+        if not self.enabled or key in self._held:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked.get(key, -self.check_interval) < self.check_interval:
+                return False
+            self._checked[key] = now
+            loaded = self._versions.get(key)
+        self.is_writer(key)
+        current = self.stamp(key)
+        if current is None or current == loaded:
+            return False
+        self.reloads += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pid": os.getpid(),
+            "writing": len(self._held),
+            "tracked": len(self._versions),
+            "reloads": self.reloads,
+        }
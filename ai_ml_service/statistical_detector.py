@@ -0,0 +1,160 @@
+"""
+Streaming statistical anomaly engine.
+
+A cheap alternative to the per-device IsolationForest: a few running
+statistics per device, updated incrementally, and a batch of values scored
+with a handful of vectorized numpy operations. Three tests vote; a value is
+anomalous when any of them puts it outside its limit:
+
+- robust z-score against the median/MAD of a rolling window of normal values
+- EWMA control limits (exponentially weighted mean and variance)
+- Tukey fences on streaming estimates of the first and third quartiles
+
+Scores follow the IsolationForest ``decision_function`` convention: positive
+for normal values, negative for anomalies, with 0 at the tightest limit.
+"""
+
+import copy
+import time
+from typing import Sequence
+
+import numpy as np
+
+from forest_model import MAD_TO_STD
+from ring_buffer import RingBuffer
+
+EWMA_CHUNK = 128  # keeps (1 - alpha) ** -CHUNK well inside float64 range
+EPS = 1e-9
+METHODS = ("robust_z", "ewma", "quantile")
+
+
+def ewma_path(values: np.ndarray, start: float, alpha: float) -> tuple:
+    """Run s = (1 - alpha) * s + alpha * x over `values` without a Python loop.
+
+    Returns (prior, final): ``prior[t]`` is the state before values[t] was
+    applied (what values[t] is judged against) and ``final`` the end state.
+    """
+    prior = np.empty(len(values))
+    state = start
+    for offset in range(0, len(values), EWMA_CHUNK):
+        chunk = values[offset:offset + EWMA_CHUNK]
+        decay = (1 - alpha) ** np.arange(1, len(chunk) + 1)
+        after = decay * (state + alpha * np.cumsum(chunk / decay))
+        prior[offset] = state
+        prior[offset + 1:offset + len(chunk)] = after[:-1]
+        state = float(after[-1])
+    return prior, state
+
+
+class StatisticalDetector:
+    """Per-device streaming statistical detector (same interface as AnomalyDetector)"""
+
+    engine = "statistical"
+    points_since_save = 0  # normal points learned since the last snapshot
+    saved_at = 0.0
+
+    def __init__(self, device_id: str, window: int = 500, z_threshold: float = 3.5,
+                 ewma_alpha: float = 0.1, ewma_limit: float = 4.0, fence: float = 3.0,
+                 quantile_rate: float = 0.01, methods: Sequence[str] = METHODS):
+        unknown = set(methods) - set(METHODS)
+        if unknown:
+            raise ValueError(f"Unknown statistical methods: {sorted(unknown)}")
+        self.device_id = device_id
+        self.z_threshold = z_threshold
+        self.ewma_alpha = ewma_alpha
+        self.ewma_limit = ewma_limit
+        self.fence = fence
+        self.quantile_rate = quantile_rate
+        self.methods = tuple(methods)
+        self.window = RingBuffer(window, np.float64)
+        self.trained = False
+        self.ewma_mean = 0.0
+        self.ewma_var = 0.0
+        self.q1 = 0.0
+        self.q3 = 0.0
+
+    def snapshot(self) -> "StatisticalDetector":
+        """A copy to persist, unaffected by later predictions; restarts the
+        count of unsaved points"""
+        snapshot = copy.copy(self)
+        snapshot.window = copy.copy(self.window)
+        self.points_since_save = 0
+        self.saved_at = time.time()
+        return snapshot
+
+    def train(self, data: np.ndarray):
+        """Initialise all running statistics from a first batch"""
+        data = np.asarray(data, dtype=np.float64)
+        if len(data) < 10:
+            return
+        self.window.extend(data)
+        self.ewma_mean = float(data.mean())
+        self.ewma_var = float(data.var())
+        self.q1, self.q3 = (float(q) for q in np.percentile(data, [25, 75]))
+        self.trained = True
+
+    def _margins(self, values: np.ndarray, learn: bool = True) -> np.ndarray:
+        """Per-method margins (rows) for each value; < 0 means outside the limit.
+
+        With ``learn`` the EWMA state moves on past `values`; without it (the
+        training batch, already in the state) the values are only judged.
+        """
+        margins = []
+        if "robust_z" in self.methods:
+            history = self.window.view()
+            median = np.median(history)
+            mad = np.median(np.abs(history - median))
+            z = np.abs(values - median) / (MAD_TO_STD * mad + EPS)
+            margins.append(1 - z / self.z_threshold)
+        if "ewma" in self.methods:
+            mean_prior, ewma_mean = ewma_path(values, self.ewma_mean, self.ewma_alpha)
+            # Variance recursion is an EWMA of (1 - alpha) * squared deviation
+            deviation = values - mean_prior
+            var_prior, ewma_var = ewma_path(
+                (1 - self.ewma_alpha) * deviation ** 2, self.ewma_var, self.ewma_alpha
+            )
+            if learn:
+                self.ewma_mean, self.ewma_var = ewma_mean, ewma_var
+            z = np.abs(deviation) / (np.sqrt(var_prior) + EPS)
+            margins.append(1 - z / self.ewma_limit)
+        if "quantile" in self.methods:
+            iqr = self.q3 - self.q1
+            outside = np.maximum.reduce([self.q1 - values, values - self.q3, np.zeros_like(values)])
+            margins.append(1 - outside / (self.fence * iqr + EPS))
+        return np.vstack(margins)
+
+    def _update_quantiles(self, normal: np.ndarray):
+        # Stochastic-approximation quantile tracking, one step per batch
+        if len(normal) == 0:
+            return
+        scale = max(self.q3 - self.q1, EPS)
+        for attr, p in (("q1", 0.25), ("q3", 0.75)):
+            q = getattr(self, attr)
+            step = self.quantile_rate * scale * np.sum(p - (normal < q))
+            setattr(self, attr, q + float(np.clip(step, -scale, scale)))
+        if self.q1 > self.q3:
+            self.q1, self.q3 = self.q3, self.q1
+
+    def predict(self, new_data: np.ndarray):
+        """Detect anomalies in new data; returns (anomaly indices, scores)"""
+        values = np.asarray(new_data, dtype=np.float64).ravel()
+        if not self.trained:
+            self.train(values)
+            if not self.trained:
+                return [], [0.0] * len(values)
+            scores = self._margins(values, learn=False).min(axis=0)
+            return [], scores.tolist()
+
+        scores = self._margins(values).min(axis=0)
+        normal = values[scores >= 0]
+        self.window.extend(normal)
+        self.points_since_save += len(normal)
+        self._update_quantiles(normal)
+        return np.flatnonzero(scores < 0).tolist(), scores.tolist()
+
+    async def predict_async(self, new_data: np.ndarray, executor=None):
+        """Same as predict; cheap enough to run on the event loop"""
+        return self.predict(new_data)
+
+    def nbytes(self) -> int:
+        return self.window.nbytes + 200  # running statistics and attributes
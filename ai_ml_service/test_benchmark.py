@@ -0,0 +1,36 @@
+import json
+
+import main
+from benchmark import compare, main_cli, run_benchmarks
+
+
+class TestBenchmark:
+    """Test the benchmark harness (tiny sizes, cheap cases only)"""
+
+    def test_report_shape(self):
+        store = main.model_store
+        report = run_benchmarks([10, 50], repeat=2, only=["moving_average_forecast", "load_model"])
+
+        assert main.model_store is store  # restored after the temp store
+        assert {(r["name"], r["size"]) for r in report["results"]} == {
+            ("moving_average_forecast", 10), ("moving_average_forecast", 50),
+            ("load_model", 10), ("load_model", 50),
+        }
+        assert all(r["runs"] == 2 and r["min"] <= r["median"] for r in report["results"])
+        assert "revision" in report["meta"]
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": [{"name": "a", "size": 10, "median": 1.0},
+                                {"name": "b", "size": 10, "median": 1.0}]}
+        current = {"results": [{"name": "a", "size": 10, "median": 1.5},
+                               {"name": "b", "size": 10, "median": 1.05},
+                               {"name": "c", "size": 10, "median": 1.0}]}
+        rows = compare(current, baseline, threshold=0.10)
+        assert [(row["name"], row["regression"]) for row in rows] == [("a", True), ("b", False)]
+
+    def test_cli_writes_json(self, tmp_path):
+        output = tmp_path / "bench.json"
+        assert main_cli(["--sizes", "30", "--repeat", "1", "--only",
+                         "calculate_energy_savings", "--output", str(output)]) == 0
+        report = json.loads(output.read_text())
+        assert report["results"][0]["name"] == "calculate_energy_savings"
@@ -0,0 +1,144 @@
+import time
+import threading
+
+from detector_cache import DetectorCache
+
+
+class FakeDetector:
+    def __init__(self, device_id, size=100):
+        self.device_id = device_id
+        self.size = size
+
+
+def make_cache(stored=None, **kwargs):
+    stored = {} if stored is None else stored
+    saved = {}
+    cache = DetectorCache(
+        loader=stored.get,
+        factory=FakeDetector,
+        saver=saved.__setitem__,
+        sizeof=lambda detector: detector.size,
+        **kwargs
+    )
+    return cache, saved
+
+
+class TestDetectorCache:
+    """Tests for the bounded anomaly detector registry"""
+
+    def test_hit_miss_and_load(self):
+        stored = {"persisted": FakeDetector("persisted")}
+        cache, _ = make_cache(stored)
+
+        assert cache.get("persisted") is None
+        assert cache.load("persisted") is stored["persisted"]
+        assert cache.get("persisted") is stored["persisted"]
+
+        fresh = cache.load("new")
+        assert isinstance(fresh, FakeDetector) and fresh.device_id == "new"
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["loads"]) == (1, 1, 1)
+        assert stats["entries"] == 2 and stats["bytes"] == 200
+
+    def test_lru_eviction_writes_back(self):
+        cache, saved = make_cache(max_entries=2)
+        cache.load("a")
+        cache.load("b")
+        cache.get("a")  # "b" is now least recently used
+        cache.load("c")
+
+        assert "b" not in cache
+        assert "a" in cache and "c" in cache
+        assert list(saved) == ["b"]
+        assert cache.stats()["evictions"] == 1
+
+    def test_byte_budget(self):
+        cache, saved = make_cache(max_bytes=250)
+        for device_id in ("a", "b", "c"):
+            cache.load(device_id)
+        assert len(cache) == 2 and cache.nbytes == 200
+
+        cache.get("c").size = 250
+        cache.refresh("c")
+        assert list(cache._entries) == ["c"]
+        assert set(saved) == {"a", "b"}
+
+    def test_ttl_eviction(self):
+        cache, saved = make_cache(ttl=0.01)
+        cache.load("idle")
+        time.sleep(0.02)
+        cache.load("active")
+        assert "idle" not in cache
+        assert "idle" in saved
+
+    def test_discard_does_not_write_back(self):
+        cache, saved = make_cache()
+        cache.load("a")
+        cache.discard("a")
+        assert "a" not in cache and cache.nbytes == 0
+        assert saved == {}
+
+    def test_warm_never_evicts(self):
+        stored = {name: FakeDetector(name) for name in ("a", "b", "c")}
+        cache, saved = make_cache(stored, max_entries=2)
+
+        assert cache.warm("a") == 100
+        assert cache.warm("a") == 0  # already cached
+        assert cache.warm("missing") == 0
+        assert cache.warm("b") == 100
+        assert cache.warm("c") == 0  # full: warm-up makes no room
+        assert "c" not in cache and saved == {}
+        assert cache.stats()["warmed"] == 2
+
+        # Warmed detectors are the first to go when real traffic needs room
+        cache.load("a")
+        cache.load("new")
+        assert "b" not in cache and "a" in cache
+
+    def test_sweep_evicts_idle(self):
+        cache, saved = make_cache(ttl=0.01)
+        cache.load("idle")
+        time.sleep(0.02)
+        assert cache.sweep() == 1
+        assert "idle" not in cache and "idle" in saved
+
+    def test_disk_io_outside_the_lock(self):
+        stored = {"persisted": FakeDetector("persisted")}
+        held = []
+
+        def try_lock():
+            acquired = cache._lock.acquire(timeout=0.1)
+            held.append(not acquired)
+            if acquired:
+                cache._lock.release()
+
+        def probe(*args):
+            # Another thread (the event loop's get) must not wait for disk I/O
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            return stored.get(args[0]) if len(args) == 1 else None
+
+        cache = DetectorCache(loader=probe, factory=FakeDetector, saver=probe,
+                              sizeof=lambda detector: detector.size, max_entries=1)
+        cache.load("persisted")
+        cache.load("new")  # evicts and writes back "persisted"
+        assert held == [False, False, False]
+
+    def test_load_takes_back_a_detector_being_written(self):
+        stored = {"a": FakeDetector("a")}
+        revived = []
+
+        def saver(key, detector):
+            if key == "b" and not revived:  # a request for "b" during its write-back
+                revived.append(cache.load(key) is detector)
+
+        cache = DetectorCache(loader=stored.get, factory=FakeDetector, saver=saver,
+                              sizeof=lambda detector: detector.size, max_entries=2)
+        cache.load("a")
+        evicted = cache.load("b")
+        stored["b"] = FakeDetector("b")  # an older copy on disk
+        cache.get("a")
+        cache.load("c")  # evicts "b"; the write-back reloads it meanwhile
+        assert revived == [True] and cache.get("b") is evicted
@@ -0,0 +1,46 @@
+from device_settings import DeviceSettings
+from model_store import ModelStore
+
+
+def make_settings(store, check_interval=60.0):
+    return DeviceSettings(
+        load=lambda device_id: store.load(device_id, "settings"),
+        save=lambda device_id, settings: store.save(device_id, "settings", settings),
+        stamp=lambda device_id: store.stamp(device_id, "settings"),
+        check_interval=check_interval,
+    )
+
+
+class TestDeviceSettings:
+    """Test per-device settings kept in the model store"""
+
+    def test_update_and_load(self, tmp_path):
+        settings = make_settings(ModelStore(tmp_path))
+        assert settings.cached("dev") is None
+        assert settings.load("dev") == {}
+        assert settings.update("dev", engine="fleet", device_class="switches") == {
+            "engine": "fleet", "device_class": "switches"}
+        assert settings.update("dev", engine="statistical", device_class=None) == {
+            "engine": "statistical", "device_class": "switches"}
+        assert settings.cached("dev")["engine"] == "statistical"
+
+    def test_survives_restart(self, tmp_path):
+        make_settings(ModelStore(tmp_path)).update("dev", engine="statistical")
+        assert make_settings(ModelStore(tmp_path)).load("dev") == {"engine": "statistical"}
+
+    def test_other_worker_change_seen_after_interval(self, tmp_path):
+        store = ModelStore(tmp_path)
+        mine, other = make_settings(store, check_interval=0), make_settings(store)
+        assert mine.load("dev") == {}
+        other.update("dev", engine="fleet")
+        assert mine.cached("dev") is None  # interval 0: always rechecked
+        assert mine.load("dev") == {"engine": "fleet"}
+        assert mine.stats()["reloads"] == 1
+
+    def test_forget_after_delete(self, tmp_path):
+        store = ModelStore(tmp_path)
+        settings = make_settings(store)
+        settings.update("dev", engine="fleet")
+        store.delete("dev", ["settings"])
+        settings.forget("dev")
+        assert settings.cached("dev") is None and settings.load("dev") == {}
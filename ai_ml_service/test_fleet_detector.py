@@ -0,0 +1,117 @@
+import pickle
+
+import numpy as np
+
+from fleet_detector import FleetDetector, FleetModel, FleetRegistry
+from forest_model import fit_isolation_forest
+
+
+def trained_pair(levels=(10.0, 1000.0), seed=0):
+    rng = np.random.RandomState(seed)
+    fleet = FleetModel("switches")
+    detectors = []
+    for i, level in enumerate(levels):
+        detector = FleetDetector(f"dev{i}", fleet)
+        detector.predict(level + rng.normal(0, level / 20, 200))
+        detectors.append(detector)
+    return fleet, detectors
+
+
+class TestFleetDetector:
+    """Test per-device scaling in front of a shared forest"""
+
+    def test_devices_share_one_forest(self):
+        fleet, (small, large) = trained_pair()
+        assert fleet.trained and small.fleet is large.fleet
+        assert len(fleet.pool) == 400
+
+        rng = np.random.RandomState(1)
+        for detector, level in ((small, 10.0), (large, 1000.0)):
+            values = np.append(level + rng.normal(0, level / 20, 30), level * 3)
+            anomalies, scores = detector.predict(values)
+            assert 30 in anomalies
+            assert len(anomalies) <= 8  # contamination=0.1
+            assert len(scores) == 31
+
+    def test_short_first_batch(self):
+        fleet = FleetModel("switches")
+        detector = FleetDetector("dev", fleet)
+        assert detector.predict(np.ones(5)) == ([], [0.0] * 5)
+        assert not detector.trained and not fleet.trained
+
+    def test_detector_pickle_leaves_the_forest_out(self):
+        fleet, (detector, _) = trained_pair()
+        restored = pickle.loads(pickle.dumps(detector))
+        assert restored.fleet is None and restored.trained
+        assert len(pickle.dumps(detector)) < len(pickle.dumps(fleet)) / 10
+
+        restored.attach(fleet)
+        assert len(restored.predict(np.full(5, 10.0))[1]) == 5
+
+    def test_lost_fleet_model_is_reseeded(self):
+        _, (detector, _) = trained_pair()
+        detector.attach(FleetModel("switches"))
+        anomalies, scores = detector.predict(np.full(5, 10.0))
+        assert detector.fleet.trained and len(scores) == 5
+
+    def test_new_class_model_is_fitted_on_the_executor(self):
+        import asyncio
+
+        class Executor:
+            fits = 0
+
+            async def run(self, fn, *args):
+                Executor.fits += 1
+                return fn(*args)
+
+        _, (detector, _) = trained_pair()
+        detector.attach(FleetModel("routers"))  # e.g. the device changed class
+        _, scores = asyncio.run(detector.predict_async(np.full(5, 10.0), Executor()))
+        assert Executor.fits == 1 and detector.fleet.trained and len(scores) == 5
+
+    def test_memory_is_per_class(self):
+        fleet, detectors = trained_pair(levels=[10.0] * 20)
+        assert all(d.nbytes() < 8192 for d in detectors)
+        assert fleet.nbytes() > 10 * detectors[0].nbytes()
+
+
+class TestFleetModel:
+    """Test the shared model's retraining hooks and registry"""
+
+    def test_swap_model_keeps_new_points(self):
+        fleet, (detector, _) = trained_pair()
+        detector.predict(np.full(10, 10.0))
+        data = fleet.training_data()
+        consumed = fleet.points_since_train
+        fleet.contribute(np.ones(3))
+        fleet.swap_model(fit_isolation_forest(data), data, consumed)
+        assert fleet.points_since_train == 3
+        assert fleet.new_points_sum == 3.0
+
+    def test_snapshot_is_unaffected_by_later_points(self):
+        fleet, (detector, _) = trained_pair()
+        snapshot = fleet.snapshot()
+        pool, counted = snapshot.pool.tolist(), snapshot.points_since_train
+        detector.predict(np.full(10, 10.0))
+        fleet.swap_model(None, fleet.training_data(), 0)
+        assert snapshot.pool.tolist() == pool and snapshot.points_since_train == counted
+        assert snapshot.model is not None and len(pickle.dumps(snapshot)) > 0
+
+    def test_registry_loads_creates_and_reloads(self):
+        saved = {"switches": pickle.loads(pickle.dumps(trained_pair()[0]))}
+        stale = {"switches": False}
+        registry = FleetRegistry(
+            loader=lambda name: saved.get(name),
+            factory=FleetModel,
+            stale=lambda name: stale[name]
+        )
+        switches = registry.get("switches")
+        assert switches.trained
+        assert not registry.get("lights").trained
+
+        newer = FleetModel("switches")
+        newer.contribute(np.ones(10))
+        saved["switches"], stale["switches"] = newer, True
+        assert registry.get("switches") is switches
+        assert not switches.trained and len(switches.pool) == 10
+        assert registry.stats()["reloads"] == 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from forecast_cache import ForecastEntry, ForecastModelCache
+
+
+def make_entry(history, horizon=10):
+    yhat = np.arange(horizon, dtype=float)
+    return ForecastEntry(history, yhat, yhat - 1, yhat + 1)
+
+
+class TestForecastEntry:
+    """Tests for matching histories against a cached fit"""
+
+    def setup_method(self):
+        self.history = np.random.RandomState(0).uniform(0, 100, 48)
+        self.entry = make_entry(self.history)
+
+    def test_same_history_is_reused(self):
+        assert self.entry.new_points(self.history, 6) == 0
+
+    def test_appended_points_are_counted(self):
+        grown = np.append(self.history, [1.0, 2.0, 3.0])
+        assert self.entry.new_points(grown, 6) == 3
+
+    def test_sliding_window_is_counted(self):
+        slid = np.append(self.history[2:], [1.0, 2.0])
+        assert self.entry.new_points(slid, 6) == 2
+
+    def test_threshold_forces_refit(self):
+        grown = np.append(self.history, np.ones(6))
+        assert self.entry.new_points(grown, 6) is None
+
+    def test_changed_history_forces_refit(self):
+        changed = self.history.copy()
+        changed[-1] += 5
+        assert self.entry.new_points(changed, 6) is None
+
+    def test_slice(self):
+        predictions, lower, upper = self.entry.slice(2, 3)
+        assert predictions == [2.0, 3.0, 4.0]
+        assert lower == [1.0, 2.0, 3.0]
+        assert upper == [3.0, 4.0, 5.0]
+        assert self.entry.slice(8, 3) is None
+
+
+class TestForecastModelCache:
+    """Tests for the memory-then-disk forecast cache"""
+
+    def test_memory_then_disk(self):
+        history = list(range(20))
+        stored = {"dev": make_entry(history)}
+        calls = []
+
+        def loader(device_id):
+            calls.append(device_id)
+            return stored.get(device_id)
+
+        cache = ForecastModelCache(loader)
+        assert cache.get("dev") is None
+        entry = cache.load("dev")
+        assert entry is not None
+        assert cache.load("dev") is entry
+        assert calls == ["dev"]
+        assert cache.load("missing") is None
+
+    def test_ignores_legacy_pickles(self):
+        cache = ForecastModelCache(lambda device_id: object())
+        assert cache.load("dev") is None
+
+    def test_lru_bound_and_invalidate(self):
+        cache = ForecastModelCache(lambda device_id: None, max_entries=2)
+        for device_id in ("a", "b", "c"):
+            cache.put(device_id, make_entry(list(range(10))))
+        assert len(cache) == 2
+        assert cache.get("a") is None
+        cache.invalidate("b")
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
@@ -2,6 +2,8 @@ import pytest
 from fastapi.testclient import TestClient
 from main import app
 import numpy as np
+import json
+import time
 from datetime import datetime
 
 client = TestClient(app)
@@ -16,6 +18,90 @@ class TestAIMLService:
         data = response.json()
         assert data["status"] == "healthy"
         assert "timestamp" in data
+        assert data["executor"]["pending"] == 0
+        assert "hit_rate" in data["detector_cache"]
+
+    def test_ready(self):
+        """Test the readiness probe reports engine loading state"""
+        import main
+
+        response = client.get("/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ready"] is True
+        assert data["engines"]["moving_average"] == "ready"
+        assert data["engines"]["statistical"] == "ready"
+        assert data["engines"]["prophet"] in ("pending", "loading", "ready", "unavailable", "failed")
+
+        assert client.get("/ready?engines=moving_average,isolation_forest").status_code == 200
+        assert client.get("/ready?engines=nope").status_code == 400
+        if not main.PROPHET_AVAILABLE:
+            assert client.get("/ready?engines=prophet").status_code == 503
+
+    def test_preload(self):
+        """Test stored detectors are warmed into the cache and readiness reports it"""
+        import main
+        from preloader import ModelPreloader
+
+        data = client.get("/ready").json()
+        assert data["preload"]["state"] in ("pending", "loading", "ready", "disabled", "failed")
+        if not main.preloader.done.is_set():
+            assert client.get("/ready?warm=true").status_code == 503
+
+        client.delete("/models/preload_device")
+        values = np.random.normal(50, 5, 20).tolist()
+        client.post("/anomaly", json={"device_id": "preload_device", "values": values})
+        main.model_writer.flush()
+        main.anomaly_detectors.discard(("preload_device", "isolation_forest"))
+
+        preloader = ModelPreloader(
+            scan=lambda: [m for m in main.scan_models() if m.device_id == "preload_device"],
+            load=main.preload_model
+        )
+        preloader.start()
+        assert preloader.wait(30)
+        assert preloader.status()["loaded"] == 1
+        assert ("preload_device", "isolation_forest") in main.anomaly_detectors
+        client.delete("/models/preload_device")
+
+    def test_metrics(self):
+        """Test the Prometheus endpoint exposes request, model and cache metrics"""
+        client.post("/forecast", json={"device_id": "metrics_device", "history": [1.0, 2.0, 3.0]})
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+
+        text = response.text
+        assert 'aiml_http_request_duration_seconds_count{method="POST",route="/forecast",status="200"}' in text
+        assert 'aiml_forecasts_total{model_type="moving_average"}' in text
+        assert 'aiml_model_predict_seconds_count{model_type="moving_average"}' in text
+        assert "aiml_detector_cache_hits_total" in text
+        assert "aiml_executor_pending" in text
+
+    def test_forecast_negative_periods(self):
+        """Test a negative horizon is rejected up front, also inside a batch"""
+        request_data = {"device_id": "test_device_1", "history": [10.0, 15.0, 20.0], "periods": -1}
+        assert client.post("/forecast", json=request_data).status_code == 422
+        response = client.post("/forecast/batch", json={"items": [request_data]})
+        assert response.status_code == 422
+
+    def test_forecast_oversized_request(self):
+        """Test horizons and series windows beyond the configured limits are rejected"""
+        import main
+
+        request_data = {"device_id": "test_device_1", "history": [10.0, 15.0, 20.0],
+                        "periods": main.FORECAST_MAX_PERIODS}
+        response = client.post("/forecast", json=request_data)
+        assert response.status_code == 200
+        assert len(response.json()["forecast"]) == main.FORECAST_MAX_PERIODS
+
+        request_data["periods"] += 1
+        assert client.post("/forecast", json=request_data).status_code == 422
+        request_data = {"device_id": "test_device_1", "window": main.SERIES_MAX_POINTS + 1}
+        assert client.post("/forecast", json=request_data).status_code == 422
+        request_data["window"] = 0  # not "no stored series"
+        assert client.post("/forecast", json=request_data).status_code == 422
+        assert client.post("/anomaly", json=request_data).status_code == 422
 
     def test_forecast_success(self):
         """Test successful forecast request"""
@@ -87,8 +173,38 @@ class TestAIMLService:
             assert "end" in schedule[day]
             assert "priority" in schedule[day]
 
-        # Check energy savings is reasonable (algorithm caps at 10-40%)
-        assert 10 <= data["energy_savings"] <= 40
+        # Flat usage with a 40% budget: only the weekday class hours stay on
+        assert data["budget_met"] is True
+        assert 60 <= data["energy_savings"] <= 100
+        assert schedule["monday"]["start"] == "08:00" and schedule["monday"]["end"] == "18:00"
+        assert schedule["sunday"]["priority"] == "off"
+        assert len(schedule["monday"]["levels"]) == 24
+
+    def test_schedule_batch(self):
+        """Test optimizing several devices in one call"""
+        hours = np.arange(24 * 14)
+        evening = (50 + 40 * ((hours % 24 >= 17) & (hours % 24 < 22))).tolist()
+        request_data = {"items": [
+            {"device_id": "batch_schedule_1", "historical_usage": evening},
+            {"device_id": "batch_schedule_2", "historical_usage": evening,
+             "constraints": {"energy_budget": 10}},
+            {"device_id": "batch_schedule_3"},
+        ]}
+
+        response = client.post("/schedule/batch", json=request_data)
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["device_id"] for r in results] == ["batch_schedule_1", "batch_schedule_2", "batch_schedule_3"]
+        assert results[0]["budget_met"] is None
+        assert results[0]["energy_savings"] > 0
+        assert results[1]["energy_savings"] >= results[0]["energy_savings"]
+        assert results[2]["energy_savings"] == 0.0
+
+    def test_schedule_invalid_budget(self):
+        """Test a non-numeric energy budget is rejected"""
+        request_data = {"device_id": "test_device_2", "constraints": {"energy_budget": "low"}}
+        response = client.post("/schedule", json=request_data)
+        assert response.status_code == 400
 
     def test_schedule_no_constraints(self):
         """Test schedule optimization without constraints"""
@@ -128,6 +244,293 @@ class TestAIMLService:
         assert len(data["scores"]) == len(anomaly_data)
         assert isinstance(data["threshold"], float)
 
+    def test_persist_queues_a_snapshot(self):
+        """Test a queued save holds a copy the live detector can't change"""
+        import main
+
+        detector = main.AnomalyDetector("snapshot_device")
+        detector.predict(np.random.RandomState(4).normal(50, 5, 50))
+        key = ("snapshot_device", "anomaly")
+        queued = main.model_writer.get(key)
+        assert queued is not None and queued is not detector
+        size = len(queued.baseline)
+        detector._score(np.full(20, 50.0))
+        assert len(queued.baseline) == size
+        assert main.load_model(*key) is not queued
+        main.model_writer.flush()
+
+    def test_retrain_after_eviction_does_not_reclaim(self):
+        """Test a retrain finishing after its detector was evicted saves nothing"""
+        import main
+
+        detector = main.AnomalyDetector("evicted_device")
+        detector.predict(np.random.RandomState(5).normal(50, 5, 50))
+        key = ("evicted_device", "anomaly")
+        main.model_writer.flush()
+        main.shared_state.release(("evicted_device", "isolation_forest"))  # evicted
+
+        main._persist_retrained(detector)
+        assert not main.shared_state.holds(("evicted_device", "isolation_forest"))
+        assert main.model_writer.get(key) is None
+        client.delete("/models/evicted_device")
+
+    def test_anomaly_swap_during_scoring(self):
+        """Test points scored while a retrain is swapped in are counted exactly once"""
+        import threading
+        import main
+
+        detector = main.AnomalyDetector("swap_race_device")
+        rng = np.random.RandomState(3)
+        detector.predict(rng.normal(50, 5, 200))
+        batches = [rng.normal(50, 5, 10) for _ in range(300)]
+        normal = [0]
+
+        def score():
+            for batch in batches:
+                anomalies, _ = detector._score(batch)
+                normal[0] += len(batch) - len(anomalies)
+
+        scorer = threading.Thread(target=score)
+        scorer.start()
+        consumed = 0
+        while scorer.is_alive():
+            with detector._lock:
+                seen = detector.points_since_train
+                data = detector.baseline.view().copy()
+            detector.swap_model(detector.model, data, seen)
+            consumed += seen
+        scorer.join()
+        assert consumed + detector.points_since_train == normal[0]
+        assert detector.new_points_sum == pytest.approx(
+            float(np.sum(detector.baseline.view()[-detector.points_since_train:]))
+            if detector.points_since_train else 0.0, abs=1e-6)
+
+    def test_anomaly_detector_cache_accounting(self):
+        """Test detectors are measured and reused from the bounded cache"""
+        import main
+
+        request_data = {
+            "device_id": "test_device_cache",
+            "values": np.random.normal(50, 5, 30).tolist()
+        }
+        assert client.post("/anomaly", json=request_data).status_code == 200
+        hits_before = main.anomaly_detectors.hits
+        assert client.post("/anomaly", json=request_data).status_code == 200
+
+        assert main.anomaly_detectors.hits == hits_before + 1
+        assert main.anomaly_detectors.get(("test_device_cache", "isolation_forest")).nbytes() > 0
+        assert main.anomaly_detectors.nbytes > 0
+
+    def test_anomaly_background_retrain(self):
+        """Test detectors are retrained in the background, not on the request"""
+        import main
+
+        client.delete("/models/retrain_device")
+        rng = np.random.RandomState(3)
+        request_data = {"device_id": "retrain_device", "values": rng.normal(50, 1, 50).tolist()}
+        assert client.post("/anomaly", json=request_data).status_code == 200
+        first_model = main.anomaly_detectors.get(("retrain_device", "isolation_forest")).model
+
+        completed = main.retrain_scheduler.completed
+        for _ in range(3):
+            request_data["values"] = rng.normal(50, 1, 50).tolist()
+            assert client.post("/anomaly", json=request_data).status_code == 200
+        assert main.retrain_scheduler.wait_idle(30)
+
+        detector = main.anomaly_detectors.get(("retrain_device", "isolation_forest"))
+        assert main.retrain_scheduler.completed > completed
+        assert detector.model is not first_model
+        assert detector.points_since_train < main.RETRAIN_EVERY_POINTS
+        assert len(detector.baseline) <= main.BASELINE_SIZE
+
+    def test_anomaly_stream_websocket(self):
+        """Test streaming readings over a WebSocket only returns anomaly events"""
+        client.delete("/models/stream_ws_device")
+        baseline = np.random.RandomState(7).normal(50, 1, 100).tolist()
+
+        with client.websocket_connect("/anomaly/stream") as websocket:
+            websocket.send_json({"device_id": "stream_ws_device", "values": baseline[:5]})
+            websocket.send_json({"device_id": "stream_ws_device", "values": baseline[5:]})
+            websocket.send_json({"device_id": "stream_ws_device", "value": 1000.0})
+            event = websocket.receive_json()
+            assert event["device_id"] == "stream_ws_device"
+            assert event["seq"] == 100
+            assert event["value"] == 1000.0
+            assert event["score"] < 0
+
+            websocket.send_json({"device_id": "stream_ws_device"})
+            assert "error" in websocket.receive_json()
+
+    def test_anomaly_stream_ndjson(self):
+        """Test the NDJSON streaming variant"""
+        client.delete("/models/stream_ndjson_device")
+        baseline = np.random.RandomState(7).normal(50, 1, 100).tolist()
+        lines = [{"device_id": "stream_ndjson_device", "values": baseline}]
+        lines += [{"device_id": "stream_ndjson_device", "value": 50.0}] * 3
+        lines += [{"device_id": "stream_ndjson_device", "value": 500.0}]
+
+        response = client.post(
+            "/anomaly/stream",
+            content="\n".join(json.dumps(line) for line in lines)
+        )
+        assert response.status_code == 200
+        events = [json.loads(line) for line in response.text.splitlines() if line]
+        assert len(events) == 1
+        assert events[0]["seq"] == 103 and events[0]["value"] == 500.0
+
+    def test_anomaly_statistical_engine(self):
+        """Test the statistical engine selected per request and per device"""
+        client.delete("/models/stat_device")
+        baseline = np.random.RandomState(11).normal(50, 1, 100).tolist()
+        request_data = {"device_id": "stat_device", "values": baseline, "engine": "statistical"}
+        response = client.post("/anomaly", json=request_data)
+        assert response.status_code == 200
+        assert response.json()["engine"] == "statistical"
+
+        response = client.put("/models/stat_device/engine", json={"engine": "statistical"})
+        assert response.status_code == 200
+        response = client.post("/anomaly", json={"device_id": "stat_device", "values": [50.0] * 9 + [500.0]})
+        data = response.json()
+        assert data["engine"] == "statistical"
+        assert data["anomalies"] == [9]
+        assert client.get("/models/stat_device").json()["engine"] == "statistical"
+
+    def test_device_state_survives_restart(self):
+        """Test detector state and the engine choice are saved, not only kept in memory"""
+        import main
+
+        client.delete("/models/restart_device")
+        assert client.put("/models/restart_device/engine", json={"engine": "statistical"}).status_code == 200
+        baseline = np.random.RandomState(13).normal(50, 1, 100).tolist()
+        assert client.post("/anomaly", json={"device_id": "restart_device", "values": baseline}).status_code == 200
+        main.model_writer.flush()
+        assert main.model_store.stamp("restart_device", "anomaly_statistical") is not None
+
+        # A fresh worker: nothing cached in memory
+        main.anomaly_detectors.discard(("restart_device", "statistical"))
+        main.device_settings.forget("restart_device")
+        assert client.get("/models/restart_device").json()["engine"] == "statistical"
+        response = client.post("/anomaly", json={"device_id": "restart_device", "values": [50.0] * 9 + [500.0]})
+        assert response.json()["anomalies"] == [9]
+
+        assert client.delete("/models/restart_device").status_code == 200
+        assert not list((main.MODELS_DIR / ".locks").glob("restart_device_*"))
+
+    def test_anomaly_fleet_engine(self):
+        """Test devices of one class share a fleet model with their own scaling"""
+        import main
+
+        rng = np.random.RandomState(12)
+        for device_id, level in (("fleet_device_1", 50.0), ("fleet_device_2", 5000.0)):
+            client.delete(f"/models/{device_id}")
+            response = client.put(f"/models/{device_id}/engine",
+                                  json={"engine": "fleet", "device_class": "test_switches"})
+            assert response.status_code == 200
+            assert response.json()["device_class"] == "test_switches"
+            baseline = (level + rng.normal(0, level / 50, 200)).tolist()
+            assert client.post("/anomaly", json={"device_id": device_id, "values": baseline}).status_code == 200
+
+        fleet = main.fleets.get("test_switches")
+        assert fleet.trained and len(fleet.pool) >= 400  # the class model outlives test runs
+
+        values = (5000.0 + rng.normal(0, 100, 20)).tolist() + [9000.0]
+        data = client.post("/anomaly", json={"device_id": "fleet_device_2", "values": values}).json()
+        assert data["engine"] == "fleet"
+        assert 20 in data["anomalies"]
+        assert len(data["anomalies"]) <= 5
+        assert client.get("/models/fleet_device_2").json()["device_class"] == "test_switches"
+        main.model_writer.flush()
+        assert main.model_store.stamp("fleet.test_switches", "fleet_model") is not None
+
+        response = client.put("/models/fleet_device_1/engine", json={"engine": "fleet", "device_class": "../x"})
+        assert response.status_code == 422
+
+    def test_anomaly_unknown_engine(self):
+        """Test an unknown anomaly engine is rejected"""
+        request_data = {"device_id": "test_device_1", "values": list(range(15)), "engine": "nope"}
+        assert client.post("/anomaly", json=request_data).status_code == 400
+        assert client.put("/models/test_device_1/engine", json={"engine": "nope"}).status_code == 400
+
+    def test_anomaly_binary_payloads(self):
+        """Test .npy requests and responses on /anomaly"""
+        import io
+
+        client.delete("/models/npy_device")
+        values = np.random.RandomState(5).normal(50, 1, 100)
+        body = io.BytesIO()
+        np.save(body, values)
+        response = client.post(
+            "/anomaly?device_id=npy_device",
+            content=body.getvalue(),
+            headers={"Content-Type": "application/x-npy", "Accept": "application/x-npy"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-npy"
+        assert response.headers["x-device-id"] == "npy_device"
+        record = np.load(io.BytesIO(response.content))
+        assert len(record) == 100 and set(record.dtype.names) == {"score", "anomaly"}
+
+        # Raw float64 in, JSON out; scalar fields are still validated
+        raw = np.array([50.0] * 9 + [5000.0]).tobytes()
+        response = client.post("/anomaly?device_id=npy_device", content=raw,
+                               headers={"Content-Type": "application/octet-stream"})
+        assert response.json()["anomalies"] == [9]
+        response = client.post("/anomaly", content=raw,
+                               headers={"Content-Type": "application/octet-stream"})
+        assert response.status_code == 422
+        response = client.post("/anomaly?device_id=x", content=raw, headers={"Content-Type": "text/csv"})
+        assert response.status_code == 415
+        response = client.post("/anomaly?device_id=x&dtype=O", content=raw,
+                               headers={"Content-Type": "application/octet-stream"})
+        assert response.status_code == 400
+
+    def test_forecast_msgpack(self):
+        """Test msgpack requests and responses on /forecast"""
+        msgpack = pytest.importorskip("msgpack")
+        history = np.array([10.0, 20.0, 30.0, 40.0])
+        body = msgpack.packb({"device_id": "msgpack_device", "history": history.tobytes(), "periods": 2})
+        response = client.post(
+            "/forecast", content=body,
+            headers={"Content-Type": "application/msgpack", "Accept": "application/msgpack"}
+        )
+        assert response.status_code == 200
+        data = msgpack.unpackb(response.content)
+        assert data["device_id"] == "msgpack_device"
+        assert data["model_type"] == "moving_average"
+        assert data["forecast"] == pytest.approx([30.0, 100 / 3])
+
+    def test_series_ingest_and_reference(self):
+        """Test forecasts and anomaly detection on a stored device series"""
+        client.delete("/series/series_device")
+        client.delete("/models/series_device")
+        assert client.post("/forecast", json={"device_id": "series_device"}).status_code == 404
+
+        values = np.random.RandomState(9).normal(50, 1, 100)
+        timestamps = [time.time() - 60 * (100 - i) for i in range(100)]
+        response = client.post("/series/series_device",
+                               json={"values": values.tolist(), "timestamps": timestamps})
+        assert response.status_code == 200
+        assert response.json()["accepted"] == 100 and response.json()["points"] == 100
+
+        # Binary values without timestamps are stamped with the server time
+        response = client.post("/series/series_device", content=np.array([50.0, 51.0]).tobytes(),
+                               headers={"Content-Type": "application/octet-stream"})
+        assert response.json()["points"] == 102
+
+        response = client.get("/series/series_device?window=2")
+        assert response.json()["values"] == [50.0, 51.0]
+
+        response = client.post("/forecast", json={"device_id": "series_device", "window": 5, "periods": 2})
+        assert response.status_code == 200
+        assert len(response.json()["forecast"]) == 2
+
+        response = client.post("/anomaly", json={"device_id": "series_device", "window": 50})
+        assert response.status_code == 200
+        assert len(response.json()["scores"]) == 50
+
+        assert client.delete("/series/series_device").json()["cleared"] == 2
+        assert client.get("/series/series_device").status_code == 404
+
     def test_anomaly_insufficient_data(self):
         """Test anomaly detection with insufficient data"""
         request_data = {
@@ -143,6 +546,8 @@ class TestAIMLService:
 
     def test_get_model_info(self):
         """Test getting model information for a device"""
+        import main
+
         # First train some models by making requests
         # Provide at least 7 data points for Prophet model training
         forecast_data = {
@@ -157,6 +562,7 @@ class TestAIMLService:
             "values": list(range(15))  # 15 data points
         }
         client.post("/anomaly", json=anomaly_data)
+        main.model_writer.flush()
 
         # Now check model info
         response = client.get("/models/test_device_models")
@@ -171,6 +577,19 @@ class TestAIMLService:
         model_names = data["models"]
         assert any("anomaly" in name for name in model_names)
 
+    def test_delete_models_exact_device(self):
+        """Test deleting a device's models leaves devices sharing its id prefix alone"""
+        import main
+
+        for device_id in ("room", "room_2"):
+            client.post("/anomaly", json={"device_id": device_id, "values": list(range(15))})
+        main.model_writer.flush()
+
+        assert client.delete("/models/room").json()["cleared"] >= 1
+        assert client.get("/models/room").json()["models"] == []
+        assert client.get("/models/room_2").json()["models"] == ["room_2_anomaly.joblib"]
+        client.delete("/models/room_2")
+
     def test_forecast_edge_cases(self):
         """Test forecast with edge cases"""
         # Test with all same values
@@ -243,6 +662,141 @@ class TestAIMLService:
         for device_id, status_code in results:
             assert status_code == 200
 
+    def test_forecast_reuses_cached_fit(self, monkeypatch):
+        """Test Prophet fits are reused until enough new points arrive"""
+        import main
+        from forecast_cache import ForecastEntry
+
+        fits = []
+
+        async def fake_run(fn, device_id, history, horizon):
+            fits.append(len(history))
+            yhat = np.full(horizon, 42.0)
+            return ForecastEntry(history, yhat, yhat - 1, yhat + 1)
+
+        monkeypatch.setattr(main, "prophet_ready", lambda: True)
+        monkeypatch.setattr(main.model_executor, "run", fake_run)
+        main.forecast_cache.invalidate("cached_device")
+
+        history = np.random.uniform(0, 100, 48).tolist()
+        request_data = {"device_id": "cached_device", "history": history, "periods": 3}
+
+        for extra in ([], [], [1.0, 2.0]):
+            request_data["history"] = history + extra
+            response = client.post("/forecast", json=request_data)
+            assert response.status_code == 200
+            assert response.json()["model_type"] == "prophet"
+            assert response.json()["forecast"] == [42.0] * 3
+        assert fits == [48]
+
+        request_data["history"] = history + [1.0] * main.FORECAST_REFIT_POINTS
+        client.post("/forecast", json=request_data)
+        assert len(fits) == 2
+
+    def test_forecast_seasonal(self):
+        """Test the seasonal engine selected via model_type"""
+        hours = np.arange(14 * 24)
+        history = (50 + 30 * np.sin(2 * np.pi * hours / 24)).tolist()
+        request_data = {"device_id": "seasonal_device", "history": history,
+                        "periods": 6, "model_type": "seasonal"}
+
+        response = client.post("/forecast", json=request_data)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["model_type"] == "seasonal"
+        assert len(data["forecast"]) == 6
+        assert all(0.1 <= c <= 0.95 for c in data["confidence"])
+
+        request_data["model_type"] = "holt_winters"
+        assert client.post("/forecast", json=request_data).status_code == 400
+
+    def test_forecast_batch_seasonal(self):
+        """Test seasonal batch items share one solve and keep per-item periods"""
+        items = [
+            {"device_id": f"seasonal_batch_{i}", "history": np.random.uniform(0, 100, 72).tolist(),
+             "periods": i + 1, "model_type": "seasonal"}
+            for i in range(3)
+        ]
+        items.append({"device_id": "seasonal_batch_bad", "history": [1.0, 2.0, 3.0], "model_type": "nope"})
+        response = client.post("/forecast/batch", json={"items": items})
+        lines = {line["device_id"]: line for line in map(json.loads, response.text.splitlines())}
+
+        assert "error" in lines["seasonal_batch_bad"]
+        for i in range(3):
+            assert lines[f"seasonal_batch_{i}"]["model_type"] == "seasonal"
+            assert len(lines[f"seasonal_batch_{i}"]["forecast"]) == i + 1
+
+    def test_forecast_result_cache(self):
+        """Test identical forecast requests are answered from the result cache"""
+        import main
+
+        request_data = {"device_id": "result_cache_device", "history": [5.0, 6.0, 7.0, 8.0],
+                        "periods": 3, "model_type": "seasonal"}
+        first = client.post("/forecast", json=request_data).json()
+        hits = main.forecast_results.hits
+        second = client.post("/forecast", json=request_data).json()
+        assert main.forecast_results.hits == hits + 1
+        assert second == first
+
+        request_data["periods"] = 4
+        assert len(client.post("/forecast", json=request_data).json()["forecast"]) == 4
+        assert main.forecast_results.hits == hits + 1
+
+    def test_server_timing(self):
+        """Test responses break their latency down into phases"""
+        def phases(response):
+            return [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+
+        client.delete("/models/timing_device")
+        values = np.random.normal(50, 5, 20).tolist()
+        response = client.post("/anomaly", json={"device_id": "timing_device", "values": values})
+        assert phases(response) == ["parse", "load", "fit", "persist", "postprocess", "total"]
+        assert "timings" not in response.json() or response.json()["timings"] is None
+
+        response = client.post("/anomaly?timings=1", json={"device_id": "timing_device", "values": values})
+        assert phases(response) == ["parse", "load", "predict", "postprocess", "total"]
+        assert set(response.json()["timings"]) == {"parse", "load", "predict", "postprocess", "total"}
+        client.delete("/models/timing_device")
+
+        response = client.post("/forecast", json={"device_id": "timing_device", "history": [1.0, 2.0, 3.0, 4.0],
+                                                  "periods": 2, "model_type": "moving_average"})
+        assert phases(response) == ["parse", "load", "predict", "total"]
+        assert 'desc="' in response.headers["server-timing"]
+
+        response = client.post("/schedule", json={"device_id": "timing_device"})
+        assert phases(response) == ["parse", "fit", "predict", "postprocess", "total"]
+
+    def test_forecast_batch(self):
+        """Test batch forecast streams one NDJSON line per device"""
+        request_data = {
+            "items": [
+                {"device_id": "batch_1", "history": [10.0, 20.0, 30.0], "periods": 2},
+                {"device_id": "batch_2", "history": [50.0, 50.0, 50.0, 50.0], "periods": 4},
+                {"device_id": "batch_3", "history": [1.0], "periods": 2}
+            ]
+        }
+
+        response = client.post("/forecast/batch", json=request_data)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        by_device = {line["device_id"]: line for line in lines}
+        assert set(by_device) == {"batch_1", "batch_2", "batch_3"}
+        assert "at least 3 data points" in by_device["batch_3"]["error"]
+        assert by_device["batch_1"]["forecast"] == pytest.approx([20.0, 70.0 / 3])
+        assert by_device["batch_2"]["forecast"] == [50.0] * 4
+        assert len(by_device["batch_2"]["confidence"]) == 4
+
+        # Vectorized path must agree with the single-device endpoint
+        single = client.post("/forecast", json=request_data["items"][0]).json()
+        assert single["forecast"] == pytest.approx(by_device["batch_1"]["forecast"])
+
+    def test_forecast_batch_empty(self):
+        """Test batch forecast rejects an empty batch"""
+        response = client.post("/forecast/batch", json={"items": []})
+        assert response.status_code == 400
+
     def test_invalid_request_data(self):
         """Test handling of invalid request data"""
         # Test forecast with invalid history data
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+import metrics
+from metrics import StatsCollector, monitor_event_loop_lag, register_stats
+
+
+class TestStatsCollector:
+    """Test stats() dicts are exported at scrape time"""
+
+    def test_gauges_and_counters(self):
+        stats = {"entries": 3, "hits": 10, "hit_rate": 0.5, "kind": "thread", "enabled": True}
+        registry = CollectorRegistry()
+        register_stats("cache", lambda: stats, counters=("hits",), registry=registry)
+
+        text = generate_latest(registry).decode()
+        assert "aiml_cache_entries 3.0" in text
+        assert "aiml_cache_hit_rate 0.5" in text
+        assert "aiml_cache_hits_total 10.0" in text
+        assert "kind" not in text and "enabled" not in text
+
+        stats["entries"] = 4
+        assert "aiml_cache_entries 4.0" in generate_latest(registry).decode()
+
+    def test_names_are_prefixed(self):
+        names = [m.name for m in StatsCollector("executor", lambda: {"pending": 1}).collect()]
+        assert names == ["aiml_executor_pending"]
+
+
+class TestEventLoopLag:
+    """Test the event loop lag monitor"""
+
+    def test_records_samples(self):
+        async def blocked_loop():
+            task = asyncio.create_task(monitor_event_loop_lag(0.01))
+            await asyncio.sleep(0.02)
+            time.sleep(0.05)  # block the loop so the monitor wakes up late
+            await asyncio.sleep(0.03)
+            task.cancel()
+
+        before = metrics.EVENT_LOOP_LAG._sum.get()
+        asyncio.run(blocked_loop())
+        assert metrics.EVENT_LOOP_LAG._sum.get() - before >= 0.03
+        assert metrics.EVENT_LOOP_LAG_LAST._value.get() >= 0
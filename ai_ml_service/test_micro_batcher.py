@@ -0,0 +1,100 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from micro_batcher import MicroBatcher, split_result
+from statistical_detector import StatisticalDetector
+
+
+def threshold_score(calls):
+    def score(target, values):
+        calls.append(len(values))
+        scores = target - values
+        return np.flatnonzero(scores < 0).tolist(), scores.tolist()
+    return score
+
+
+class TestMicroBatcher:
+    """Test micro-batched anomaly scoring"""
+
+    def test_split_result(self):
+        results = split_result([1, 3, 4], [0.5, -1, 0.5, -1, -1], [2, 1, 2])
+        assert results == [([1], [0.5, -1]), ([], [0.5]), ([0, 1], [-1, -1])]
+
+    def test_concurrent_requests_share_one_call(self):
+        calls = []
+        batcher = MicroBatcher(threshold_score(calls), max_wait=0.02)
+
+        async def burst():
+            return await asyncio.gather(
+                batcher.submit("dev", 5.0, np.array([1.0, 9.0])),
+                batcher.submit("dev", 5.0, np.array([7.0])),
+                batcher.submit("dev", 5.0, np.array([2.0, 3.0, 8.0])),
+                batcher.submit("other", 5.0, np.array([6.0])),
+            )
+
+        results = asyncio.run(burst())
+        assert sorted(calls) == [1, 6]
+        assert results[0] == ([1], [4.0, -4.0])
+        assert results[1] == ([0], [-2.0])
+        assert results[2] == ([2], [3.0, 2.0, -3.0])
+        assert results[3] == ([0], [-1.0])
+        assert batcher.stats()["largest_batch"] == 3
+
+    def test_full_batch_flushes_early(self):
+        calls = []
+        batcher = MicroBatcher(threshold_score(calls), max_batch=2, max_wait=5.0)
+
+        async def burst():
+            return await asyncio.wait_for(asyncio.gather(
+                batcher.submit("dev", 0.0, np.array([1.0])),
+                batcher.submit("dev", 0.0, np.array([2.0])),
+            ), timeout=1.0)
+
+        assert len(asyncio.run(burst())) == 2
+        assert calls == [2]
+
+    def test_errors_reach_every_request(self):
+        def failing(target, values):
+            raise RuntimeError("model broken")
+
+        batcher = MicroBatcher(failing, max_wait=0.01)
+
+        async def burst():
+            return await asyncio.gather(
+                batcher.submit("dev", None, np.ones(3)),
+                batcher.submit("dev", None, np.ones(3)),
+                return_exceptions=True,
+            )
+
+        assert all(isinstance(e, RuntimeError) for e in asyncio.run(burst()))
+        assert batcher.stats()["pending"] == 0
+
+    def test_disabled_scores_directly(self):
+        calls = []
+        batcher = MicroBatcher(threshold_score(calls), max_wait=0)
+        assert asyncio.run(batcher.submit("dev", 1.0, np.array([0.0, 2.0]))) == ([1], [1.0, -1.0])
+        assert calls == [2]
+
+    def test_batched_detector_matches_single_call(self):
+        rng = np.random.default_rng(0)
+        baseline = rng.normal(50, 2, 200)
+        chunks = [rng.normal(50, 2, 20), np.array([50.0, 95.0, 49.0]), rng.normal(50, 2, 5)]
+        single, batched = StatisticalDetector("a"), StatisticalDetector("b")
+        single.train(baseline)
+        batched.train(baseline)
+
+        anomalies, scores = single.predict(np.concatenate(chunks))
+        expected = split_result(anomalies, scores, [len(c) for c in chunks])
+
+        batcher = MicroBatcher(lambda detector, values: detector.predict(values), max_wait=0.01)
+
+        async def burst():
+            return await asyncio.gather(*(batcher.submit("b", batched, c) for c in chunks))
+
+        results = asyncio.run(burst())
+        assert [r[0] for r in results] == [e[0] for e in expected]
+        for (_, got), (_, want) in zip(results, expected):
+            assert got == pytest.approx(want)
+        assert results[1][0] == [1]
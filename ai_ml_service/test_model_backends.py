@@ -0,0 +1,52 @@
+import threading
+
+from model_backends import FAILED, READY, UNAVAILABLE, BackendLoader, is_installed
+
+
+class TestBackendLoader:
+    """Test lazy background loading of model backends"""
+
+    def test_is_installed_does_not_import(self):
+        assert is_installed("json")
+        assert not is_installed("definitely_not_a_module_xyz")
+
+    def test_loads_and_warms_up_in_background(self):
+        release = threading.Event()
+        warmed, loaded = [], []
+        loader = BackendLoader(on_loaded=lambda name, seconds: loaded.append((name, seconds)))
+        loader.register("json", "json", warmup=lambda module: (release.wait(5), warmed.append(module)))
+
+        assert loader.ready("json") is False  # first check starts loading
+        assert loader.status()["json"]["state"] == "loading"
+        release.set()
+        assert loader.wait("json", timeout=5)
+
+        assert warmed[0].__name__ == "json"
+        assert loaded[0][0] == "json"
+        assert loader.status()["json"]["state"] == READY
+        assert loader.start("json") is False  # loaded at most once
+
+    def test_missing_backend(self):
+        loader = BackendLoader()
+        loader.register("ghost", "definitely_not_a_module_xyz")
+        assert not loader.installed("ghost")
+        assert loader.wait("ghost", timeout=1) is False
+        assert loader.status()["ghost"]["state"] == UNAVAILABLE
+
+    def test_failed_warmup(self):
+        def broken(module):
+            raise RuntimeError("no stan")
+
+        loader = BackendLoader()
+        loader.register("json", "json", warmup=broken)
+        loader.start_all()
+        assert loader.wait("json", timeout=5) is False
+        status = loader.status()["json"]
+        assert status["state"] == FAILED and "no stan" in status["error"]
+
+    def test_custom_load_replaces_import(self):
+        warmed, loaded = [], []
+        loader = BackendLoader()
+        loader.register("json", "json", warmup=warmed.append, load=lambda: loaded.append(True))
+        assert loader.wait("json", timeout=5)
+        assert loaded == [True] and warmed == []
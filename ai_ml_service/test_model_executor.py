@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from model_executor import ExecutorSaturated, ModelExecutor
+
+
+def square(x):
+    return x * x
+
+
+def slow(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+WORKER_READY = False
+
+
+def init_worker():
+    global WORKER_READY
+    WORKER_READY = True
+
+
+def worker_ready():
+    return WORKER_READY
+
+
+class TestModelExecutor:
+    """Tests for the bounded model executor"""
+
+    def test_runs_in_process_pool(self):
+        executor = ModelExecutor(max_workers=1)
+        try:
+            assert asyncio.run(executor.run(square, 7)) == 49
+            assert executor.pending == 0
+        finally:
+            executor.shutdown()
+
+    def test_initializer_runs_in_each_worker(self):
+        executor = ModelExecutor(max_workers=2, initializer=init_worker)
+        try:
+            assert asyncio.run(executor.run(worker_ready))
+            assert not WORKER_READY  # not in this process
+        finally:
+            executor.shutdown()
+
+    def test_thread_kind(self):
+        executor = ModelExecutor(max_workers=1, kind="thread")
+        try:
+            assert asyncio.run(executor.run(square, 3)) == 9
+        finally:
+            executor.shutdown()
+
+    def test_rejects_unknown_kind(self):
+        with pytest.raises(ValueError):
+            ModelExecutor(kind="gpu")
+
+    def test_bounded_queue(self):
+        executor = ModelExecutor(max_workers=1, max_queue=1, kind="thread")
+
+        async def scenario():
+            first = asyncio.ensure_future(executor.run(slow, 0.2))
+            await asyncio.sleep(0.01)
+            with pytest.raises(ExecutorSaturated):
+                await executor.run(square, 2)
+            return await first
+
+        try:
+            assert asyncio.run(scenario()) == 0.2
+        finally:
+            executor.shutdown()
+
+    def test_task_timeout(self):
+        executor = ModelExecutor(max_workers=1, task_timeout=0.05, kind="thread")
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                asyncio.run(executor.run(slow, 0.3))
+        finally:
+            executor.shutdown()
+        # The slot is released once the worker actually finishes
+        assert executor.pending == 0
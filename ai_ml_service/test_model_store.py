@@ -0,0 +1,111 @@
+import joblib
+import numpy as np
+import pytest
+
+from model_store import SCHEMA_VERSION, ModelStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ModelStore(tmp_path)
+
+
+class TestModelStore:
+    """Tests for the atomic, versioned model store"""
+
+    def test_roundtrip(self, store):
+        store.save("dev", "anomaly", {"weights": [1, 2, 3]})
+        assert store.load("dev", "anomaly") == {"weights": [1, 2, 3]}
+        envelope = store.load_envelope("dev", "anomaly")
+        assert envelope["schema"] == SCHEMA_VERSION
+        assert envelope["model_type"] == "anomaly"
+
+    def test_missing_model(self, store):
+        assert store.load("nobody", "anomaly") is None
+
+    def test_no_temp_files_left(self, store, tmp_path):
+        store.save("dev", "anomaly", [1.0])
+        store.save("dev", "anomaly", [2.0])
+        assert [f.name for f in tmp_path.iterdir()] == ["dev_anomaly.joblib"]
+        assert store.load("dev", "anomaly") == [2.0]
+
+    def test_versions_increase(self, store):
+        store.save("dev", "anomaly", 1)
+        first = store.load_envelope("dev", "anomaly")["version"]
+        store.save("dev", "anomaly", 2)
+        assert store.load_envelope("dev", "anomaly")["version"] > first
+
+    def test_stamp_changes_on_save(self, store):
+        assert store.stamp("dev", "anomaly") is None
+        store.save("dev", "anomaly", 1)
+        first = store.stamp("dev", "anomaly")
+        assert store.stamp("dev", "anomaly") == first
+        store.save("dev", "anomaly", 2)
+        assert store.stamp("dev", "anomaly") != first
+
+    def test_deferred_dir_sync(self, store, monkeypatch):
+        syncs = []
+        monkeypatch.setattr(store, "sync_dir", lambda: syncs.append(1))
+        store.save("dev", "anomaly", 1, sync_dir=False)
+        store.save("dev", "forecast", 2, sync_dir=False)
+        assert syncs == []
+        assert store.load("dev", "forecast") == 2
+        store.save("dev", "anomaly", 3)
+        assert syncs == [1]
+
+    def test_stored_models(self, store):
+        store.save("dev_1", "anomaly", 1)
+        store.save("dev_1", "anomaly_statistical", 2)
+        store.save("fleet.lights", "fleet_model", 3)
+        store.save("dev_2", "unknown_type", 4)
+        stored = store.stored(["anomaly", "anomaly_statistical", "fleet_model"])
+        assert sorted((device_id, model_type) for device_id, model_type, _, _ in stored) == [
+            ("dev_1", "anomaly"), ("dev_1", "anomaly_statistical"), ("fleet.lights", "fleet_model")
+        ]
+        assert all(size > 0 and mtime > 0 for _, _, mtime, size in stored)
+
+    def test_failed_write_keeps_previous_file(self, store, tmp_path):
+        store.save("dev", "anomaly", "good")
+
+        class Unpicklable:
+            def __reduce__(self):
+                raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            store.save("dev", "anomaly", Unpicklable())
+        assert store.load("dev", "anomaly") == "good"
+        assert [f.name for f in tmp_path.iterdir()] == ["dev_anomaly.joblib"]
+
+    def test_unknown_schema_is_ignored(self, store):
+        joblib.dump({"schema": 99, "model": "future"}, store.path("dev", "anomaly"))
+        assert store.load("dev", "anomaly") is None
+
+    def test_legacy_pickle(self, store):
+        joblib.dump({"old": True}, store.legacy_path("dev", "anomaly"))
+        assert store.load("dev", "anomaly") == {"old": True}
+        store.save("dev", "anomaly", {"old": False})
+        assert not store.legacy_path("dev", "anomaly").exists()
+
+    def test_arrays_are_memory_mapped(self, tmp_path):
+        store = ModelStore(tmp_path, mmap=True)
+        store.save("dev", "anomaly", {"tree": np.arange(1000, dtype=np.float64)})
+        assert not isinstance(ModelStore(tmp_path).load("dev", "anomaly")["tree"], np.memmap)
+        loaded = store.load("dev", "anomaly")
+        assert isinstance(loaded["tree"], np.memmap)
+        assert loaded["tree"][999] == 999.0
+
+    def test_compressed(self, tmp_path):
+        store = ModelStore(tmp_path, compress=3)
+        store.save("dev", "anomaly", {"tree": np.zeros(1000)})
+        assert store.load("dev", "anomaly")["tree"].sum() == 0
+
+    def test_files_and_delete(self, store):
+        store.save("dev", "anomaly", 1)
+        store.save("dev", "forecast", 2)
+        joblib.dump(3, store.legacy_path("dev", "other"))
+        store.save("dev_2", "anomaly", 4)  # another device whose id shares the prefix
+        types = ["anomaly", "forecast", "other"]
+        assert len(store.files("dev", types)) == 3
+        assert store.delete("dev", types) == 3
+        assert store.files("dev", types) == []
+        assert store.load("dev_2", "anomaly") == 4
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from model_writer import ModelWriter
+
+
+class Recorder:
+    def __init__(self, fail=()):
+        self.saved = []
+        self.syncs = 0
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+
+    def save(self, key, model):
+        if key in self.fail:
+            raise OSError("disk full")
+        with self.lock:
+            self.saved.append((key, model))
+
+    def sync(self):
+        self.syncs += 1
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+class TestModelWriter:
+    """Test the debounced background model writer"""
+
+    def test_submit_returns_before_writing(self):
+        recorder = Recorder()
+        writer = ModelWriter(recorder.save, recorder.sync, delay=0.05)
+        writer.submit(("dev", "anomaly"), 1)
+        assert recorder.saved == []
+        assert writer.get(("dev", "anomaly")) == 1
+        wait_for(lambda: recorder.saved)
+        assert recorder.saved == [(("dev", "anomaly"), 1)]
+        assert writer.get(("dev", "anomaly")) is None
+        writer.close()
+
+    def test_repeated_saves_write_latest_once(self):
+        recorder = Recorder()
+        writer = ModelWriter(recorder.save, recorder.sync, delay=0.05)
+        for version in range(5):
+            writer.submit(("dev", "anomaly"), version)
+        writer.submit(("other", "anomaly"), "x")
+        wait_for(lambda: writer.stats()["batches"] == 1)
+        assert sorted(recorder.saved) == [(("dev", "anomaly"), 4), (("other", "anomaly"), "x")]
+        assert recorder.syncs == 1  # one directory sync for the batch
+        stats = writer.stats()
+        assert stats["submitted"] == 6 and stats["coalesced"] == 4 and stats["written"] == 2
+        writer.close()
+
+    def test_close_flushes(self):
+        recorder = Recorder()
+        writer = ModelWriter(recorder.save, recorder.sync, delay=60)
+        writer.submit(("dev", "anomaly"), 1)
+        writer.close()
+        assert recorder.saved == [(("dev", "anomaly"), 1)]
+        writer.submit(("dev", "anomaly"), 2)  # after shutdown: synchronous
+        assert recorder.saved[-1] == (("dev", "anomaly"), 2)
+
+    def test_write_supersedes_queued_save(self):
+        recorder = Recorder()
+        writer = ModelWriter(recorder.save, recorder.sync, delay=60)
+        writer.submit(("dev", "anomaly"), 1)
+        writer.write(("dev", "anomaly"), 2)
+        assert recorder.saved == [(("dev", "anomaly"), 2)]
+        writer.flush()
+        assert recorder.saved == [(("dev", "anomaly"), 2)]
+
+    def test_cancel(self):
+        recorder = Recorder()
+        writer = ModelWriter(recorder.save, recorder.sync, delay=60)
+        writer.submit(("dev", "anomaly"), 1)
+        writer.submit(("dev", "forecast"), 2)
+        writer.submit(("keep", "anomaly"), 3)
+        assert writer.cancel(lambda key: key[0] == "dev") == 2
+        writer.flush()
+        assert recorder.saved == [(("keep", "anomaly"), 3)]
+
+    def test_failed_save_is_counted(self):
+        recorder = Recorder(fail={("bad", "anomaly")})
+        writer = ModelWriter(recorder.save, recorder.sync, delay=60)
+        writer.submit(("bad", "anomaly"), 1)
+        writer.submit(("good", "anomaly"), 2)
+        writer.flush()
+        assert recorder.saved == [(("good", "anomaly"), 2)]
+        assert writer.stats()["failed"] == 1
+
+    def test_zero_delay_writes_synchronously(self):
+        recorder = Recorder()
+        writer = ModelWriter(recorder.save, recorder.sync, delay=0)
+        writer.submit(("dev", "anomaly"), 1)
+        assert recorder.saved == [(("dev", "anomaly"), 1)]
+        assert recorder.syncs == 1
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from moving_average import (
+    forecast_coefficients,
+    forecast_histories,
+    moving_average_forecast,
+    window_weights,
+)
+
+
+def loop_forecast(history, periods, weights):
+    """Reference implementation: feed each prediction back into the window"""
+    values = list(history)
+    window = len(weights)
+    for _ in range(periods):
+        values.append(float(np.dot(weights, values[-window:])))
+    return values[len(history):]
+
+
+class TestMovingAverage:
+    """Tests for the closed-form moving-average engine"""
+
+    @pytest.mark.parametrize("weighting", ["sma", "wma", "ewma"])
+    def test_matches_recursive_loop(self, weighting):
+        history = np.random.RandomState(1).uniform(0, 100, 12)
+        weights = window_weights(5, weighting)
+        expected = loop_forecast(history, 8, weights)
+        result = moving_average_forecast(history[-5:], 8, weighting)
+        assert result == pytest.approx(expected)
+
+    def test_two_dimensional_input(self):
+        windows = np.random.RandomState(2).uniform(0, 100, (50, 3))
+        batch = moving_average_forecast(windows, 4)
+        assert batch.shape == (50, 4)
+        for row, forecast in zip(windows, batch):
+            assert forecast == pytest.approx(moving_average_forecast(row, 4))
+
+    def test_constant_series_is_exact(self):
+        assert moving_average_forecast([50.0, 50.0, 50.0], 10).tolist() == [50.0] * 10
+
+    def test_coefficients_are_cached_and_read_only(self):
+        coefficients = forecast_coefficients(3, 5)
+        assert forecast_coefficients(3, 5) is coefficients
+        assert not coefficients.flags.writeable
+
+    def test_ragged_histories(self):
+        histories = [[1.0, 2.0], [10.0, 20.0, 30.0, 40.0], [5.0, 5.0, 5.0]]
+        out = forecast_histories(histories, 3, window=3)
+        assert out[0] == pytest.approx(moving_average_forecast([1.0, 2.0], 3))
+        assert out[1] == pytest.approx(moving_average_forecast([20.0, 30.0, 40.0], 3))
+        assert out[2].tolist() == [5.0, 5.0, 5.0]
+
+    def test_invalid_weighting(self):
+        with pytest.raises(ValueError):
+            window_weights(3, "median")
@@ -0,0 +1,108 @@
+import io
+
+import numpy as np
+import pytest
+
+import payloads
+from payloads import ARROW, JSON, MSGPACK, NPY, RAW, PayloadError
+
+
+def npy_bytes(array: np.ndarray) -> bytes:
+    stream = io.BytesIO()
+    np.save(stream, array)
+    return stream.getvalue()
+
+
+class TestNegotiation:
+    """Test Content-Type / Accept header handling"""
+
+    def test_request_format(self):
+        assert payloads.request_format(None) == JSON
+        assert payloads.request_format("application/json; charset=utf-8") == JSON
+        assert payloads.request_format("application/npy") == NPY
+        assert payloads.request_format("application/x-msgpack") == MSGPACK
+        with pytest.raises(PayloadError) as e:
+            payloads.request_format("text/csv")
+        assert e.value.status_code == 415
+
+    def test_response_format(self):
+        assert payloads.response_format(None) == JSON
+        assert payloads.response_format("*/*") == JSON
+        assert payloads.response_format("text/html, application/x-npy;q=0.9") == NPY
+
+
+class TestDecodeSeries:
+    """Test binary series decoding"""
+
+    def test_raw_float64_is_zero_copy(self):
+        body = np.arange(5, dtype="<f8").tobytes()
+        series = payloads.decode_series(body, RAW, "history")
+        assert series.tolist() == [0, 1, 2, 3, 4]
+        assert not series.flags.owndata  # a view over the request body
+
+    def test_raw_float32(self):
+        body = np.array([1.5, 2.5], dtype="<f4").tobytes()
+        assert payloads.decode_series(body, RAW, "history", dtype="float32").tolist() == [1.5, 2.5]
+        with pytest.raises(PayloadError):
+            payloads.decode_series(body[:-1], RAW, "history", dtype="float32")
+
+    @pytest.mark.parametrize("dtype", ["O", "U4", "V8", "datetime64[s]", "no_such_dtype"])
+    def test_raw_rejects_non_numeric_dtypes(self, dtype):
+        with pytest.raises(PayloadError):
+            payloads.decode_series(np.zeros(4).tobytes(), RAW, "history", dtype=dtype)
+
+    def test_npy(self):
+        series = payloads.decode_series(npy_bytes(np.linspace(0, 1, 11)), NPY, "history")
+        assert series.dtype == np.float64 and len(series) == 11
+        assert not series.flags.owndata
+        assert payloads.decode_series(npy_bytes(np.arange(3, dtype=np.int32)), NPY, "x").tolist() == [0, 1, 2]
+
+    def test_rejects_bad_series(self):
+        with pytest.raises(PayloadError):
+            payloads.decode_series(npy_bytes(np.ones((2, 2))), NPY, "history")
+        with pytest.raises(PayloadError):
+            payloads.decode_series(npy_bytes(np.array([1.0, np.nan])), NPY, "history")
+        with pytest.raises(PayloadError):
+            payloads.decode_series(b"not an npy file", NPY, "history")
+
+    def test_arrow(self):
+        pa = pytest.importorskip("pyarrow")
+        table = pa.table({"other": pa.array([9.0, 9.0]), "values": pa.array([1.0, 2.0])})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        series = payloads.decode_series(sink.getvalue().to_pybytes(), ARROW, "values")
+        assert series.tolist() == [1.0, 2.0]
+
+    def test_msgpack(self):
+        msgpack = pytest.importorskip("msgpack")
+        body = msgpack.packb({"device_id": "d", "values": np.array([1.0, 2.0]).tobytes()})
+        fields, series = payloads.decode_msgpack(body, "values")
+        assert fields == {"device_id": "d"} and series.tolist() == [1.0, 2.0]
+
+        fields, series = payloads.decode_msgpack(msgpack.packb({"values": [3, 4]}), "values")
+        assert series.tolist() == [3.0, 4.0]
+
+
+class TestEncode:
+    """Test array-format responses"""
+
+    COLUMNS = {"score": np.array([0.1, -0.2]), "anomaly": np.array([False, True])}
+
+    def test_npy_structured(self):
+        body, headers = payloads.encode(NPY, {"device_id": "d", "threshold": 0.5}, self.COLUMNS)
+        record = np.load(io.BytesIO(body))
+        assert record["score"].tolist() == [0.1, -0.2]
+        assert record["anomaly"].tolist() == [False, True]
+        assert headers == {"X-Device-Id": "d", "X-Threshold": "0.5"}
+
+    def test_raw_first_column(self):
+        body, _ = payloads.encode(RAW, {}, self.COLUMNS)
+        assert np.frombuffer(body, dtype="<f8").tolist() == [0.1, -0.2]
+
+    def test_arrow(self):
+        pa = pytest.importorskip("pyarrow")
+        body, _ = payloads.encode(ARROW, {"device_id": "d"}, self.COLUMNS)
+        table = pa.ipc.open_stream(body).read_all()
+        assert table.column("anomaly").to_pylist() == [False, True]
+        assert table.schema.metadata[b"device_id"] == b"d"
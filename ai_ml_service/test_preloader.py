@@ -0,0 +1,97 @@
+import threading
+import time
+
+from preloader import DISABLED, FAILED, PENDING, READY, ModelPreloader, StoredModel
+
+
+def stored(name, model_type="anomaly", mtime=0.0):
+    return StoredModel(name, model_type, mtime, 1000)
+
+
+class TestModelPreloader:
+    """Test the startup warm-up of stored models"""
+
+    def test_loads_most_recent_first(self):
+        models = [stored(f"dev{i}", mtime=i) for i in range(10)]
+        loaded = []
+        lock = threading.Lock()
+
+        def load(model):
+            with lock:
+                loaded.append(model.device_id)
+            return 100
+
+        preloader = ModelPreloader(lambda: models, load, max_models=4, workers=1)
+        assert preloader.status()["state"] == PENDING
+        assert preloader.start()
+        assert not preloader.start()
+        assert preloader.wait(5)
+
+        assert loaded == ["dev9", "dev8", "dev7", "dev6"]
+        status = preloader.status()
+        assert status["state"] == READY
+        assert (status["candidates"], status["loaded"], status["bytes"]) == (4, 4, 400)
+        assert status["progress"] == 1.0
+
+    def test_priority_before_recency(self):
+        models = [stored("dev", mtime=10), stored("fleet.a", "fleet_model", mtime=1)]
+        preloader = ModelPreloader(lambda: models, lambda model: 1,
+                                   priority=lambda model: 0 if model.model_type == "fleet_model" else 1)
+        assert [model.device_id for model in preloader.rank(models)] == ["fleet.a", "dev"]
+
+    def test_memory_budget(self):
+        models = [stored(f"dev{i}", mtime=i) for i in range(10)]
+        preloader = ModelPreloader(lambda: models, lambda model: 300, max_bytes=1000, workers=1)
+        preloader.start()
+        preloader.wait(5)
+        status = preloader.status()
+        assert status["loaded"] == 4 and status["skipped"] == 6
+
+    def test_loads_in_parallel(self):
+        models = [stored(f"dev{i}") for i in range(8)]
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def load(model):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return 1
+
+        preloader = ModelPreloader(lambda: models, load, workers=4)
+        preloader.start()
+        preloader.wait(5)
+        assert preloader.status()["loaded"] == 8
+        assert peak[0] > 1
+
+    def test_failures(self):
+        def load(model):
+            if model.device_id == "bad":
+                raise ValueError("corrupt")
+            return 0 if model.device_id == "cached" else 10
+
+        models = [stored("bad"), stored("cached"), stored("good")]
+        preloader = ModelPreloader(lambda: models, load)
+        preloader.start()
+        preloader.wait(5)
+        status = preloader.status()
+        assert (status["loaded"], status["skipped"], status["failed"]) == (1, 1, 1)
+        assert status["state"] == READY
+
+        def broken_scan():
+            raise OSError("no such directory")
+
+        preloader = ModelPreloader(broken_scan, load)
+        preloader.start()
+        preloader.wait(5)
+        assert preloader.status()["state"] == FAILED
+        assert "no such directory" in preloader.status()["error"]
+
+    def test_disabled(self):
+        preloader = ModelPreloader(lambda: [], lambda model: 0, max_models=0)
+        assert preloader.status()["state"] == DISABLED
+        assert not preloader.start()
+        assert preloader.wait(0)
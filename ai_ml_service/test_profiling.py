@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from profiling import ProfilingMiddleware, StackSampler, sample_stacks, summarize, write_folded
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def make_client(tmp_path, **kwargs):
+    app = FastAPI()
+
+    @app.get("/busy")
+    def busy():
+        busy_loop(0.1)
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def lines():
+            for i in range(5):
+                await asyncio.sleep(0.03)
+                yield f"{i}\n"
+        return StreamingResponse(lines())
+
+    app.add_middleware(ProfilingMiddleware, profile_dir=tmp_path, **kwargs)
+    return TestClient(app)
+
+
+class TestStackSampler:
+    """Test stack sampling and the folded output"""
+
+    def test_samples_busy_thread(self):
+        sampler = StackSampler(interval=0.001).start()
+        busy_loop(0.1)
+        stacks = sampler.stop()
+        assert sampler.samples > 0
+        assert any("test_profiling:busy_loop" in stack for stack in stacks)
+        assert not any("stack-sampler" in stack.split(";")[0] for stack in stacks)
+
+    def test_stacks_are_root_first(self):
+        stacks = sample_stacks()
+        mine = [stack for stack in stacks if "test_stacks_are_root_first" in stack]
+        assert len(mine) == 1
+        frames = mine[0].split(";")
+        assert frames[0] == "MainThread"
+        assert frames[-1] == "profiling:sample_stacks"
+
+    def test_write_folded_and_summary(self, tmp_path):
+        stacks = Counter({"main;a:f;a:g": 3, "main;a:f": 1})
+        path = write_folded(stacks, tmp_path / "sub" / "p.folded")
+        assert path.read_text().splitlines() == ["main;a:f;a:g 3", "main;a:f 1"]
+        summary = summarize(stacks, top=1)
+        assert "75.0%" in summary and "a:g <- a:f <- main" in summary
+
+
+class TestProfilingMiddleware:
+    """Test opt-in profiles and the slow-request log"""
+
+    def test_profile_on_token(self, tmp_path):
+        client = make_client(tmp_path, token="secret", slow_seconds=0, interval=0.001)
+        response = client.get("/busy", headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        name = response.headers["x-profile-file"]
+        assert name.endswith("-GET-busy.folded")
+        profile = (tmp_path / name).read_text()
+        assert "test_profiling:busy_loop" in profile
+
+        response = client.get("/busy", params={"profile": "secret"})
+        assert "x-profile-file" in response.headers
+
+    def test_no_profile_without_token(self, tmp_path):
+        client = make_client(tmp_path, token="", slow_seconds=0)
+        response = client.get("/busy", headers={"X-Profile": ""})
+        assert "x-profile-file" not in response.headers
+
+        client = make_client(tmp_path, token="secret", slow_seconds=0)
+        response = client.get("/busy", headers={"X-Profile": "wrong"})
+        assert "x-profile-file" not in response.headers
+        assert list(tmp_path.iterdir()) == []
+
+    def test_slow_request_logged(self, tmp_path, caplog):
+        client = make_client(tmp_path, slow_seconds=0.02)
+        with caplog.at_level(logging.WARNING, logger="profiling"):
+            assert client.get("/busy").status_code == 200
+        assert "Slow request GET /busy" in caplog.text
+        assert "busy_loop" in caplog.text
+        [path] = tmp_path.glob("*-slow.folded")
+        assert "test_profiling:busy_loop" in path.read_text()
+
+    def test_fast_request_not_logged(self, tmp_path, caplog):
+        client = make_client(tmp_path, slow_seconds=5)
+        with caplog.at_level(logging.WARNING, logger="profiling"):
+            client.get("/busy")
+        assert "Slow request" not in caplog.text
+        assert list(tmp_path.iterdir()) == []
+
+    def test_stream_not_logged_after_it_started(self, tmp_path, caplog):
+        client = make_client(tmp_path, slow_seconds=0.02)
+        with caplog.at_level(logging.WARNING, logger="profiling"):
+            response = client.get("/stream")
+        assert response.text == "0\n1\n2\n3\n4\n"
+        assert "Slow request" not in caplog.text
+        assert list(tmp_path.iterdir()) == []
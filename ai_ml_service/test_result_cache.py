@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from result_cache import COALESCED, HIT, MISS, ResultCache
+
+
+class TestResultCache:
+    """Test TTL caching and single-flight deduplication"""
+
+    def test_hit_after_miss(self):
+        cache = ResultCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return "forecast"
+
+        assert asyncio.run(cache.get(("dev", 1), compute)) == ("forecast", MISS)
+        assert asyncio.run(cache.get(("dev", 1), compute)) == ("forecast", HIT)
+        assert asyncio.run(cache.get(("dev", 2), compute))[1] == MISS
+        assert len(calls) == 2
+
+    def test_concurrent_callers_coalesce(self):
+        cache = ResultCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        async def burst():
+            return await asyncio.gather(*(cache.get(("dev",), compute) for _ in range(5)))
+
+        results = asyncio.run(burst())
+        assert calls == [1]
+        assert [r[0] for r in results] == [1] * 5
+        assert sorted(r[1] for r in results) == [COALESCED] * 4 + [MISS]
+        assert cache.stats()["coalesced"] == 4
+
+    def test_coalesces_across_event_loops(self):
+        cache = ResultCache()
+        started = threading.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            started.set()
+            await asyncio.sleep(0.1)
+            return "shared"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(asyncio.run(cache.get(("dev",), compute))))
+        leader.start()
+        started.wait(5)
+        results.append(asyncio.run(cache.get(("dev",), compute)))
+        leader.join()
+
+        assert calls == [1]
+        assert {status for _, status in results} == {MISS, COALESCED}
+
+    def test_errors_are_shared_but_not_cached(self):
+        cache = ResultCache()
+
+        async def failing():
+            await asyncio.sleep(0.02)
+            raise RuntimeError("fit failed")
+
+        async def burst():
+            return await asyncio.gather(
+                cache.get(("dev",), failing), cache.get(("dev",), failing), return_exceptions=True
+            )
+
+        assert all(isinstance(e, RuntimeError) for e in asyncio.run(burst()))
+        assert len(cache) == 0
+
+    def test_uncacheable_and_expiry(self):
+        cache = ResultCache(ttl=0.05, cacheable=lambda result: result != "fallback")
+
+        async def value(result):
+            return result
+
+        asyncio.run(cache.get(("dev", "a"), lambda: value("fallback")))
+        assert len(cache) == 0
+
+        asyncio.run(cache.get(("dev", "b"), lambda: value("ok")))
+        assert asyncio.run(cache.get(("dev", "b"), lambda: value("new")))[1] == HIT
+        time.sleep(0.06)
+        assert asyncio.run(cache.get(("dev", "b"), lambda: value("new"))) == ("new", MISS)
+
+    def test_bounds_and_invalidate(self):
+        cache = ResultCache(max_entries=2)
+
+        async def value():
+            return 1
+
+        for key in (("a", 1), ("a", 2), ("b", 1)):
+            asyncio.run(cache.get(key, value))
+        assert len(cache) == 2 and cache.evictions == 1
+
+        cache.invalidate("b")
+        assert len(cache) == 1
+
+    def test_cancelled_waiter_does_not_cancel_leader(self):
+        cache = ResultCache()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def scenario():
+            leader = asyncio.ensure_future(cache.get(("dev",), compute))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(cache.get(("dev",), compute))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            return await leader
+
+        assert asyncio.run(scenario()) == ("done", MISS)
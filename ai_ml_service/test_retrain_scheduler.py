@@ -0,0 +1,108 @@
+import threading
+import time
+
+import numpy as np
+
+from model_executor import ModelExecutor
+from retrain_scheduler import RetrainPolicy, RetrainScheduler
+
+
+class FakeDetector:
+    def __init__(self, device_id, points_since_train=0, drift=0.0):
+        self.device_id = device_id
+        self.trained = True
+        self.trained_at = time.time()
+        self.points_since_train = points_since_train
+        self._drift = drift
+        self.model = None
+
+    def drift(self):
+        return self._drift
+
+    def training_data(self):
+        return np.arange(20, dtype=float)
+
+    def swap_model(self, model, data, consumed):
+        self.model = model
+        self.points_since_train -= consumed
+
+
+def slow_fit(data):
+    return ("fitted", len(data))
+
+
+class TestRetrainPolicy:
+    """Tests for retrain triggers"""
+
+    def test_points_trigger(self):
+        policy = RetrainPolicy(every_points=100)
+        assert policy.reason(FakeDetector("d", 99)) is None
+        assert policy.reason(FakeDetector("d", 100)) == "points"
+
+    def test_interval_trigger(self):
+        policy = RetrainPolicy(every_points=0, every_seconds=60)
+        detector = FakeDetector("d", 5)
+        assert policy.reason(detector) is None
+        detector.trained_at -= 61
+        assert policy.reason(detector) == "interval"
+
+    def test_drift_trigger(self):
+        policy = RetrainPolicy(every_points=0, drift_threshold=3.0)
+        assert policy.reason(FakeDetector("d", 20, drift=1.0)) is None
+        assert policy.reason(FakeDetector("d", 5, drift=5.0)) is None  # too few points
+        assert policy.reason(FakeDetector("d", 20, drift=5.0)) == "drift"
+
+    def test_nothing_new(self):
+        assert RetrainPolicy(every_points=1).reason(FakeDetector("d", 0)) is None
+
+
+class TestRetrainScheduler:
+    """Tests for coalesced background retraining"""
+
+    def setup_method(self):
+        self.executor = ModelExecutor(max_workers=1, kind="thread")
+        self.swapped = []
+        self.scheduler = RetrainScheduler(
+            self.executor, RetrainPolicy(every_points=10), slow_fit,
+            on_swapped=self.swapped.append
+        )
+
+    def teardown_method(self):
+        self.scheduler.shutdown()
+        self.executor.shutdown()
+
+    def test_retrain_swaps_model(self):
+        detector = FakeDetector("d", 12)
+        assert self.scheduler.maybe_schedule(detector)
+        assert self.scheduler.wait_idle(5)
+        assert detector.model == ("fitted", 20)
+        assert detector.points_since_train == 0
+        assert self.swapped == [detector]
+        assert self.scheduler.stats()["completed"] == 1
+
+    def test_requests_are_coalesced(self):
+        gate = threading.Event()
+        self.scheduler.fit_fn = lambda data: gate.wait(5) and "fitted"
+        detector = FakeDetector("d", 12)
+
+        assert self.scheduler.request(detector)
+        assert not self.scheduler.request(detector)
+        assert not self.scheduler.request(detector)
+        gate.set()
+        assert self.scheduler.wait_idle(5)
+
+        stats = self.scheduler.stats()
+        assert stats["scheduled"] == 1 and stats["coalesced"] == 2
+        assert detector.model == "fitted"
+
+    def test_failed_fit_keeps_old_model(self):
+        def broken_fit(data):
+            raise ValueError("bad data")
+
+        self.scheduler.fit_fn = broken_fit
+        detector = FakeDetector("d", 12)
+        self.scheduler.request(detector)
+        assert self.scheduler.wait_idle(5)
+        assert detector.model is None
+        assert self.scheduler.stats()["failed"] == 1
+        assert not self.scheduler.in_flight("d")
@@ -0,0 +1,54 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from ring_buffer import RingBuffer
+
+
+class TestRingBuffer:
+    """Tests for the fixed-capacity baseline buffer"""
+
+    def test_append_keeps_last_values(self):
+        buffer = RingBuffer(4, np.float64)
+        for value in range(10):
+            buffer.append(value)
+            expected = list(range(max(0, value - 3), value + 1))
+            assert buffer.tolist() == expected
+        assert len(buffer) == 4
+
+    @pytest.mark.parametrize("chunk", [1, 3, 4, 7, 20])
+    def test_extend_matches_list_slicing(self, chunk):
+        buffer = RingBuffer(7, np.float64)
+        reference = []
+        values = np.arange(60, dtype=np.float64)
+        for start in range(0, len(values), chunk):
+            part = values[start:start + chunk]
+            buffer.extend(part)
+            reference = (reference + part.tolist())[-7:]
+            assert buffer.tolist() == reference
+
+    def test_view_is_zero_copy_and_read_only(self):
+        buffer = RingBuffer.from_array(np.arange(5), 8)
+        view = buffer.view()
+        assert np.shares_memory(view, buffer._data)
+        with pytest.raises(ValueError):
+            view[0] = 1.0
+
+    def test_dtype_and_nbytes(self):
+        buffer = RingBuffer(1000, np.float32)
+        assert buffer.dtype == np.float32
+        assert buffer.nbytes == 2 * 1000 * 4
+
+    def test_pickle_is_compact(self):
+        buffer = RingBuffer.from_array(np.arange(10), 10000, np.float64)
+        data = pickle.dumps(buffer)
+        assert len(data) < 1000
+        restored = pickle.loads(data)
+        assert restored.tolist() == buffer.tolist()
+        assert restored.capacity == 10000 and restored.dtype == np.float64
+
+    def test_uses_slots(self):
+        buffer = RingBuffer(3)
+        with pytest.raises(AttributeError):
+            buffer.extra = 1
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from schedule_optimizer import (
+    DAYS, apply_class_schedule, candidate_plans, class_hours, demand, energy_savings,
+    hour_of_week, optimize, schedule_dict, schedule_levels, usage_profile
+)
+
+END = datetime(2024, 3, 6, 23)  # a Wednesday, 23:00
+
+
+def classroom_usage(weeks: int = 2, end: datetime = END) -> np.ndarray:
+    """Hourly usage: 80 during weekday school hours (9-17), 10 otherwise"""
+    n = weeks * 168
+    hours = [end - timedelta(hours=n - 1 - i) for i in range(n)]
+    return np.array([80.0 if h.weekday() < 5 and 9 <= h.hour < 17 else 10.0 for h in hours])
+
+
+def plan(histories, class_schedule=None, budgets=None):
+    profiles = np.array([usage_profile(h, END) for h in histories])
+    pairs = [apply_class_schedule(need, class_schedule) for need in demand(profiles)]
+    needs = np.array([need for need, _ in pairs])
+    required = np.array([hours for _, hours in pairs])
+    budgets = np.full(len(histories), np.nan) if budgets is None else np.asarray(budgets, dtype=float)
+    return optimize(profiles, needs, required, budgets), needs
+
+
+class TestProfile:
+    """Test the hour-of-week usage profile"""
+
+    def test_slots_are_aligned_to_local_weekdays(self):
+        assert hour_of_week(1, datetime(2024, 3, 4, 0))[0] == 0  # Monday 00:00
+        assert hour_of_week(1, END)[0] == 2 * 24 + 23
+        assert list(hour_of_week(3, datetime(2024, 3, 4, 1))) == [167, 0, 1]
+
+    def test_profile_follows_usage(self):
+        profile = usage_profile(classroom_usage(), END).reshape(7, 24)
+        assert profile[0, 10] == 80.0 and profile[0, 20] == 10.0
+        assert profile[6, 10] == 10.0
+
+    def test_short_history_fills_by_hour(self):
+        day = np.where(np.arange(24) >= 12, 5.0, 1.0)
+        profile = usage_profile(day, END).reshape(7, 24)
+        assert np.all(profile[:, 13] == 5.0) and np.all(profile[:, 2] == 1.0)
+
+    def test_flat_profile_is_fully_needed(self):
+        assert np.all(demand(np.full(168, 50.0)) == 1.0)
+
+
+class TestClassSchedule:
+    """Test class-hour constraints"""
+
+    def test_default_hours_and_overrides(self):
+        required = class_hours({"weekends": False, "friday": ["09:00", "12:30"], "monday": []})
+        required = required.reshape(7, 24)
+        assert not required[0].any()
+        assert required[1, 8:18].all() and not required[1, 18]
+        assert list(np.flatnonzero(required[4])) == [9, 10, 11, 12]
+        assert not required[5:].any()
+
+    def test_no_weekends_clears_weekend_demand(self):
+        need, _ = apply_class_schedule(np.ones(168), {"weekends": False})
+        assert not need.reshape(7, 24)[5:].any()
+
+
+class TestOptimize:
+    """Test the vectorized schedule search"""
+
+    def test_candidates(self):
+        on, dim = candidate_plans()
+        assert on.shape == dim.shape and on.shape[1] == 24
+        assert not (on * dim).any()
+        assert not on[0].any()
+
+    def test_follows_usage_and_saves_energy(self):
+        result, needs = plan([classroom_usage()])
+        levels = result["levels"][0].reshape(7, 24)
+        assert levels[0, 9:17].min() == 1.0
+        assert levels[0, :6].max() == 0.0
+        assert not levels[5:].any()
+        assert result["served"][0] == pytest.approx(1.0)
+        assert result["energy"][0] < result["baseline"][0]
+
+    def test_class_hours_are_always_on(self):
+        result, _ = plan([classroom_usage()], class_schedule={"start": "07:00", "end": "19:00"}, budgets=[1])
+        levels = result["levels"][0].reshape(7, 24)
+        assert levels[:5, 7:19].min() == 1.0
+        assert result["budget_met"][0] == 0.0  # class hours alone exceed 1%
+
+    def test_budget_trades_comfort_for_energy(self):
+        usage = classroom_usage() + np.tile(np.where(np.arange(24) >= 17, 30.0, 0.0), 14)
+        free, _ = plan([usage])
+        tight, _ = plan([usage], budgets=[30])
+        assert tight["budget_met"][0] == 1.0
+        assert tight["energy"][0] <= 0.3 * tight["baseline"][0] + 1e-9
+        assert tight["energy"][0] < free["energy"][0]
+        assert tight["served"][0] < free["served"][0]
+
+    def test_fleet_matches_single_devices(self):
+        rng = np.random.RandomState(0)
+        histories = [classroom_usage() + rng.normal(0, 5, 336) for _ in range(5)]
+        fleet, _ = plan(histories, budgets=[np.nan, 50, 80, np.nan, 20])
+        for i, history in enumerate(histories):
+            single, _ = plan([history], budgets=[[np.nan, 50, 80, np.nan, 20][i]])
+            assert np.array_equal(fleet["levels"][i], single["levels"][0])
+
+
+class TestScheduleFormat:
+    """Test schedule dictionaries and savings"""
+
+    def test_schedule_dict_roundtrip(self):
+        result, needs = plan([classroom_usage()])
+        schedule = schedule_dict(result["levels"][0], needs[0])
+        assert list(schedule) == list(DAYS)
+        assert schedule["sunday"]["priority"] == "off"
+        assert schedule["monday"]["priority"] == "high"
+        assert np.array_equal(schedule_levels(schedule), result["levels"][0])
+
+    def test_energy_savings(self):
+        usage = classroom_usage()
+        template = {day: {"start": "09:00", "end": "17:00", "priority": "high"} for day in DAYS[:5]}
+        savings = energy_savings(template, usage, END)
+        profile = usage_profile(usage, END)
+        assert savings == pytest.approx(100 * (1 - 80 * 40 / profile.sum()))
+        assert energy_savings(template, usage[:10], END) == 0.0
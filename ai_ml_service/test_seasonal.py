@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from seasonal import design_matrix, seasonal_forecast
+
+END = datetime(2024, 3, 6, 23)  # a Wednesday, 23:00
+
+
+def classroom_usage(n: int, end: datetime = END, noise: float = 0.0, seed: int = 0) -> np.ndarray:
+    """Hourly usage: high during school hours on weekdays, low otherwise"""
+    hours = [end - timedelta(hours=n - 1 - i) for i in range(n)]
+    usage = np.array([
+        80.0 if h.weekday() < 5 and 9 <= h.hour <= 17 else 20.0 for h in hours
+    ])
+    return usage + np.random.RandomState(seed).normal(0, noise, n)
+
+
+class TestDesignMatrix:
+    """Test which regressors are fitted for a given history length"""
+
+    def test_terms_grow_with_history(self):
+        t = np.arange(10, dtype=float)
+        assert design_matrix(t, 10, 0).shape[1] == 2  # intercept + trend only
+        assert design_matrix(t, 48, 0).shape[1] == 2 + 10 + 1 + 6
+        assert design_matrix(t, 336, 0).shape[1] == 2 + 10 + 6 + 1 + 6
+
+
+class TestSeasonalForecast:
+    """Test the harmonic-regression forecaster"""
+
+    def test_reproduces_school_hours_pattern(self):
+        history = classroom_usage(4 * 168, noise=2.0)
+        (yhat, lower, upper), = seasonal_forecast([history.tolist()], [24], end=END)
+        expected = classroom_usage(24, end=END + timedelta(hours=24))
+        assert len(yhat) == 24
+        assert np.mean(np.abs(np.array(yhat) - expected)) < 10
+        assert all(lo < y < hi for lo, y, hi in zip(lower, yhat, upper))
+
+    def test_constant_and_trend(self):
+        (flat, lo, hi), (ramp, _, _) = seasonal_forecast(
+            [[50.0] * 10, list(range(10))], [3, 3], end=END
+        )
+        assert flat == pytest.approx([50.0] * 3)
+        assert lo == pytest.approx(flat) and hi == pytest.approx(flat)
+        assert ramp == pytest.approx([10.0, 11.0, 12.0], abs=0.1)
+
+    def test_batched_matches_single(self):
+        histories = [classroom_usage(200, noise=3.0, seed=s).tolist() for s in range(5)]
+        histories.append(classroom_usage(60, noise=3.0).tolist())
+        periods = [5, 10, 3, 8, 1, 6]
+        batched = seasonal_forecast(histories, periods, end=END)
+        for history, p, result in zip(histories, periods, batched):
+            single = seasonal_forecast([history], [p], end=END)[0]
+            assert len(result[0]) == p
+            assert result[0] == pytest.approx(single[0])
+            assert result[2] == pytest.approx(single[2])
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from series_store import SeriesStore
+
+
+class TestSeriesStore:
+    """Test the per-device append-only series store"""
+
+    def test_append_and_window(self, tmp_path):
+        store = SeriesStore(tmp_path, max_points=100)
+        assert store.window("dev") is None
+
+        assert store.append("dev", [3.0, 1.0, 2.0], [30.0, 10.0, 20.0]) == (3, 0)
+        timestamps, values = store.window("dev")
+        assert timestamps.tolist() == [1.0, 2.0, 3.0]
+        assert values.tolist() == [10.0, 20.0, 30.0]
+
+        assert store.window("dev", points=2)[1].tolist() == [20.0, 30.0]
+        assert store.window("dev", since=2.0)[1].tolist() == [20.0, 30.0]
+
+    def test_drops_readings_older_than_latest(self, tmp_path):
+        store = SeriesStore(tmp_path)
+        store.append("dev", [10.0], [1.0])
+        assert store.append("dev", [5.0, 11.0], [2.0, 3.0]) == (1, 1)
+        assert store.window("dev")[1].tolist() == [1.0, 3.0]
+
+    def test_persists_and_reloads(self, tmp_path):
+        store = SeriesStore(tmp_path, max_points=50)
+        for start in range(0, 40, 10):
+            store.append("dev", np.arange(start, start + 10.0), np.arange(start, start + 10.0) * 2)
+
+        reloaded = SeriesStore(tmp_path, max_points=50)
+        timestamps, values = reloaded.window("dev")
+        assert timestamps.tolist() == list(range(40))
+        assert values.tolist() == [2.0 * t for t in range(40)]
+        assert reloaded.devices() == ["dev"]
+
+    def test_bounded_by_max_points_and_compacted(self, tmp_path):
+        store = SeriesStore(tmp_path, max_points=10)
+        for start in range(0, 100, 5):
+            store.append("dev", np.arange(start, start + 5.0), np.arange(start, start + 5.0))
+
+        assert store.window("dev")[0].tolist() == list(range(90, 100))
+        on_disk = np.fromfile(store.path("dev", "values"), dtype="<f8")
+        assert len(on_disk) <= 20
+        assert SeriesStore(tmp_path, max_points=10).window("dev")[0].tolist() == list(range(90, 100))
+
+    def test_retention(self, tmp_path):
+        import time
+
+        store = SeriesStore(tmp_path, retention=3600)
+        now = time.time()
+        store.append("dev", [now - 7200, now - 60, now], [1.0, 2.0, 3.0])
+        assert store.window("dev")[1].tolist() == [2.0, 3.0]
+
+    def test_torn_append_uses_shorter_column(self, tmp_path):
+        store = SeriesStore(tmp_path)
+        store.append("dev", [1.0, 2.0], [10.0, 20.0])
+        with open(store.path("dev", "timestamps"), "ab") as f:
+            f.write(np.array([3.0]).tobytes())  # crash before the values append
+        assert SeriesStore(tmp_path).window("dev")[1].tolist() == [10.0, 20.0]
+
+    def test_delete_and_memory_bound(self, tmp_path):
+        store = SeriesStore(tmp_path, max_devices=2)
+        for device in ("a", "b", "c"):
+            store.append(device, [1.0], [1.0])
+        assert store.stats()["devices_loaded"] == 2
+        assert store.window("a")[1].tolist() == [1.0]  # evicted from memory, reloaded from disk
+
+        assert store.delete("a") == 2
+        assert store.window("a") is None
+
+    def test_mismatched_lengths(self, tmp_path):
+        with pytest.raises(ValueError):
+            SeriesStore(tmp_path).append("dev", [1.0, 2.0], [1.0])
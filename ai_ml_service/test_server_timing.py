@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import server_timing
+from server_timing import RequestTimings, ServerTimingMiddleware
+
+
+class TestRequestTimings:
+    """Test phase accounting"""
+
+    def test_phases_add_up(self):
+        timings = RequestTimings()
+        with timings.phase("fit"):
+            time.sleep(0.02)
+        with timings.phase("fit"):
+            time.sleep(0.01)
+        assert 0.03 <= timings.phases["fit"] < 0.1
+
+    def test_nested_phase_is_exclusive(self):
+        timings = RequestTimings()
+        with timings.phase("fit"):
+            time.sleep(0.02)
+            with timings.phase("persist"):
+                time.sleep(0.03)
+            time.sleep(0.01)
+        assert 0.03 <= timings.phases["fit"] < 0.045
+        assert 0.03 <= timings.phases["persist"] < 0.045
+        assert sum(timings.phases.values()) <= timings.total()
+
+    def test_concurrent_tasks_do_not_pause_each_other(self):
+        timings = RequestTimings()
+
+        async def work(name):
+            with timings.phase(name):
+                await asyncio.sleep(0.02)
+
+        async def main():
+            with timings.phase("load"):
+                await asyncio.gather(work("a"), work("b"))
+
+        asyncio.run(main())
+        assert timings.phases["load"] >= 0.02
+        assert timings.phases["a"] >= 0.02 and timings.phases["b"] >= 0.02
+
+    def test_mark_and_header(self):
+        timings = RequestTimings()
+        time.sleep(0.01)
+        timings.mark("parse")
+        timings.describe("load", "HIT")
+        header = timings.header()
+        assert header.startswith("parse;dur=")
+        assert 'load;dur=0.0;desc="HIT"' in header
+        assert "total;dur=" in header
+        assert timings.snapshot()["parse"] >= 10
+
+    def test_phase_outside_request_is_noop(self):
+        assert server_timing.current() is None
+        with server_timing.phase("fit"):
+            pass
+        server_timing.mark("parse")
+        server_timing.describe("load", "HIT")
+
+
+class TestServerTimingMiddleware:
+    """Test the Server-Timing header"""
+
+    def make_client(self):
+        app = FastAPI()
+
+        @app.get("/work")
+        async def work(request: Request):
+            server_timing.mark("parse")
+            with server_timing.phase("fit"):
+                await asyncio.sleep(0.01)
+            with server_timing.phase("predict"):
+                await asyncio.to_thread(time.sleep, 0.005)
+            timings = server_timing.current()
+            return {"timings": timings.snapshot() if server_timing.requested(request.query_params) else None}
+
+        app.add_middleware(ServerTimingMiddleware)
+        return TestClient(app)
+
+    def test_header(self):
+        response = self.make_client().get("/work")
+        header = response.headers["server-timing"]
+        durations = dict(entry.split(";dur=") for entry in header.split(", "))
+        assert list(durations) == ["parse", "fit", "predict", "total"]
+        assert float(durations["fit"]) >= 10
+        assert float(durations["total"]) >= float(durations["fit"]) + float(durations["predict"])
+        assert response.json()["timings"] is None
+
+    def test_timings_field(self):
+        body = self.make_client().get("/work", params={"timings": "1"}).json()
+        assert set(body["timings"]) == {"parse", "fit", "predict", "total"}
+
+    def test_header_on_errors(self):
+        app = FastAPI()
+        app.add_middleware(ServerTimingMiddleware)
+        response = TestClient(app).get("/missing")
+        assert response.status_code == 404
+        assert response.headers["server-timing"].startswith("total;dur=")
@@ -0,0 +1,98 @@
+import pytest
+
+import shared_state
+from shared_state import SharedModelState
+
+pytestmark = pytest.mark.skipif(shared_state.fcntl is None, reason="needs fcntl")
+
+
+@pytest.fixture
+def files():
+    return {}
+
+
+def worker(tmp_path, files, **kwargs):
+    """A SharedModelState standing in for one uvicorn worker process"""
+    kwargs.setdefault("check_interval", 0)
+    return SharedModelState(tmp_path, stamp=lambda key: files.get(key), **kwargs)
+
+
+class TestSharedModelState:
+    """Test writer election and replica reloads between workers"""
+
+    def test_single_writer(self, tmp_path, files):
+        first, second = worker(tmp_path, files), worker(tmp_path, files)
+        assert first.is_writer("dev_anomaly")
+        assert first.is_writer("dev_anomaly")
+        assert not second.is_writer("dev_anomaly")
+        assert second.is_writer("other_anomaly")
+        assert first.holds("dev_anomaly") and not second.holds("dev_anomaly")
+
+    def test_release_hands_over(self, tmp_path, files):
+        first, second = worker(tmp_path, files), worker(tmp_path, files)
+        first.is_writer("dev_anomaly")
+        assert not second.is_writer("dev_anomaly")
+        first.release("dev_anomaly")
+        assert second.is_writer("dev_anomaly")
+        assert not first.is_writer("dev_anomaly")
+
+    def test_failed_claims_are_rate_limited(self, tmp_path, files):
+        first = worker(tmp_path, files)
+        second = worker(tmp_path, files, check_interval=60)
+        first.is_writer("dev_anomaly")
+        assert not second.is_writer("dev_anomaly")
+        first.release("dev_anomaly")
+        assert not second.is_writer("dev_anomaly")
+
+    def test_replica_sees_new_versions(self, tmp_path, files):
+        writer, replica = worker(tmp_path, files), worker(tmp_path, files)
+        writer.is_writer("dev_anomaly")
+        files["dev_anomaly"] = (1, 100)
+        replica.loaded("dev_anomaly", files["dev_anomaly"])
+        assert not replica.stale("dev_anomaly")
+
+        files["dev_anomaly"] = (1, 200)  # the writer saved again
+        assert replica.stale("dev_anomaly")
+        assert not writer.stale("dev_anomaly")
+        assert replica.stats()["reloads"] == 1
+
+    def test_takeover_reloads_first(self, tmp_path, files):
+        writer, replica = worker(tmp_path, files), worker(tmp_path, files)
+        writer.is_writer("dev_anomaly")
+        replica.loaded("dev_anomaly", None)
+        files["dev_anomaly"] = (1, 100)
+        writer.release("dev_anomaly")
+
+        assert replica.stale("dev_anomaly")
+        assert replica.holds("dev_anomaly")
+
+    def test_disabled_is_always_writer(self, tmp_path, files):
+        first, second = worker(tmp_path, files, enabled=False), worker(tmp_path, files, enabled=False)
+        assert first.is_writer("dev_anomaly") and second.is_writer("dev_anomaly")
+        files["dev_anomaly"] = (1, 100)
+        assert not second.stale("dev_anomaly")
+        assert not (tmp_path / shared_state.LOCK_DIR).exists()
+
+    def test_forget_removes_unheld_lock_file(self, tmp_path, files):
+        first, second = worker(tmp_path, files), worker(tmp_path, files)
+        lock_file = tmp_path / shared_state.LOCK_DIR / f"dev_anomaly{shared_state.LOCK_EXTENSION}"
+        first.is_writer("dev_anomaly")
+        second.forget("dev_anomaly")
+        assert lock_file.exists()  # the other worker is still its writer
+
+        first.forget("dev_anomaly")
+        assert not lock_file.exists() and not first.holds("dev_anomaly")
+        assert second.is_writer("dev_anomaly") and lock_file.exists()
+
+    def test_out_of_descriptors_serves_as_replica(self, tmp_path, files, monkeypatch):
+        import errno
+
+        state = worker(tmp_path, files)
+
+        def no_descriptors(*args, **kwargs):
+            raise OSError(errno.EMFILE, "Too many open files")
+
+        monkeypatch.setattr(shared_state.os, "open", no_descriptors)
+        assert not state.is_writer("dev_anomaly")
+        monkeypatch.undo()
+        assert state.is_writer("dev_anomaly")
@@ -0,0 +1,78 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from statistical_detector import StatisticalDetector, ewma_path
+
+
+class TestEwmaPath:
+    """Test the vectorized EWMA recursion"""
+
+    def test_matches_loop(self):
+        values = np.random.RandomState(0).normal(10, 2, 300)
+        state, expected = 5.0, []
+        for x in values:
+            expected.append(state)
+            state = 0.9 * state + 0.1 * x
+
+        prior, final = ewma_path(values, 5.0, 0.1)
+        assert prior == pytest.approx(expected)
+        assert final == pytest.approx(state)
+
+
+class TestStatisticalDetector:
+    """Test the streaming statistical anomaly engine"""
+
+    def _trained(self, **kwargs):
+        detector = StatisticalDetector("dev", **kwargs)
+        detector.predict(np.random.RandomState(1).normal(50, 1, 200))
+        return detector
+
+    def test_needs_ten_points_to_train(self):
+        detector = StatisticalDetector("dev")
+        anomalies, scores = detector.predict([1.0, 2.0])
+        assert not detector.trained
+        assert anomalies == [] and scores == [0.0, 0.0]
+
+    def test_training_batch_primes_ewma_once(self):
+        data = np.random.RandomState(2).normal(50, 1, 200)
+        detector = StatisticalDetector("dev")
+        detector.predict(data)
+        assert detector.ewma_mean == pytest.approx(data.mean())
+        assert detector.ewma_var == pytest.approx(data.var())
+
+    def test_flags_outliers_only(self):
+        detector = self._trained()
+        anomalies, scores = detector.predict([50.2, 49.8, 80.0, 50.1])
+        assert anomalies == [2]
+        assert scores[2] < 0 < min(scores[:2] + scores[3:])
+
+    @pytest.mark.parametrize("method", ["robust_z", "ewma", "quantile"])
+    def test_each_method_detects_spike(self, method):
+        detector = self._trained(methods=(method,))
+        anomalies, _ = detector.predict([50.0, 500.0])
+        assert anomalies == [1]
+
+    def test_anomalies_do_not_enter_window(self):
+        detector = self._trained()
+        before = len(detector.window)
+        detector.predict([1000.0] * 5)
+        assert len(detector.window) == before
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            StatisticalDetector("dev", methods=("robust_z", "magic"))
+
+    def test_pickle_roundtrip(self):
+        detector = self._trained()
+        restored = pickle.loads(pickle.dumps(detector))
+        assert restored.predict([50.0, 500.0])[0] == [1]
+        assert restored.nbytes() == detector.nbytes()
+
+    def test_snapshot_is_unaffected_by_later_predictions(self):
+        detector = self._trained()
+        snapshot = detector.snapshot()
+        window, ewma_mean = snapshot.window.tolist(), snapshot.ewma_mean
+        detector.predict([50.5] * 20)
+        assert snapshot.window.tolist() == window and snapshot.ewma_mean == ewma_mean
@@ -10,11 +10,29 @@ const { body } = require('express-validator');
 // AI/ML service URL from environment or default
 const AI_ML_SERVICE_URL = process.env.AI_ML_SERVICE_URL || 'http://ai-ml-service:8002';
 
+// Log the per-phase Server-Timing breakdown (parse, load, fit, predict, ...) of each call
+const LOG_SERVER_TIMING = process.env.AI_ML_LOG_SERVER_TIMING === 'true';
+
+// Pass the AI/ML service's Server-Timing header on, and log it per device
+function forwardServerTiming(route, req, response, res) {
+  const timing = response.headers['server-timing'];
+  if (!timing) return;
+  res.set('Server-Timing', timing);
+  if (LOG_SERVER_TIMING) {
+    console.log(`AI/ML ${route} ${req.body.device_id}: ${timing}`);
+  }
+}
+
+// Forecast engines accepted by the AI/ML service's model_type field
+const FORECAST_MODEL_TYPES = ['auto', 'moving_average', 'seasonal', 'prophet'];
+
 // Proxy forecast requests to AI/ML service
 router.post('/forecast',
   body('device_id').isString().notEmpty().withMessage('Device ID is required'),
-  body('history').isArray().withMessage('History must be an array'),
+  body('history').optional().isArray().withMessage('History must be an array'),
+  body('window').optional().isInt({ min: 1 }).withMessage('Window must be a positive integer'),
   body('periods').isInt({ min: 1, max: 30 }).withMessage('Periods must be between 1 and 30'),
+  body('model_type').optional().isIn(FORECAST_MODEL_TYPES).withMessage(`Model type must be one of ${FORECAST_MODEL_TYPES.join(', ')}`),
   handleValidationErrors,
   async (req, res) => {
     try {
@@ -25,6 +43,7 @@ router.post('/forecast',
         }
       });
 
+      forwardServerTiming('/forecast', req, response, res);
       res.json(response.data);
     } catch (error) {
       console.error('AI/ML forecast error:', error.message);
@@ -55,6 +74,38 @@ router.post('/forecast',
   }
 );
 
+// Proxy batch forecast requests (streams NDJSON, one line per device)
+router.post('/forecast/batch',
+  body('items').isArray({ min: 1 }).withMessage('Items must be a non-empty array'),
+  body('items.*.device_id').isString().notEmpty().withMessage('Device ID is required'),
+  body('items.*.history').optional().isArray().withMessage('History must be an array'),
+  body('items.*.window').optional().isInt({ min: 1 }).withMessage('Window must be a positive integer'),
+  body('items.*.periods').optional().isInt({ min: 1, max: 30 }).withMessage('Periods must be between 1 and 30'),
+  body('items.*.model_type').optional().isIn(FORECAST_MODEL_TYPES).withMessage(`Model type must be one of ${FORECAST_MODEL_TYPES.join(', ')}`),
+  handleValidationErrors,
+  async (req, res) => {
+    try {
+      const response = await axios.post(`${AI_ML_SERVICE_URL}/forecast/batch`, req.body, {
+        timeout: 120000, // Prophet fits for a whole fleet take longer
+        responseType: 'stream',
+        headers: {
+          'Content-Type': 'application/json'
+        }
+      });
+
+      res.setHeader('Content-Type', 'application/x-ndjson');
+      response.data.pipe(res);
+    } catch (error) {
+      console.error('AI/ML batch forecast error:', error.message);
+
+      res.status(error.response?.status || 500).json({
+        error: 'AI/ML service error',
+        message: error.message
+      });
+    }
+  }
+);
+
 // Proxy schedule optimization requests
 router.post('/schedule',
   body('device_id').isString().notEmpty().withMessage('Device ID is required'),
@@ -69,6 +120,7 @@ router.post('/schedule',
         }
       });
 
+      forwardServerTiming('/schedule', req, response, res);
       res.json(response.data);
     } catch (error) {
       console.error('AI/ML schedule error:', error.message);
@@ -100,10 +152,68 @@ router.post('/schedule',
   }
 );
 
+// Proxy fleet schedule optimization (all devices optimized in one call)
+router.post('/schedule/batch',
+  body('items').isArray({ min: 1 }).withMessage('Items must be a non-empty array'),
+  body('items.*.device_id').isString().notEmpty().withMessage('Device ID is required'),
+  body('items.*.constraints').optional().isObject().withMessage('Constraints must be an object'),
+  body('items.*.historical_usage').optional().isArray().withMessage('Historical usage must be an array'),
+  handleValidationErrors,
+  async (req, res) => {
+    try {
+      const response = await axios.post(`${AI_ML_SERVICE_URL}/schedule/batch`, req.body, {
+        timeout: 30000,
+        headers: {
+          'Content-Type': 'application/json'
+        }
+      });
+
+      res.json(response.data);
+    } catch (error) {
+      console.error('AI/ML batch schedule error:', error.message);
+      res.status(error.response?.status || 500).json({
+        error: 'AI/ML service error',
+        message: error.response?.data?.detail || error.message
+      });
+    }
+  }
+);
+
+// Proxy readings ingest into the AI/ML service's per-device series store
+router.post('/series/:deviceId',
+  body('values').isArray({ min: 1 }).withMessage('Values must be a non-empty array'),
+  body('timestamps').optional().isArray().withMessage('Timestamps must be an array'),
+  handleValidationErrors,
+  async (req, res) => {
+    try {
+      const response = await axios.post(
+        `${AI_ML_SERVICE_URL}/series/${encodeURIComponent(req.params.deviceId)}`,
+        req.body,
+        {
+          timeout: 30000,
+          headers: {
+            'Content-Type': 'application/json'
+          }
+        }
+      );
+
+      res.json(response.data);
+    } catch (error) {
+      console.error('AI/ML series ingest error:', error.message);
+      res.status(error.response?.status || 500).json({
+        error: 'AI/ML service error',
+        message: error.response?.data?.detail || error.message
+      });
+    }
+  }
+);
+
 // Proxy anomaly detection requests
 router.post('/anomaly',
   body('device_id').isString().notEmpty().withMessage('Device ID is required'),
-  body('data').isArray().withMessage('Data must be an array'),
+  body('data').optional().isArray().withMessage('Data must be an array'),
+  body('values').optional().isArray().withMessage('Values must be an array'),
+  body('window').optional().isInt({ min: 1 }).withMessage('Window must be a positive integer'),
   handleValidationErrors,
   async (req, res) => {
     try {
@@ -114,6 +224,7 @@ router.post('/anomaly',
         }
       });
 
+      forwardServerTiming('/anomaly', req, response, res);
       res.json(response.data);
     } catch (error) {
       console.error('AI/ML anomaly detection error:', error.message);